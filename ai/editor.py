@@ -2,32 +2,13 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import openai
-import os
-import json
-from datetime import datetime
-
-# Optional: Debug check to ensure API key is being loaded
-# print("[DEBUG] OPENAI_API_KEY:", os.getenv("OPENAI_API_KEY"))
-
-client = openai.OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),  # ✅ Correct key name
-    base_url=os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1")
-)
-
-FEEDBACK_FILE = "feedback/feedback_log.json"
+from ai.feedback_stats import get_feedback_stats
+from ai.llm_gateway import get_llm_gateway
+from ai.llm_cache import cached_completion
+from utils.chunking import map_segments, with_context
 
 def get_avg_feedback_score():
-    if not os.path.exists(FEEDBACK_FILE):
-        return 3  # Default neutral score
-    try:
-        with open(FEEDBACK_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            scores = [entry["score"] for entry in data if "score" in entry]
-            return sum(scores) / len(scores) if scores else 3
-    except Exception as e:
-        print(f"[ERROR] Failed to read feedback file: {e}")
-        return 3
+    return get_feedback_stats().mean(default=3)  # Default neutral score
 
 def adapt_editor_instruction(avg_score: float) -> str:
     if avg_score <= 2:
@@ -37,23 +18,27 @@ def adapt_editor_instruction(avg_score: float) -> str:
     else:
         return "Enhance clarity and structure while keeping the original tone."
 
-def edit_chapter(rewritten_text: str) -> str:
+def edit_chapter(rewritten_text: str, use_cache: bool = True) -> str:
     avg_score = get_avg_feedback_score()
     instruction = adapt_editor_instruction(avg_score)
 
-    response = client.chat.completions.create(
-        model="deepseek/deepseek-chat-v3-0324:free",
-        messages=[
-            {
-                "role": "system",
-                "content": f"You are an expert copy editor. {instruction}"
-            },
-            {
-                "role": "user",
-                "content": f"Please edit the following passage for grammar, flow, and clarity:\n\n{rewritten_text}"
-            }
-        ],
-        temperature=0.7,
-        max_tokens=4096
-    )
-    return response.choices[0].message.content
+    def edit_segment(segment, context):
+        return cached_completion(
+            get_llm_gateway(),
+            model="deepseek/deepseek-chat-v3-0324:free",
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"You are an expert copy editor. {instruction}"
+                },
+                {
+                    "role": "user",
+                    "content": with_context(f"Please edit the following passage for grammar, flow, and clarity:\n\n{segment}", context)
+                }
+            ],
+            temperature=0.7,
+            max_tokens=4096,
+            use_cache=use_cache
+        )
+
+    return map_segments(edit_segment, rewritten_text)
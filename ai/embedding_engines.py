@@ -0,0 +1,248 @@
+# ai/embedding_engines.py
+"""
+Embedding engines behind the chapter index, chosen with EMBEDDING_ENGINE:
+
+- "sentence-transformers": all-MiniLM-L6-v2 through PyTorch, the reference.
+- "onnx": the same model exported to ONNX and quantized to int8, run by
+  ONNX Runtime with the `tokenizers` WordPiece tokenizer; torch is never
+  imported, which roughly halves the service's memory on CPU-only boxes.
+
+Both engines tokenize identically, so chapters split into the same
+passages. Their vectors differ slightly; measure it before switching with
+
+    python -m ai.embedding_engines parity
+
+Vectors from different engines don't share one index: after switching,
+run `python -m ai.embeddings backfill` to re-encode the stored chapters.
+Until then queries are encoded by the new engine and compared against
+the old engine's vectors.
+
+Every engine has a `name` (engine, model and weights), a `tokenizer` for
+utils.chunking and `encode(texts, batch_size)` returning L2-normalized
+float32 vectors.
+"""
+
+import os
+import platform
+import threading
+
+import numpy as np
+
+EMBEDDING_ENGINES = ("sentence-transformers", "onnx")
+EMBEDDING_ENGINE = os.getenv("EMBEDDING_ENGINE", "sentence-transformers").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+
+def default_onnx_file(machine: str = None) -> str:
+    """The int8 export published with the model for this CPU: the ARM build on arm64, the AVX2 one elsewhere."""
+    machine = (machine or platform.machine()).lower()
+    if machine in ("arm64", "aarch64") or machine.startswith("armv8"):
+        return "onnx/model_qint8_arm64.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+ONNX_MODEL_FILE = os.getenv("EMBED_ONNX_FILE", default_onnx_file())
+ONNX_MODEL_DIR = os.getenv("EMBED_ONNX_DIR", "")  # Local copy from `download`; the Hugging Face cache otherwise
+ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))  # 0 lets ONNX Runtime use every core
+MAX_SEQ_LENGTH = 256  # Same truncation as the sentence-transformers model
+PARITY_MIN_COSINE = float(os.getenv("EMBED_PARITY_MIN_COSINE", "0.98"))
+
+
+def resolve_engine(name: str = None) -> str:
+    name = (name or EMBEDDING_ENGINE).lower()
+    if name not in EMBEDDING_ENGINES:
+        raise ValueError(f"Unknown embedding engine: {name} (expected one of {', '.join(EMBEDDING_ENGINES)})")
+    return name
+
+
+def model_repo(model: str = EMBEDDING_MODEL) -> str:
+    return model if "/" in model else f"sentence-transformers/{model}"
+
+
+def mean_pool(hidden, attention_mask):
+    """Mean of the token vectors under the attention mask, L2-normalized (MiniLM's Pooling + Normalize)."""
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    return (pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)).astype(np.float32)
+
+
+# === Engines ===
+class SentenceTransformerEngine:
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model)
+        self.tokenizer = self.model.tokenizer
+        self.name = f"sentence-transformers:{model}"
+
+    def encode(self, texts, batch_size: int = 64):
+        return self.model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+
+
+class WordPieceTokenizer:
+    """A `tokenizers.Tokenizer` called like a transformers fast tokenizer, as utils.chunking.token_spans does."""
+
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, verbose=True):
+        encoding = self._tokenizer.encode(text, add_special_tokens=add_special_tokens)
+        encoded = {"input_ids": encoding.ids, "attention_mask": encoding.attention_mask}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = encoding.offsets
+        return encoded
+
+
+def onnx_model_files(model_dir: str = ONNX_MODEL_DIR, model_file: str = ONNX_MODEL_FILE, model: str = EMBEDDING_MODEL):
+    """(model.onnx, tokenizer.json) paths, from `model_dir` or downloaded into the Hugging Face cache."""
+    if model_dir:
+        return os.path.join(model_dir, os.path.basename(model_file)), os.path.join(model_dir, "tokenizer.json")
+    from huggingface_hub import hf_hub_download
+
+    return hf_hub_download(model_repo(model), model_file), hf_hub_download(model_repo(model), "tokenizer.json")
+
+
+class OnnxEngine:
+    """
+    MiniLM as an int8 ONNX graph. Texts are sorted by length before
+    batching so each batch pads to a similar length.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, model_file: str = ONNX_MODEL_FILE, model: str = EMBEDDING_MODEL,
+                 session=None, tokenizer=None):
+        if session is None or tokenizer is None:
+            model_path, tokenizer_path = onnx_model_files(model_dir, model_file, model)
+        if tokenizer is None:
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+        if session is None:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = ONNX_THREADS
+            session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+        # Whole chapters must tokenize untruncated for passage splitting; model inputs are capped and padded
+        spans = type(tokenizer).from_str(tokenizer.to_str())
+        spans.no_truncation()
+        spans.no_padding()
+        self.tokenizer = WordPieceTokenizer(spans)
+        self._batch_tokenizer = type(tokenizer).from_str(tokenizer.to_str())
+        self._batch_tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self._batch_tokenizer.enable_padding(pad_id=tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+        self.session = session
+        self._inputs = {i.name for i in session.get_inputs()}
+        self.name = f"onnx:{model}:{os.path.splitext(os.path.basename(model_file))[0]}"
+
+    def encode(self, texts, batch_size: int = 64):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self._batch_tokenizer.encode_batch([texts[i] for i in batch])
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            }
+            if "token_type_ids" in self._inputs:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            hidden = self.session.run(None, feeds)[0]
+            for i, vector in zip(batch, mean_pool(hidden, feeds["attention_mask"])):
+                vectors[i] = vector
+        if single:
+            return vectors[0]
+        return np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def load_engine(name: str = None):
+    """A new engine instance; most callers want the shared get_engine()."""
+    name = resolve_engine(name)
+    print(f"🧠 Loading {name} embedding engine for {EMBEDDING_MODEL}...")
+    if name == "onnx":
+        return OnnxEngine()
+    return SentenceTransformerEngine()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = load_engine()
+        return _engine
+
+
+# === Parity ===
+def parity_report(reference, candidate, threshold: float = PARITY_MIN_COSINE) -> dict:
+    """Cosine similarity of each candidate vector to its reference vector."""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        "texts": len(cosines),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "threshold": threshold,
+        "ok": bool(cosines.min() >= threshold),
+    }
+
+
+def check_parity(texts, reference=None, candidate=None, batch_size: int = 64) -> dict:
+    """Encodes `texts` with both engines (sentence-transformers and ONNX by default) and compares them."""
+    reference = reference or load_engine("sentence-transformers")
+    candidate = candidate or load_engine("onnx")
+    report = parity_report(reference.encode(texts, batch_size=batch_size), candidate.encode(texts, batch_size=batch_size))
+    report.update(reference=reference.name, candidate=candidate.name)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+    import sys
+
+    from utils.artifact_store import ARTIFACT_DIR
+    from utils.chunking import split_passages
+
+    parser = argparse.ArgumentParser(description="Embedding engine tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    download = sub.add_parser("download", help="copy the int8 ONNX model and tokenizer to a directory for EMBED_ONNX_DIR")
+    download.add_argument("--dir", default=os.path.join("models", EMBEDDING_MODEL))
+    parity = sub.add_parser("parity", help="cosine similarity of ONNX vs sentence-transformers vectors")
+    parity.add_argument("files", nargs="*", help="text files to split into passages (default: the stored chapter texts)")
+    parity.add_argument("--limit", type=int, default=500, help="max passages compared")
+    args = parser.parse_args()
+
+    if args.command == "download":
+        from huggingface_hub import hf_hub_download
+
+        for filename in (ONNX_MODEL_FILE, "tokenizer.json"):
+            path = hf_hub_download(model_repo(), filename)
+            os.makedirs(args.dir, exist_ok=True)
+            target = os.path.join(args.dir, os.path.basename(filename))
+            with open(path, "rb") as src, open(target, "wb") as dst:
+                dst.write(src.read())
+            print(f"📥 {filename} -> {target}")
+        print(f"Set EMBEDDING_ENGINE=onnx EMBED_ONNX_DIR={args.dir}")
+
+    if args.command == "parity":
+        reference = load_engine("sentence-transformers")
+        passages = []
+        for path in args.files or glob.glob(os.path.join(ARTIFACT_DIR, "blobs", "*", "*.txt")):
+            with open(path, encoding="utf-8") as f:
+                passages += [p["text"] for p in split_passages(f.read(), tokenizer=reference.tokenizer)]
+        if not passages:
+            sys.exit("No text to compare: pass some text files.")
+        report = check_parity(passages[:args.limit], reference=reference)
+        print(f"{report['candidate']} vs {report['reference']} over {report['texts']} passages: "
+              f"min cosine {report['min_cosine']:.4f}, mean {report['mean_cosine']:.4f} (threshold {report['threshold']})")
+        print("✅ Parity OK" if report["ok"] else "❌ Parity below threshold")
+        sys.exit(0 if report["ok"] else 1)
@@ -0,0 +1,319 @@
+# ai/embedding_index.py
+#
+# Owns the embedding engine (ai/embedding_engines.py, EMBEDDING_ENGINE) and
+# the Chroma collection. Only the embedding
+# service process (ai/embedding_service.py) should import this module;
+# everything else goes through the thin client in ai/embeddings.py.
+
+import chromadb
+import numpy as np
+import hashlib
+import os
+import threading
+from contextlib import nullcontext
+
+from ai.embedding_engines import get_engine
+from ai.lexical_index import LexicalIndex
+from ai.retrieval import chroma_where, reciprocal_rank_fusion, resolve_mode
+from ai.search_cache import QueryEmbeddingCache, bump_index_generation
+from utils.chunking import join_passages, split_passages
+
+# Initialize
+CHROMA_DIR = os.getenv("CHROMA_DIR", "chroma_db")
+COLLECTION_NAME = "chapters"
+PASSAGE_TOKENS = int(os.getenv("EMBED_PASSAGE_TOKENS", "200"))  # MiniLM truncates at 256 word pieces
+PASSAGE_OVERLAP = int(os.getenv("EMBED_PASSAGE_OVERLAP", "40"))
+ENCODE_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = 1000
+model = get_engine()
+client = chromadb.PersistentClient(path=CHROMA_DIR)
+collection = client.get_or_create_collection(COLLECTION_NAME)
+lexical = LexicalIndex()  # BM25 over the same passages, written in the same batches
+
+
+def chapter_doc_id(chapter_num):
+    return f"chapter{chapter_num}"
+
+
+def chapter_passages(content: str):
+    """Overlapping, token-bounded passages of one chapter."""
+    return split_passages(content, max_tokens=PASSAGE_TOKENS, overlap=PASSAGE_OVERLAP, tokenizer=model.tokenizer)
+
+
+def encode(texts, batch_size: int = ENCODE_BATCH_SIZE):
+    return model.encode(texts, batch_size=batch_size)
+
+
+# Query vectors of the in-process index; the service keeps its own, fed by its batcher
+query_embeddings = QueryEmbeddingCache(encode)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def document_hash(content: str) -> str:
+    """Hash of a chapter's text, the passage settings it is split with and the engine that encodes it."""
+    return text_hash(f"{model.name}:{PASSAGE_TOKENS}:{PASSAGE_OVERLAP}\n{content}")
+
+
+# Cumulative counts of what store_chapters_bulk() did, for the service's stats
+store_stats = {"chapters_unchanged": 0, "chapters_changed": 0, "passages_encoded": 0, "passages_reused": 0}
+_stats_lock = threading.Lock()
+
+
+def stored_passages(doc_ids):
+    """doc_id -> the stored passages of that chapter as (id, text, metadata, embedding), in order."""
+    if not doc_ids:
+        return {}
+    existing = collection.get(where={"doc_id": {"$in": doc_ids}}, include=["documents", "metadatas", "embeddings"])
+    grouped = {}
+    for id_, doc, meta, embedding in zip(existing["ids"], existing["documents"], existing["metadatas"], existing["embeddings"]):
+        grouped.setdefault(meta["doc_id"], []).append((id_, doc, meta, embedding))
+    for passages in grouped.values():
+        passages.sort(key=lambda p: p[2].get("passage", 0))
+    return grouped
+
+
+def stored_metadata(doc_ids):
+    """doc_id -> {id: metadata} of every stored passage, plus legacy whole-chapter documents stored under their doc_id."""
+    if not doc_ids:
+        return {}
+    grouped = {doc_id: {} for doc_id in doc_ids}
+    existing = collection.get(where={"doc_id": {"$in": doc_ids}}, include=["metadatas"])
+    for id_, meta in zip(existing["ids"], existing["metadatas"]):
+        grouped[meta["doc_id"]][id_] = meta
+    legacy = collection.get(ids=list(doc_ids), include=["metadatas"])
+    for id_, meta in zip(legacy["ids"], legacy["metadatas"]):
+        grouped[id_][id_] = meta or {}
+    return grouped
+
+
+def store_chapters_bulk(chapters, batch_size: int = ENCODE_BATCH_SIZE, encoder=None, write_lock=None):
+    """
+    Splits chapters into passages, encodes the passages in large batches
+    and upserts them to Chroma in bulk. Only text the index has not seen is
+    encoded (planned from a snapshot read before the write lock):
+
+    - a chapter whose text (document_hash) is unchanged only gets its
+      metadata (title, feedback score) updated, without re-splitting it,
+      and nothing is written if that didn't change either;
+    - in a changed chapter, passages whose text hash matches one already
+      stored keep their embedding and only the rest are encoded. A passage
+      whose id still holds the same text only gets a metadata update, so
+      the vector index is rewritten for the moved and new passages alone.
+
+    `chapters` is an iterable of dicts with chapter_num, title, content and
+    feedback_score. `encoder(texts)` can replace the local batched encode,
+    e.g. with the service's cross-request batcher. Encoding runs outside
+    `write_lock`, so concurrent callers still encode together; under it the
+    stored passages are read again and the writes are diffed against that,
+    so concurrent stores of one chapter leave exactly one version of it.
+    Returns the number of passages stored.
+    """
+    chapters = list(chapters)
+    doc_ids = [chapter_doc_id(chapter["chapter_num"]) for chapter in chapters]
+    if not doc_ids:
+        return 0
+    sync_lexical_index(write_lock)  # Before the first write, or the older chapters would never reach BM25
+    existing = stored_passages(doc_ids)
+    # Vectors from another engine (or model) are never reused
+    known = {p[2]["passage_hash"]: p[3] for passages in existing.values() for p in passages
+             if "passage_hash" in p[2] and p[2].get("engine") == model.name}
+
+    ids, documents, metadatas, embeddings = [], [], [], []
+    changed_doc_ids, pending = [], {}  # pending: passage hash -> indexes still waiting for an embedding
+    rescored = {}  # doc_id -> (doc_hash, [(id, text, new metadata)]) of unchanged chapters whose metadata changed
+    for chapter, doc_id in zip(chapters, doc_ids):
+        doc_hash = document_hash(chapter["content"])
+        stored = existing.get(doc_id, [])
+        if stored and all(p[2].get("doc_hash") == doc_hash for p in stored) and len(stored) == stored[0][2].get("passages"):
+            if any(p[2].get("title") != chapter["title"] or p[2].get("score") != chapter["feedback_score"] for p in stored):
+                rescored[doc_id] = (doc_hash, [(id_, doc, {**meta, "title": chapter["title"], "score": chapter["feedback_score"]})
+                                               for id_, doc, meta, _ in stored])
+            continue
+
+        changed_doc_ids.append(doc_id)
+        passages = chapter_passages(chapter["content"])
+        for i, passage in enumerate(passages):
+            digest = text_hash(passage["text"])
+            ids.append(f"{doc_id}#p{i}")
+            documents.append(passage["text"])
+            metadatas.append({
+                "chapter": chapter["chapter_num"],
+                "title": chapter["title"],
+                "score": chapter["feedback_score"],
+                "doc_id": doc_id,
+                "passage": i,
+                "passages": len(passages),
+                "start": passage["start"],
+                "end": passage["end"],
+                "doc_hash": doc_hash,
+                "passage_hash": digest,
+                "engine": model.name,
+            })
+            embeddings.append(known.get(digest))
+            if embeddings[-1] is None:
+                pending.setdefault(digest, []).append(len(embeddings) - 1)
+    if pending:
+        texts = [documents[indexes[0]] for indexes in pending.values()]
+        vectors = encoder(texts) if encoder else encode(texts, batch_size=batch_size)
+        for indexes, vector in zip(pending.values(), vectors):
+            for i in indexes:
+                embeddings[i] = vector
+    with _stats_lock:
+        store_stats["chapters_unchanged"] += len(doc_ids) - len(changed_doc_ids)
+        store_stats["chapters_changed"] += len(changed_doc_ids)
+        store_stats["passages_encoded"] += len(pending)
+        store_stats["passages_reused"] += len(ids) - sum(len(indexes) for indexes in pending.values())
+
+    with write_lock or nullcontext():
+        current = stored_metadata(list(rescored) + changed_doc_ids)
+        # A concurrent store may have rewritten a rescored chapter since the snapshot; its version then stands
+        rescored = {doc_id: (doc_hash, passages) for doc_id, (doc_hash, passages) in rescored.items()
+                    if set(current[doc_id]) == {p[0] for p in passages}
+                    and all(meta.get("doc_hash") == doc_hash for meta in current[doc_id].values())}
+        if rescored:
+            rescored_ids = [p[0] for _, passages in rescored.values() for p in passages]
+            rescored_metadatas = [p[2] for _, passages in rescored.values() for p in passages]
+            for i in range(0, len(rescored_ids), UPSERT_BATCH_SIZE):
+                collection.update(ids=rescored_ids[i:i + UPSERT_BATCH_SIZE], metadatas=rescored_metadatas[i:i + UPSERT_BATCH_SIZE])
+            lexical.replace(list(rescored), rescored_ids, [p[1] for _, passages in rescored.values() for p in passages], rescored_metadatas)
+        if changed_doc_ids:
+            stored_hashes = {id_: meta.get("passage_hash") for doc_id in changed_doc_ids for id_, meta in current[doc_id].items()
+                             if meta.get("engine") == model.name}
+            # Drop old passages past the new end (and legacy whole-chapter vectors) so a shorter chapter leaves no stale ones behind
+            new_ids = set(ids)
+            stale = [id_ for doc_id in changed_doc_ids for id_ in current[doc_id] if id_ not in new_ids]
+            if stale:
+                collection.delete(ids=stale)
+
+            kept = [i for i, id_ in enumerate(ids) if stored_hashes.get(id_) == metadatas[i]["passage_hash"]]
+            for i in range(0, len(kept), UPSERT_BATCH_SIZE):
+                batch = kept[i:i + UPSERT_BATCH_SIZE]
+                collection.update(ids=[ids[j] for j in batch], metadatas=[metadatas[j] for j in batch])
+            written = sorted(set(range(len(ids))) - set(kept))
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            for i in range(0, len(written), UPSERT_BATCH_SIZE):
+                batch = written[i:i + UPSERT_BATCH_SIZE]
+                collection.upsert(
+                    ids=[ids[j] for j in batch],
+                    documents=[documents[j] for j in batch],
+                    embeddings=embeddings[batch],
+                    metadatas=[metadatas[j] for j in batch],
+                )
+            lexical.replace(changed_doc_ids, ids, documents, metadatas)
+        if rescored or changed_doc_ids:
+            bump_index_generation()  # Expires cached search results in every process
+    return len(ids) + sum(len(existing[doc_id]) for doc_id in set(doc_ids) - set(changed_doc_ids))
+
+
+def sync_lexical_index(write_lock=None):
+    """
+    Rebuilds the BM25 index from Chroma once, for collections built before
+    it existed. The index records that it was synced, so a chapter written
+    to it first (e.g. one approval after an upgrade) can't hide the older
+    chapters that are only in Chroma. Once synced, this is a flag check.
+    """
+    if lexical.synced():
+        return 0
+    with write_lock or nullcontext():
+        if lexical.synced():
+            return 0
+        existing = collection.get(include=["documents", "metadatas"])
+        metadatas = [dict(meta or {}, doc_id=(meta or {}).get("doc_id", id_)) for id_, meta in zip(existing["ids"], existing["metadatas"])]
+        lexical.rebuild(existing["ids"], existing["documents"], metadatas)
+        return len(existing["ids"])
+
+
+def search_similar_chapters(query, top_k=3, offset=0, query_cache=None, filters=None, mode=None, write_lock=None):
+    """
+    Returns the best-matching passage of each of the closest chapters, ranks
+    `offset` to `offset + top_k`, in the same shape as a Chroma query result
+    plus the fused "scores".
+
+    mode "vector" ranks passages by embedding distance (the query vector
+    comes from `query_cache`, an LRU in front of the model), "lexical" by
+    BM25, and "hybrid" fuses both rankings with reciprocal rank fusion.
+    `filters` (min_score, max_score, chapters, title) are pushed down into
+    both the Chroma `where` clause and the BM25 query.
+    """
+    mode = resolve_mode(mode)
+    results = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]], "scores": [[]]}
+    total = collection.count()
+    if total == 0:
+        return results
+
+    # Several passages of one chapter can match; over-fetch, then keep the best per chapter
+    wanted = offset + top_k
+    fetch = min(total, wanted * 5)
+    rankings, candidates = [], {}
+    if mode != "lexical":
+        embedding = (query_cache or query_embeddings).encode(query)
+        raw = collection.query(query_embeddings=[embedding], n_results=fetch, where=chroma_where(filters))
+        rankings.append(raw["ids"][0])
+        for id_, doc, meta, dist in zip(raw["ids"][0], raw["documents"][0], raw["metadatas"][0], raw["distances"][0]):
+            candidates[id_] = (doc, meta, dist)
+    if mode != "vector":
+        sync_lexical_index(write_lock)
+        hits = lexical.search(query, fetch, filters)
+        rankings.append([id_ for id_, _, _, _ in hits])
+        for id_, doc, meta, _ in hits:
+            candidates.setdefault(id_, (doc, meta, None))
+
+    seen = set()
+    for id_, score in reciprocal_rank_fusion(*rankings):
+        doc, meta, dist = candidates[id_]
+        doc_id = meta.get("doc_id", id_)
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+        if len(seen) <= offset:
+            continue
+        results["ids"][0].append(id_)
+        results["documents"][0].append(doc)
+        results["metadatas"][0].append(meta)
+        results["distances"][0].append(dist)
+        results["scores"][0].append(score)
+        if len(seen) == wanted:
+            break
+    return results
+
+
+def backfill(batch_size: int = ENCODE_BATCH_SIZE, chapters_per_batch: int = 32, encoder=None, write_lock=None):
+    """
+    Re-indexes everything already in the collection with the current
+    passage settings. Legacy whole-chapter documents are split into passages,
+    and passage-indexed chapters are stitched back together first.
+    """
+    existing = collection.get(include=["documents", "metadatas"])
+    grouped = {}
+    for id_, doc, meta in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+        meta = meta or {}
+        doc_id = meta.get("doc_id", id_)
+        entry = grouped.setdefault(doc_id, {
+            "chapter_num": meta.get("chapter", doc_id.replace("chapter", "")),
+            "title": meta.get("title", "Untitled"),
+            "feedback_score": meta.get("score", 0),
+            "passages": [],
+        })
+        if "start" in meta:
+            entry["passages"].append({"text": doc, "start": meta["start"], "end": meta["end"]})
+        else:
+            entry["passages"] = [{"text": doc, "start": 0, "end": len(doc)}]
+
+    chapters = []
+    for entry in grouped.values():
+        chapters.append({
+            "chapter_num": entry["chapter_num"],
+            "title": entry["title"],
+            "feedback_score": entry["feedback_score"],
+            "content": join_passages(entry["passages"]),
+        })
+
+    stored = 0
+    for i in range(0, len(chapters), chapters_per_batch):
+        stored += store_chapters_bulk(chapters[i:i + chapters_per_batch], batch_size=batch_size, encoder=encoder, write_lock=write_lock)
+    print(f"📦 Backfilled {len(chapters)} chapters into {stored} passages.")
+    return stored
+
@@ -0,0 +1,340 @@
+# ai/embedding_service.py
+"""
+Local embedding/indexing service.
+
+One process loads MiniLM and owns the only Chroma writer. API workers and
+scripts talk to it over a Unix socket, and encode requests arriving from
+all of them are batched together.
+
+Requests and responses are length-prefixed JSON frames, never pickles.
+The socket is created owner-only (0600) and a connection must first send
+the service's auth key: EMBEDDING_SERVICE_AUTHKEY, or a random per-install
+key generated next to the socket (`<socket>.key`, mode 0600).
+
+    python -m ai.embedding_service
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import queue
+import socket
+import struct
+import secrets
+import threading
+import subprocess
+from concurrent.futures import Future
+
+from ai.search_cache import QueryEmbeddingCache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SOCKET_PATH = os.getenv("EMBEDDING_SOCKET", os.path.join(os.getenv("CHROMA_DIR", "chroma_db"), "embedding_service.sock"))
+AUTHKEY = os.getenv("EMBEDDING_SERVICE_AUTHKEY", "")  # Empty: use the per-install key file
+MAX_BATCH = int(os.getenv("EMBED_SERVICE_MAX_BATCH", "128"))
+BATCH_WAIT_MS = float(os.getenv("EMBED_SERVICE_BATCH_WAIT_MS", "5"))
+START_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_SERVICE_START_TIMEOUT", "120"))
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+_FRAME_HEADER = struct.Struct(">I")
+
+
+class EmbeddingServiceError(RuntimeError):
+    pass
+
+
+# === Transport ===
+def load_authkey(address: str = SOCKET_PATH) -> str:
+    """EMBEDDING_SERVICE_AUTHKEY, or the key in `<address>.key`, created (0600) on first use."""
+    if AUTHKEY:
+        return AUTHKEY
+    path = address + ".key"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(tmp_path, path)  # Atomic and never overwrites: the first process to create the key wins
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp_path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def _to_json(value):
+    if hasattr(value, "tolist"):  # numpy arrays and scalars
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class JsonConnection:
+    """One Unix socket carrying length-prefixed JSON frames."""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def send(self, obj):
+        payload = json.dumps(obj, default=_to_json).encode("utf-8")
+        self.sock.sendall(_FRAME_HEADER.pack(len(payload)) + payload)
+
+    def recv(self):
+        (size,) = _FRAME_HEADER.unpack(self._read(_FRAME_HEADER.size))
+        if size > MAX_FRAME_BYTES:
+            raise OSError(f"Embedding service frame too large: {size} bytes")
+        return json.loads(self._read(size).decode("utf-8"))
+
+    def _read(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise EOFError("Embedding service connection closed")
+            data += chunk
+        return bytes(data)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def connect(address: str = SOCKET_PATH, authkey: str = None) -> JsonConnection:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    conn = JsonConnection(sock)
+    conn.send({"authkey": authkey or load_authkey(address)})
+    response = conn.recv()
+    if not response.get("ok"):
+        conn.close()
+        raise EmbeddingServiceError(response.get("error", "Embedding service refused the connection"))
+    return conn
+
+
+class EncodeBatcher:
+    """
+    Collects encode requests from every connection and runs them through
+    the model together: a batch closes after `max_batch` texts or
+    `wait_ms` milliseconds, whichever comes first.
+    """
+
+    def __init__(self, encode_fn, max_batch: int = MAX_BATCH, wait_ms: float = BATCH_WAIT_MS):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self.batches = 0
+        self.texts = 0
+        self._requests = queue.Queue()
+        threading.Thread(target=self._loop, name="encode-batcher", daemon=True).start()
+
+    def encode(self, texts):
+        if not texts:
+            return []
+        future = Future()
+        self._requests.put((list(texts), future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            pending = [self._requests.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            texts = [t for item_texts, _ in pending for t in item_texts]
+            try:
+                vectors = self.encode_fn(texts)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+class EmbeddingService:
+    """Serves store/search/backfill requests on a Unix socket."""
+
+    def __init__(self, address: str = SOCKET_PATH, index=None):
+        if index is None:
+            from ai import embedding_index as index  # Loads the model; only the service pays for it
+
+        self.index = index
+        self.address = address
+        self.authkey = load_authkey(address)
+        self.batcher = EncodeBatcher(index.encode)
+        self.query_embeddings = QueryEmbeddingCache(self.batcher.encode)  # Shared by every API worker
+        self._write_lock = threading.Lock()  # The single Chroma writer
+
+    def handle(self, request: dict):
+        op = request.get("op")
+        if op == "ping":
+            return "pong"
+        if op == "encode":
+            return self.batcher.encode(request["texts"])
+        if op == "store":
+            return self.index.store_chapters_bulk(request["chapters"], encoder=self.batcher.encode, write_lock=self._write_lock)
+        if op == "search":
+            return self.index.search_similar_chapters(
+                request["query"], top_k=request.get("top_k", 3), offset=request.get("offset", 0), query_cache=self.query_embeddings,
+                filters=request.get("filters"), mode=request.get("mode"), write_lock=self._write_lock,
+            )
+        if op == "backfill":
+            return self.index.backfill(encoder=self.batcher.encode, write_lock=self._write_lock)
+        if op == "stats":
+            return {"passages": self.index.collection.count(), "batches": self.batcher.batches, "texts": self.batcher.texts,
+                    "query_embeddings": self.query_embeddings.stats(), "stores": dict(self.index.store_stats),
+                    "engine": self.index.model.name}
+        raise ValueError(f"Unknown embedding service op: {op}")
+
+    def _serve_connection(self, conn):
+        with conn:
+            try:
+                hello = conn.recv()
+            except (EOFError, OSError, ValueError):
+                return
+            key = hello.get("authkey") if isinstance(hello, dict) else None
+            if not isinstance(key, str) or not hmac.compare_digest(key.encode("utf-8"), self.authkey.encode("utf-8")):
+                conn.send({"ok": False, "error": "Embedding service authentication failed"})
+                return
+            conn.send({"ok": True})
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError, ValueError):
+                    return
+                try:
+                    response = {"ok": True, "result": self.handle(request)}
+                except Exception as e:
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                try:
+                    conn.send(response)
+                except OSError:
+                    return
+
+    def listen(self):
+        """Binds the owner-only socket; serve_forever() accepts on it."""
+        os.makedirs(os.path.dirname(self.address) or ".", exist_ok=True)
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # Stale socket from a previous run
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)  # No window where another user could connect
+        try:
+            listener.bind(self.address)
+        finally:
+            os.umask(umask)
+        os.chmod(self.address, 0o600)
+        listener.listen(64)
+        return listener
+
+    def serve_forever(self, listener=None):
+        listener = listener or self.listen()
+        with listener:
+            print(f"🧬 Embedding service listening on {self.address}")
+            while True:
+                sock, _ = listener.accept()
+                threading.Thread(target=self._serve_connection, args=(JsonConnection(sock),), daemon=True).start()
+
+
+class EmbeddingServiceClient:
+    """
+    Thin client used by every worker. Keeps one connection per thread and
+    starts the service on first use if nothing is listening yet.
+    """
+
+    def __init__(self, address: str = SOCKET_PATH, autostart: bool = True):
+        self.address = address
+        self.autostart = autostart
+        self._local = threading.local()
+
+    def _connect(self):
+        try:
+            return connect(self.address)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not self.autostart:
+                raise
+        self._start_service()
+        return connect(self.address)
+
+    def _start_service(self):
+        os.makedirs(os.path.dirname(self.address) or ".", exist_ok=True)
+        with open(self.address + ".lock", "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self._listening():
+                return  # Another worker started it while we waited for the lock
+            log = open(self.address + ".log", "ab")
+            subprocess.Popen(
+                [sys.executable, "-m", "ai.embedding_service"],
+                stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+                env={**os.environ, "EMBEDDING_SOCKET": self.address},
+            )
+            deadline = time.monotonic() + START_TIMEOUT_SECONDS
+            while time.monotonic() < deadline:
+                if self._listening():
+                    return
+                time.sleep(0.2)
+        raise EmbeddingServiceError(f"Embedding service did not start; see {self.address}.log")
+
+    def _listening(self):
+        try:
+            connect(self.address).close()
+            return True
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+
+    def call(self, op: str, **kwargs):
+        request = {"op": op, **kwargs}
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.send(request)
+                response = conn.recv()
+                break
+            except (EOFError, OSError):
+                # Service restarted under us; reconnect once
+                self._local.conn = None
+                if attempt:
+                    raise
+        if not response["ok"]:
+            raise EmbeddingServiceError(response["error"])
+        return response["result"]
+
+
+if __name__ == "__main__":
+    EmbeddingService().serve_forever()
@@ -1,33 +1,69 @@
 # ai/embeddings.py
+#
+# Thin client for the shared embedding service (ai/embedding_service.py),
+# so importing this module no longer loads MiniLM or opens Chroma.
+# Set EMBEDDING_SERVICE=off to run the index in-process instead.
 
-import chromadb
-from sentence_transformers import SentenceTransformer
 import os
 
-# Initialize
-CHROMA_DIR = "chroma_db"
-COLLECTION_NAME = "chapters"
-model = SentenceTransformer("all-MiniLM-L6-v2")
-client = chromadb.PersistentClient(path=CHROMA_DIR)
-collection = client.get_or_create_collection(COLLECTION_NAME)
+from ai.embedding_service import EmbeddingServiceClient
+
+EMBEDDING_SERVICE = os.getenv("EMBEDDING_SERVICE", "auto").lower()
+
+_client = None
+
+
+def _local_index():
+    from ai import embedding_index
+    return embedding_index
+
+
+def _service():
+    global _client
+    if _client is None:
+        _client = EmbeddingServiceClient()
+    return _client
+
+
+def store_chapters_bulk(chapters):
+    chapters = list(chapters)
+    if EMBEDDING_SERVICE == "off":
+        return _local_index().store_chapters_bulk(chapters)
+    return _service().call("store", chapters=chapters)
+
 
 def store_chapter_embedding(chapter_num, title, content, feedback_score):
-    embedding = model.encode(content)
-    doc_id = f"chapter{chapter_num}"
-
-    collection.upsert(
-        documents=[content],
-        embeddings=[embedding],
-        ids=[doc_id],
-        metadatas=[{
-            "chapter": chapter_num,
-            "title": title,
-            "score": feedback_score
-        }]
-    )
-    print(f"📦 Embedded chapter {chapter_num} into ChromaDB.")
-
-def search_similar_chapters(query, top_k=3):
-    embedding = model.encode(query)
-    results = collection.query(query_embeddings=[embedding], n_results=top_k)
-    return results
+    count = store_chapters_bulk([{
+        "chapter_num": chapter_num,
+        "title": title,
+        "content": content,
+        "feedback_score": feedback_score,
+    }])
+    print(f"📦 Embedded chapter {chapter_num} into ChromaDB ({count} passages).")
+
+
+def search_similar_chapters(query, top_k=3, offset=0, filters=None, mode=None):
+    """
+    Hybrid (BM25 + vector), "vector" or "lexical" search; `filters` takes
+    min_score, max_score, chapters and title (see ai.retrieval).
+    """
+    if EMBEDDING_SERVICE == "off":
+        return _local_index().search_similar_chapters(query, top_k=top_k, offset=offset, filters=filters, mode=mode)
+    return _service().call("search", query=query, top_k=top_k, offset=offset, filters=filters, mode=mode)
+
+
+def backfill():
+    if EMBEDDING_SERVICE == "off":
+        return _local_index().backfill()
+    return _service().call("backfill")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chapter embedding maintenance")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        print(f"📦 Backfilled {backfill()} passages.")
@@ -0,0 +1,117 @@
+# ai/feedback_stats.py
+
+import os
+import json
+import threading
+from collections import deque
+
+from ai.human_feedback import FEEDBACK_LOG_PATH, ensure_migrated
+
+RECENT_WINDOW = int(os.getenv("FEEDBACK_RECENT_WINDOW", "20"))
+NEUTRAL_SCORE = 3.0
+
+
+class FeedbackStats:
+    """
+    Running aggregates over the append-only feedback log: count, sum,
+    mean of the last `window` scores and per-chapter means.
+
+    Every query first stat()s the log and folds in only the bytes appended
+    since the last look; the whole file is re-read only if it was replaced
+    or truncated. Each aggregate is then answered in constant time.
+    """
+
+    def __init__(self, path: str = FEEDBACK_LOG_PATH, window: int = RECENT_WINDOW):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.total = 0
+        self.recent = deque(maxlen=self.window)
+        self.recent_total = 0
+        self.chapters = {}  # chapter -> [count, total]
+        self._offset = 0
+        self._file_id = None
+
+    def add(self, entry: dict):
+        score = entry.get("score")
+        if isinstance(score, bool) or not isinstance(score, (int, float)):
+            return
+        self.count += 1
+        self.total += score
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_total -= self.recent[0]
+        self.recent.append(score)
+        self.recent_total += score
+        chapter = entry.get("chapter")
+        if chapter is not None:
+            agg = self.chapters.setdefault(str(chapter), [0, 0])
+            agg[0] += 1
+            agg[1] += score
+
+    def refresh(self):
+        """Picks up entries appended to the log on disk since the last call."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self._file_id is not None:
+                    self._reset()
+                return
+            file_id = (st.st_dev, st.st_ino)
+            if file_id != self._file_id or st.st_size < self._offset:
+                self._reset()
+                self._file_id = file_id
+            if st.st_size == self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(st.st_size - self._offset)
+            # Only consume complete lines; a half-written tail is picked up next time
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                try:
+                    self.add(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                    continue
+            self._offset += end
+
+    def mean(self, default: float = NEUTRAL_SCORE) -> float:
+        self.refresh()
+        return self.total / self.count if self.count else default
+
+    def recent_mean(self, default: float = NEUTRAL_SCORE) -> float:
+        self.refresh()
+        return self.recent_total / len(self.recent) if self.recent else default
+
+    def chapter_mean(self, chapter, default: float = NEUTRAL_SCORE) -> float:
+        self.refresh()
+        agg = self.chapters.get(str(chapter))
+        return agg[1] / agg[0] if agg else default
+
+    def snapshot(self) -> dict:
+        self.refresh()
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "recent_mean": self.recent_total / len(self.recent) if self.recent else None,
+            "chapters": {c: agg[1] / agg[0] for c, agg in self.chapters.items()},
+        }
+
+
+_default_stats = None
+_default_lock = threading.Lock()
+
+
+def get_feedback_stats() -> FeedbackStats:
+    """Process-wide stats over the default feedback log."""
+    global _default_stats
+    with _default_lock:
+        if _default_stats is None:
+            ensure_migrated()
+            _default_stats = FeedbackStats()
+        return _default_stats
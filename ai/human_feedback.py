@@ -1,30 +1,167 @@
 import os
 import json
+import time
+import atexit
+import threading
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows: rely on O_APPEND alone
+    fcntl = None
+
 # === Constants ===
-FEEDBACK_LOG_PATH = "feedback/feedback_log.json"
+FEEDBACK_LOG_PATH = "feedback/feedback_log.jsonl"
+LEGACY_FEEDBACK_LOG_PATH = "feedback/feedback_log.json"
+FSYNC_EVERY = int(os.getenv("FEEDBACK_FSYNC_EVERY", "32"))
+FSYNC_INTERVAL_SECONDS = float(os.getenv("FEEDBACK_FSYNC_INTERVAL", "1.0"))
 os.makedirs("feedback", exist_ok=True)
 
+
+class FeedbackLog:
+    """
+    Append-only JSONL feedback log.
+
+    Each entry is written as one line with a single write() on an O_APPEND
+    descriptor under an exclusive flock, so concurrent writers (threads or
+    processes) never interleave or lose entries. fsync is batched: it runs
+    every `fsync_every` appends or `fsync_interval` seconds, and on close.
+    """
+
+    def __init__(self, path: str = FEEDBACK_LOG_PATH, fsync_every: int = FSYNC_EVERY,
+                 fsync_interval: float = FSYNC_INTERVAL_SECONDS):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fd = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def append(self, entry: dict):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            fd = self._open()
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                os.write(fd, line)
+            finally:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        if self._fd is not None and self._unsynced:
+            os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def read(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print("⚠️ Warning: Skipping corrupted feedback line.")
+        return entries
+
+
+def migrate_legacy_log(legacy_path: str = LEGACY_FEEDBACK_LOG_PATH, log_path: str = FEEDBACK_LOG_PATH) -> int:
+    """
+    One-shot migration of the old whole-file JSON log into the JSONL log.
+    The old file is kept as `<name>.migrated`. Returns the number of entries moved.
+    """
+    if not os.path.exists(legacy_path):
+        return 0
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    with open(log_path + ".lock", "w") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Another process may have finished the migration while we waited
+        if not os.path.exists(legacy_path):
+            return 0
+        return _migrate_locked(legacy_path, log_path)
+
+
+def _migrate_locked(legacy_path, log_path):
+    try:
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except json.JSONDecodeError:
+        print("⚠️ Warning: Legacy feedback log is corrupted. Skipping migration.")
+        return 0
+    if not isinstance(data, list):
+        print("⚠️ Warning: Legacy feedback log was not a list. Skipping migration.")
+        return 0
+
+    # Legacy entries go before anything already appended to the new log
+    existing = b""
+    if os.path.exists(log_path):
+        with open(log_path, "rb") as f:
+            existing = f.read()
+    tmp_path = log_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for entry in data:
+            f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.write(existing)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, log_path)
+    os.replace(legacy_path, legacy_path + ".migrated")
+    print(f"📦 Migrated {len(data)} feedback entries to {log_path}")
+    return len(data)
+
+
+_log = FeedbackLog()
+_migration_lock = threading.Lock()
+_migrated = False
+atexit.register(_log.close)
+
+
+def ensure_migrated():
+    global _migrated
+    if _migrated:
+        return
+    with _migration_lock:
+        if not _migrated:
+            migrate_legacy_log(log_path=_log.path)
+            _migrated = True
+
+
 # === Load Existing Feedback Log ===
 def load_feedback():
-    if os.path.exists(FEEDBACK_LOG_PATH):
-        try:
-            with open(FEEDBACK_LOG_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    return data
-                else:
-                    print("⚠️ Warning: Feedback log was not a list. Resetting.")
-                    return []
-        except json.JSONDecodeError:
-            print("⚠️ Warning: Feedback log is corrupted. Starting fresh.")
-            return []
-    return []
+    ensure_migrated()
+    return _log.read()
 
 # === Save Feedback Entry ===
 def save_feedback(chapter_num, decision, score):
-    logs = load_feedback()
+    ensure_migrated()
 
     feedback_entry = {
         "chapter": f"chapter{chapter_num}",
@@ -33,16 +170,13 @@ def save_feedback(chapter_num, decision, score):
         "timestamp": datetime.utcnow().isoformat() + "Z"
     }
 
-    logs.append(feedback_entry)
-
-    with open(FEEDBACK_LOG_PATH, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2)
+    _log.append(feedback_entry)
 
     print(f"✅ Score {score}/5 recorded for Chapter {chapter_num}")
 
 # === Unified Logger Used in API ===
 def log_feedback(score: int, context: str = ""):
-    logs = load_feedback()
+    ensure_migrated()
 
     feedback_entry = {
         "timestamp": datetime.utcnow().isoformat() + "Z",
@@ -50,9 +184,16 @@ def log_feedback(score: int, context: str = ""):
         "context": context  # Changed from "comment" to "context"
     }
 
-    logs.append(feedback_entry)
-
-    with open(FEEDBACK_LOG_PATH, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2)
+    _log.append(feedback_entry)
 
     print(f"✅ Feedback score {score}/5 logged successfully.")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["migrate"]:
+        count = migrate_legacy_log()
+        print(f"✅ Migration finished ({count} entries).")
+    else:
+        print("Usage: python -m ai.human_feedback migrate")
@@ -0,0 +1,113 @@
+# ai/lexical_index.py
+"""
+BM25 keyword index of the chapter passages in SQLite FTS5, kept next to the
+Chroma collection and written alongside it. Exact names of characters and
+places, which the MiniLM vectors blur together, are matched here.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from ai.retrieval import normalize_filters
+
+CHROMA_DIR = os.getenv("CHROMA_DIR", "chroma_db")
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(CHROMA_DIR, "lexical.db"))
+TITLE_WEIGHT = float(os.getenv("LEXICAL_TITLE_WEIGHT", "0.5"))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(query: str) -> str:
+    """Every word of the query as a quoted FTS5 term, OR-ed so BM25 ranks partial matches too."""
+    return " OR ".join(f'"{token}"' for token in _TOKEN_RE.findall(query.lower()))
+
+
+class LexicalIndex:
+    """
+    One FTS5 row per passage: its text and chapter title are indexed; the
+    ids, chapter, feedback score and full metadata ride along unindexed.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(
+                text, title,
+                id UNINDEXED, doc_id UNINDEXED, chapter UNINDEXED, score UNINDEXED, meta UNINDEXED,
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            )
+            """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self._synced = False
+
+    def _insert(self, ids, documents, metadatas):
+        rows = [
+            (doc, meta.get("title", ""), id_, meta.get("doc_id", id_), str(meta.get("chapter", "")), meta.get("score"), json.dumps(meta))
+            for id_, doc, meta in zip(ids, documents, metadatas)
+        ]
+        self._conn.executemany(
+            "INSERT INTO passages (text, title, id, doc_id, chapter, score, meta) VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+    def replace(self, doc_ids, ids, documents, metadatas):
+        """Drops every passage of `doc_ids`, then inserts the given ones (the same batch as the Chroma upsert)."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM passages WHERE doc_id = ?", [(d,) for d in doc_ids])
+            self._insert(ids, documents, metadatas)
+
+    def rebuild(self, ids, documents, metadatas):
+        """Replaces the whole index with the given passages and marks it synced, in one transaction."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM passages")
+            self._insert(ids, documents, metadatas)
+            self._conn.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('synced', '1')")
+        self._synced = True
+
+    def synced(self) -> bool:
+        """True once rebuild() has filled the index from the vector store; only the first True costs a query."""
+        if not self._synced:
+            with self._lock:
+                self._synced = self._conn.execute("SELECT 1 FROM index_meta WHERE key = 'synced'").fetchone() is not None
+        return self._synced
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM passages").fetchone()[0]
+
+    def search(self, query: str, limit: int, filters: dict = None):
+        """(id, text, metadata, bm25) of the best `limit` passages; lower bm25 is better."""
+        expression = match_expression(query)
+        if not expression:
+            return []
+        sql = [f"SELECT id, text, meta, bm25(passages, 1.0, {TITLE_WEIGHT}) AS rank FROM passages WHERE passages MATCH ?"]
+        params = [expression]
+        filters = normalize_filters(filters)
+        if "min_score" in filters:
+            sql.append("AND score >= ?")
+            params.append(filters["min_score"])
+        if "max_score" in filters:
+            sql.append("AND score <= ?")
+            params.append(filters["max_score"])
+        if "chapters" in filters:
+            sql.append(f"AND chapter IN ({', '.join('?' * len(filters['chapters']))})")
+            params.extend(filters["chapters"])
+        if "title" in filters:
+            sql.append("AND title = ?")
+            params.append(filters["title"])
+        sql.append("ORDER BY rank LIMIT ?")
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(" ".join(sql), params).fetchall()
+        return [(id_, text, json.loads(meta), rank) for id_, text, meta, rank in rows]
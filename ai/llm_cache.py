@@ -0,0 +1,200 @@
+# ai/llm_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils.metrics import record_llm_usage
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.db")
+CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+
+def make_cache_key(model: str, messages: list, temperature: float, max_tokens: int) -> str:
+    """
+    Content address of one completion request: the model, every message
+    (system prompt with its adaptive instruction, plus the input text),
+    temperature and max_tokens.
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent on-disk cache of LLM completions, keyed by make_cache_key().
+
+    Entries older than `ttl_seconds` are treated as misses, and the least
+    recently used entries are evicted once the cache exceeds `max_bytes`
+    or `max_entries`.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = int(CACHE_MAX_MB * 1024 * 1024),
+                 ttl_seconds: float = CACHE_TTL_SECONDS, max_entries: int = None):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_access ON completions(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+            return
+        rows = self._conn.execute("SELECT key, size FROM completions ORDER BY last_access").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                break
+            doomed.append((key,))
+            total -= size
+            count -= 1
+        self._conn.executemany("DELETE FROM completions WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
+
+
+def cached_completion(gateway, model: str, messages: list, temperature: float, max_tokens: int, use_cache: bool = True) -> str:
+    """
+    Returns the completion text for a chat request sent through `gateway`
+    (an ai.llm_gateway.LLMGateway), serving it from the on-disk cache when
+    the exact same request was answered before.
+    Pass use_cache=False to force a fresh round-trip (the result still refreshes the cache).
+    """
+    cache = None if CACHE_DISABLED else get_llm_cache()
+    key = make_cache_key(model, messages, temperature, max_tokens)
+
+    if cache is not None and use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            record_llm_usage(model, cached=True)
+            return cached
+
+    response = gateway.complete(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+    content = response.choices[0].message.content
+    record_llm_usage(model, response.usage)
+
+    if cache is not None and content:
+        cache.put(key, content)
+    return content
+
+
+def cached_completion_stream(gateway, model: str, messages: list, temperature: float, max_tokens: int, use_cache: bool = True):
+    """
+    Streaming variant of cached_completion(): yields text deltas as the
+    model produces them and caches the full text once the stream ends.
+    A cache hit is yielded as a single chunk.
+    """
+    cache = None if CACHE_DISABLED else get_llm_cache()
+    key = make_cache_key(model, messages, temperature, max_tokens)
+
+    if cache is not None and use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            record_llm_usage(model, cached=True)
+            yield cached
+            return
+
+    stream = gateway.stream(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream_options={"include_usage": True}
+    )
+    parts = []
+    usage = None
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage = chunk.usage  # Sent on the final chunk
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    content = "".join(parts)
+    record_llm_usage(model, usage)
+    if cache is not None and content:
+        cache.put(key, content)
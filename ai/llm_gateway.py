@@ -0,0 +1,207 @@
+# ai/llm_gateway.py
+
+import asyncio
+import importlib.util
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+
+import httpx
+import openai
+from dotenv import load_dotenv
+
+from utils.metrics import LLM_RETRIES
+
+load_dotenv()
+
+LLM_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))  # In-flight requests, all models
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "4"))  # In-flight requests per model
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+HTTP2 = importlib.util.find_spec("h2") is not None  # httpx needs h2 for HTTP/2; falls back to HTTP/1.1 keep-alive
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+def llm_api_key():
+    """OpenRouter key, falling back to the OPENAI_API_KEY name the editor used to read."""
+    return os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENAI_API_KEY")
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONCURRENCY * 2,
+        max_keepalive_connections=LLM_MAX_CONCURRENCY,
+        keepalive_expiry=60,
+    )
+
+
+def retry_delay(error, attempt: int) -> float:
+    """Seconds to wait before retry `attempt` (0-based): Retry-After when the server sent one, else jittered exponential backoff."""
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    if headers.get("retry-after-ms"):
+        try:
+            return min(float(headers["retry-after-ms"]) / 1000, LLM_BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        value = headers["retry-after"]
+        try:
+            return min(max(float(value), 0), LLM_BACKOFF_MAX_SECONDS)
+        except ValueError:
+            try:
+                return min(max(parsedate_to_datetime(value).timestamp() - time.time(), 0), LLM_BACKOFF_MAX_SECONDS)
+            except (TypeError, ValueError):
+                pass
+    backoff = min(LLM_BACKOFF_SECONDS * 2 ** attempt, LLM_BACKOFF_MAX_SECONDS)
+    return backoff * random.uniform(0.5, 1)
+
+
+def _retry_reason(error) -> str:
+    status = getattr(error, "status_code", None)
+    return str(status) if status else type(error).__name__
+
+
+class LLMGateway:
+    """
+    The one place the pipeline talks to the LLM provider from threads.
+
+    All stages share one keep-alive connection pool (HTTP/2 when h2 is
+    installed). At most `max_concurrency` requests are in flight overall
+    and `model_concurrency` per model. 429/5xx and connection errors are
+    retried with backoff that honours Retry-After, without holding a
+    concurrency slot while waiting.
+    """
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str = None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 model_concurrency: int = LLM_MODEL_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES, sleep=time.sleep,
+                 http_client: httpx.Client = None):
+        self.http_client = http_client or httpx.Client(http2=HTTP2, limits=_limits(), timeout=LLM_TIMEOUT_SECONDS)
+        self.client = openai.OpenAI(
+            api_key=api_key or llm_api_key(),
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=0,  # Retries happen here, outside the concurrency slot
+        )
+        self.max_retries = max_retries
+        self.model_concurrency = model_concurrency
+        self._sleep = sleep
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._per_model = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _slot(self, model: str):
+        with self._lock:
+            model_semaphore = self._per_model.setdefault(model, threading.BoundedSemaphore(self.model_concurrency))
+        with model_semaphore, self._global:
+            yield
+
+    def _with_retries(self, model: str, request):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._slot(model):
+                    return request()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                LLM_RETRIES.inc(model=model, reason=_retry_reason(e))
+                self._sleep(retry_delay(e, attempt))
+
+    def complete(self, model: str, messages: list, **kwargs):
+        """chat.completions.create() through the shared pool, limits and retries."""
+        return self._with_retries(model, lambda: self.client.chat.completions.create(model=model, messages=messages, **kwargs))
+
+    def stream(self, model: str, messages: list, **kwargs):
+        """
+        Yields the chunks of a streamed completion. Opening the stream is
+        retried; once chunks are flowing, errors are raised to the caller.
+        The concurrency slot is held until the stream is exhausted or closed.
+        """
+        for attempt in range(self.max_retries + 1):
+            with self._slot(model):
+                try:
+                    stream = self.client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    error = e
+                else:
+                    with stream:
+                        yield from stream
+                    return
+            LLM_RETRIES.inc(model=model, reason=_retry_reason(error))
+            self._sleep(retry_delay(error, attempt))
+
+    def close(self):
+        self.http_client.close()
+
+
+class AsyncLLMGateway:
+    """asyncio twin of LLMGateway, for the crawler in main_ai.py. Bound to the event loop it is first used on."""
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str = None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 model_concurrency: int = LLM_MODEL_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES, sleep=asyncio.sleep,
+                 http_client: httpx.AsyncClient = None):
+        self.http_client = http_client or httpx.AsyncClient(http2=HTTP2, limits=_limits(), timeout=LLM_TIMEOUT_SECONDS)
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key or llm_api_key(),
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        self.max_retries = max_retries
+        self.model_concurrency = model_concurrency
+        self._sleep = sleep
+        self._global = asyncio.BoundedSemaphore(max_concurrency)
+        self._per_model = {}
+
+    @asynccontextmanager
+    async def _slot(self, model: str):
+        model_semaphore = self._per_model.setdefault(model, asyncio.BoundedSemaphore(self.model_concurrency))
+        async with model_semaphore, self._global:
+            yield
+
+    async def complete(self, model: str, messages: list, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._slot(model):
+                    return await self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                LLM_RETRIES.inc(model=model, reason=_retry_reason(e))
+                await self._sleep(retry_delay(e, attempt))
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+
+_default_gateway = None
+_default_lock = threading.Lock()
+_async_gateways = weakref.WeakKeyDictionary()
+
+
+def get_llm_gateway() -> LLMGateway:
+    global _default_gateway
+    with _default_lock:
+        if _default_gateway is None:
+            _default_gateway = LLMGateway()
+        return _default_gateway
+
+
+def get_async_llm_gateway() -> AsyncLLMGateway:
+    """One async gateway per running event loop, since its pool and semaphores belong to that loop."""
+    loop = asyncio.get_running_loop()
+    gateway = _async_gateways.get(loop)
+    if gateway is None:
+        gateway = _async_gateways[loop] = AsyncLLMGateway()
+    return gateway
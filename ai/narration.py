@@ -0,0 +1,292 @@
+# ai/narration.py
+"""
+Chapter narration. The text is split into paragraph (and, for long
+paragraphs, sentence) segments; each segment is synthesized by pyttsx3 in
+a pool of worker processes and cached as a WAV under a hash of its text
+and the voice settings, so a re-edited chapter only re-synthesizes the
+paragraphs that changed. pyttsx3's macOS driver writes AIFF whatever the
+file is called, so segments are converted to WAV before they are cached.
+The segments are joined into one WAV and encoded locally with ffmpeg
+(MP3 or Ogg/Opus), falling back to WAV without it.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import warnings
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+NARRATION_CACHE_DIR = os.getenv("NARRATION_CACHE_DIR", "cache/narration")
+NARRATION_WORKERS = int(os.getenv("NARRATION_WORKERS", str(min(4, os.cpu_count() or 1))))
+NARRATION_SEGMENT_CHARS = int(os.getenv("NARRATION_SEGMENT_CHARS", "1000"))
+NARRATION_PAUSE_MS = int(os.getenv("NARRATION_PAUSE_MS", "300"))
+NARRATION_FORMAT = os.getenv("NARRATION_FORMAT", "mp3").lower()
+NARRATION_BITRATE = os.getenv("NARRATION_BITRATE", "48k")
+NARRATION_RATE = int(os.getenv("NARRATION_RATE", "180"))
+NARRATION_VOICE = os.getenv("NARRATION_VOICE", "")
+NARRATION_VOLUME = float(os.getenv("NARRATION_VOLUME", "1.0"))
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+# Output format -> (file extension, MIME type, ffmpeg codec arguments)
+FORMATS = {
+    "mp3": (".mp3", "audio/mpeg", ["-c:a", "libmp3lame"]),
+    "ogg": (".ogg", "audio/ogg", ["-c:a", "libopus"]),
+    "wav": (".wav", "audio/wav", None),
+}
+
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])[\"'”’)\]]*\s+")
+
+
+def voice_settings(rate: int = None, voice: str = None, volume: float = None) -> dict:
+    return {
+        "rate": NARRATION_RATE if rate is None else rate,
+        "voice": NARRATION_VOICE if voice is None else voice,
+        "volume": NARRATION_VOLUME if volume is None else volume,
+    }
+
+
+def narration_file(base_path, format: str = None) -> Path:
+    """`base_path` with the extension of the audio format (chapter_x.mp3 -> chapter_x.ogg)."""
+    format = (format or NARRATION_FORMAT).lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unknown narration format: {format} (expected one of {', '.join(FORMATS)})")
+    base_path = Path(base_path)
+    if base_path.suffix.lower() in (ext for ext, _, _ in FORMATS.values()):
+        base_path = base_path.with_suffix("")
+    return base_path.with_name(base_path.name + FORMATS[format][0])
+
+
+def find_narration(directory, base_name: str):
+    """The narration saved for `base_name` in any format, or None."""
+    for extension, _, _ in FORMATS.values():
+        path = Path(directory) / f"{base_name}{extension}"
+        if path.exists():
+            return path
+    return None
+
+
+def audio_mime(path) -> str:
+    for extension, mime, _ in FORMATS.values():
+        if str(path).lower().endswith(extension):
+            return mime
+    return "application/octet-stream"
+
+
+# === Segmenting ===
+def split_segments(text: str, max_chars: int = NARRATION_SEGMENT_CHARS):
+    """
+    Paragraphs, with long ones cut at sentence ends into pieces of at most
+    `max_chars` (a single longer sentence stays whole). Segments never span
+    paragraphs, so an edit only changes the segments of its own paragraph.
+    """
+    segments = []
+    for block in _PARAGRAPH_RE.split(text.replace("\r", "")):
+        paragraph = " ".join(block.split())
+        if not paragraph:
+            continue
+        current = ""
+        for sentence in _SENTENCE_RE.split(paragraph) if len(paragraph) > max_chars else [paragraph]:
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                segments.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            segments.append(current)
+    return segments
+
+
+def segment_key(text: str, settings: dict) -> str:
+    return hashlib.sha256(json.dumps({"engine": "pyttsx3", "text": text, **settings}, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# === Synthesis (runs in the worker processes) ===
+def _aiff_to_wav(src: str, dst: str):
+    """PCM AIFF/AIFF-C to WAV with the standard library, for machines without ffmpeg."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import aifc  # Removed in Python 3.13; ffmpeg is used whenever it is installed
+
+    with aifc.open(src, "rb") as aiff, wave.open(dst, "wb") as out:
+        p = aiff.getparams()
+        frames = aiff.readframes(p.nframes)  # Big-endian signed samples, also for little-endian "sowt" files
+        if p.sampwidth == 1:
+            frames = frames.translate(bytes((b + 128) & 0xFF for b in range(256)))  # WAV 8-bit is unsigned
+        else:
+            swapped = bytearray(len(frames))
+            for i in range(p.sampwidth):
+                swapped[i::p.sampwidth] = frames[p.sampwidth - 1 - i::p.sampwidth]
+            frames = bytes(swapped)
+        out.setnchannels(p.nchannels)
+        out.setsampwidth(p.sampwidth)
+        out.setframerate(p.framerate)
+        out.writeframes(frames)
+
+
+def ensure_wav(path: str) -> str:
+    """
+    Converts `path` to WAV in place if the engine wrote AIFF into it (the
+    nsss driver on macOS does, whatever the extension), with ffmpeg when
+    available and the aifc module otherwise.
+    """
+    with open(path, "rb") as f:
+        header = f.read(12)
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return path
+    if header[:4] != b"FORM" or header[8:12] not in (b"AIFF", b"AIFC"):
+        raise ValueError(f"Narration segment {path} is neither WAV nor AIFF")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.conv.wav"
+    ffmpeg = shutil.which(FFMPEG_BIN)
+    try:
+        if ffmpeg:
+            subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-i", str(path), "-c:a", "pcm_s16le", tmp_path],
+                           check=True, capture_output=True)
+        else:
+            _aiff_to_wav(str(path), tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def synthesize_segment(text: str, path: str, settings: dict) -> str:
+    """Writes one segment's speech to `path` as WAV, unless another worker already has."""
+    global _engine
+    if os.path.exists(path):
+        return path
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.wav"
+    with _engine_lock:
+        if _engine is None:
+            import pyttsx3
+
+            _engine = pyttsx3.init()
+        _engine.setProperty("rate", settings["rate"])
+        _engine.setProperty("volume", settings["volume"])
+        if settings["voice"]:
+            _engine.setProperty("voice", settings["voice"])
+        _engine.save_to_file(text, tmp_path)
+        _engine.runAndWait()
+    ensure_wav(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_narration_pool() -> ProcessPoolExecutor:
+    """Worker processes that each keep one pyttsx3 engine alive; spawned, since the API process is threaded."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=NARRATION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_narration_pool(wait: bool = True):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+
+# === Assembly ===
+def concat_wavs(paths, output_path: str, pause_ms: int = NARRATION_PAUSE_MS):
+    """Joins WAV files with `pause_ms` of silence between them, one file in memory at a time."""
+    params = None
+    with wave.open(str(output_path), "wb") as out:
+        for i, path in enumerate(paths):
+            with wave.open(str(path), "rb") as segment:
+                p = segment.getparams()
+                if params is None:
+                    params = p
+                    out.setnchannels(p.nchannels)
+                    out.setsampwidth(p.sampwidth)
+                    out.setframerate(p.framerate)
+                    silence = b"\0" * (p.framerate * pause_ms // 1000) * p.nchannels * p.sampwidth
+                elif (p.nchannels, p.sampwidth, p.framerate) != (params.nchannels, params.sampwidth, params.framerate):
+                    raise ValueError(f"Segment {path} is {p.framerate} Hz/{p.nchannels} ch, expected {params.framerate} Hz/{params.nchannels} ch")
+                if i:
+                    out.writeframes(silence)
+                out.writeframes(segment.readframes(p.nframes))
+    return output_path
+
+
+def encode_audio(wav_path: str, output_path, format: str = None, bitrate: str = NARRATION_BITRATE) -> str:
+    """
+    Encodes a WAV to `format` with a local ffmpeg and returns the written
+    path. Without ffmpeg the WAV itself is kept (next to `output_path`).
+    """
+    format = (format or NARRATION_FORMAT).lower()
+    output_path = narration_file(output_path, format)
+    codec = FORMATS[format][2]
+    ffmpeg = shutil.which(FFMPEG_BIN) if codec else None
+    if codec and ffmpeg is None:
+        print(f"⚠️ {FFMPEG_BIN} not found; keeping the narration as WAV.")
+    if ffmpeg is None:
+        output_path = narration_file(output_path, "wav")
+        shutil.move(wav_path, output_path)
+        return str(output_path)
+
+    tmp_path = output_path.with_name(f".{output_path.stem}.tmp{output_path.suffix}")
+    subprocess.run(
+        [ffmpeg, "-y", "-loglevel", "error", "-i", str(wav_path), "-ac", "1", *codec, "-b:a", bitrate, str(tmp_path)],
+        check=True, capture_output=True,
+    )
+    os.replace(tmp_path, output_path)
+    return str(output_path)
+
+
+def narrate(text: str, output_path, format: str = None, settings: dict = None, parallel: bool = True,
+            cache_dir: str = NARRATION_CACHE_DIR) -> str:
+    """
+    Narrates `text` into `output_path` and returns the path actually written:
+    its extension follows the format, or .wav when ffmpeg is missing.
+    Segments found in `cache_dir` are reused; the rest are synthesized on
+    the narration pool (or inline with parallel=False / NARRATION_WORKERS=1).
+    """
+    settings = settings or voice_settings()
+    segments = split_segments(text)
+    if not segments:
+        raise ValueError("Nothing to narrate: the text is empty")
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = [os.path.join(cache_dir, f"{segment_key(segment, settings)}.wav") for segment in segments]
+
+    missing = {path: segment for segment, path in zip(segments, paths) if not os.path.exists(path)}
+    if parallel and NARRATION_WORKERS > 1 and len(missing) > 1:
+        pool = get_narration_pool()
+        for future in [pool.submit(synthesize_segment, segment, path, settings) for path, segment in missing.items()]:
+            future.result()
+    else:
+        for path, segment in missing.items():
+            synthesize_segment(segment, path, settings)
+
+    for path in paths:
+        ensure_wav(path)  # Segments cached by earlier versions may still be AIFF
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    fd, wav_path = tempfile.mkstemp(suffix=".wav", prefix="narration_", dir=Path(output_path).parent)
+    os.close(fd)
+    try:
+        concat_wavs(paths, wav_path)
+        written = encode_audio(wav_path, output_path, format)
+    finally:
+        if os.path.exists(wav_path):
+            os.remove(wav_path)
+    print(f"🔊 Narrated {len(segments)} segments ({len(segments) - len(missing)} cached) -> {written}")
+    return written
@@ -0,0 +1,66 @@
+# ai/retrieval.py
+"""
+Pieces of hybrid chapter search that don't need the model: metadata
+filters (as a Chroma `where` clause and as SQL for the lexical index) and
+reciprocal rank fusion of the vector and BM25 rankings.
+"""
+
+import os
+
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid").lower()
+RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))
+FILTER_KEYS = ("min_score", "max_score", "chapters", "title")
+
+
+def resolve_mode(mode: str = None) -> str:
+    mode = (mode or SEARCH_MODE).lower()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode} (expected one of {', '.join(SEARCH_MODES)})")
+    return mode
+
+
+def normalize_filters(filters: dict = None) -> dict:
+    """
+    Drops unset filters and validates the rest. Chapter ids are compared as
+    strings: main_ai stores chapter numbers, the API stores chapter_id text.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v is not None and v != []}
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown search filter(s): {', '.join(sorted(unknown))}")
+    if "chapters" in filters:
+        chapters = filters["chapters"]
+        filters["chapters"] = sorted({str(c) for c in (chapters if isinstance(chapters, (list, tuple, set)) else [chapters])})
+    return filters
+
+
+def chroma_where(filters: dict = None):
+    """The filters as a Chroma metadata `where` clause, or None."""
+    clauses = []
+    filters = normalize_filters(filters)
+    if "min_score" in filters:
+        clauses.append({"score": {"$gte": filters["min_score"]}})
+    if "max_score" in filters:
+        clauses.append({"score": {"$lte": filters["max_score"]}})
+    if "chapters" in filters:
+        numbers = [int(c) for c in filters["chapters"] if c.isdigit()]
+        by_text = {"chapter": {"$in": filters["chapters"]}}
+        clauses.append({"$or": [by_text, {"chapter": {"$in": numbers}}]} if numbers else by_text)
+    if "title" in filters:
+        clauses.append({"title": {"$eq": filters["title"]}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def reciprocal_rank_fusion(*rankings, k: int = RRF_K):
+    """
+    Fuses ranked id lists: each id scores sum(1 / (k + rank)) over the
+    lists it appears in. Returns (id, score) pairs, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, 1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,148 @@
+# ai/search_cache.py
+"""
+Caches in front of the chapter index:
+
+- QueryEmbeddingCache: LRU of query vectors, kept in the embedding service
+  so every API worker shares it and a repeated query never reaches MiniLM.
+- SearchResultCache: short-TTL cache of ranked results in each API process.
+  Entries are tagged with the index generation, a file the index replaces
+  on every upsert, so a write from any process invalidates them at once.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CHROMA_DIR = os.getenv("CHROMA_DIR", "chroma_db")
+GENERATION_PATH = os.getenv("INDEX_GENERATION_PATH", os.path.join(CHROMA_DIR, "index_generation"))
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "30"))
+
+
+def normalize_query(query: str) -> str:
+    """MiniLM lowercases its input, so case and spacing never change the vector."""
+    return " ".join(query.lower().split())
+
+
+# === Index generation ===
+def index_generation(path: str = GENERATION_PATH):
+    """Identity of the last index write; None before the first one."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def bump_index_generation(path: str = GENERATION_PATH):
+    """Called after every upsert. Replacing the file gives it a new inode even within one mtime tick."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp_path, path)
+
+
+# === Caches ===
+class QueryEmbeddingCache:
+    """LRU of normalized query -> embedding; `encoder(texts)` computes the misses in one batch."""
+
+    def __init__(self, encoder, max_size: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.encoder = encoder
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, query: str):
+        key = normalize_query(query)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+        embedding = self.encoder([key])[0]
+        with self._lock:
+            self._entries[key] = embedding
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return embedding
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class SearchResultCache:
+    """
+    LRU of search results that expire after `ttl_seconds` or as soon as the
+    index generation changes, whichever comes first.
+    """
+
+    def __init__(self, max_size: int = SEARCH_CACHE_SIZE, ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS,
+                 generation_path: str = GENERATION_PATH):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.generation_path = generation_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (generation, expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        generation = index_generation(self.generation_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, generation):
+        """`generation` must be read before the search ran, so a write during it is never masked."""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """(value, cached) for `key`, running compute() on a miss."""
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        generation = index_generation(self.generation_path)
+        value = compute()
+        self.put(key, value, generation)
+        return value, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl_seconds}
+
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchResultCache:
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = SearchResultCache()
+        return _search_cache
@@ -2,7 +2,8 @@
 
 import speech_recognition as sr
 import pyttsx3
-from pathlib import Path
+
+from ai.narration import narrate
 
 def speak(text):
     engine = pyttsx3.init()
@@ -10,17 +11,12 @@ def speak(text):
     engine.say(text)
     engine.runAndWait()
 
-def text_to_speech(text: str, output_path: str = "output/audio.mp3") -> str:
+def text_to_speech(text: str, output_path: str = "output/audio.mp3", format: str = None) -> str:
     """
-    Converts text to speech using pyttsx3 and saves as audio.
-    NOTE: pyttsx3 doesn't support MP3, so it saves as WAV instead.
+    Narrates text to an audio file (see ai.narration) and returns the path
+    actually written, whose extension follows the encoded format.
     """
-    engine = pyttsx3.init()
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    output_path = output_path.replace(".mp3", ".wav")  # pyttsx3 only supports WAV
-    engine.save_to_file(text, output_path)
-    engine.runAndWait()
-    return output_path
+    return narrate(text, output_path, format=format)
 
 def listen(prompt=""):
     if prompt:
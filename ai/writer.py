@@ -1,29 +1,15 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import os
-import openai
-import json
-from datetime import datetime
+from ai.feedback_stats import get_feedback_stats
+from ai.llm_gateway import get_llm_gateway
+from ai.llm_cache import cached_completion, cached_completion_stream
+from utils.chunking import map_segments, stream_segments, with_context
 
-# Initialize OpenAI client using environment variables
-client = openai.OpenAI(
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url=os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1")
-)
-
-FEEDBACK_FILE = "feedback/feedback_log.json"
+REWRITE_MODEL = "deepseek/deepseek-chat-v3-0324:free"
 
 def get_avg_feedback_score():
-    if not os.path.exists(FEEDBACK_FILE):
-        return 3  # Neutral default
-    try:
-        with open(FEEDBACK_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            scores = [entry["score"] for entry in data if "score" in entry]
-            return sum(scores) / len(scores) if scores else 3
-    except:
-        return 3
+    return get_feedback_stats().mean(default=3)  # Neutral default
 
 def adapt_prompt_style(avg_score: float) -> str:
     if avg_score <= 2:
@@ -33,23 +19,45 @@ def adapt_prompt_style(avg_score: float) -> str:
     else:
         return "Modernize the language while preserving the story's original tone and meaning."
 
-def rewrite_chapter(original_text: str) -> str:
+def build_rewrite_messages(original_text: str, context: str = "") -> list:
     avg_score = get_avg_feedback_score()
     style_instruction = adapt_prompt_style(avg_score)
 
-    response = client.chat.completions.create(
-        model="deepseek/deepseek-chat-v3-0324:free",
-        messages=[
-            {
-                "role": "system",
-                "content": f"You are an expert AI writer. {style_instruction}"
-            },
-            {
-                "role": "user",
-                "content": f"Rewrite the following passage:\n\n{original_text}"
-            }
-        ],
-        temperature=0.8,
-        max_tokens=4096
-    )
-    return response.choices[0].message.content
+    return [
+        {
+            "role": "system",
+            "content": f"You are an expert AI writer. {style_instruction}"
+        },
+        {
+            "role": "user",
+            "content": with_context(f"Rewrite the following passage:\n\n{original_text}", context)
+        }
+    ]
+
+def rewrite_chapter(original_text: str, use_cache: bool = True) -> str:
+    """Rewrites a chapter, paragraph-aligned segment by segment, with segments in parallel."""
+    def rewrite_segment(segment, context):
+        return cached_completion(
+            get_llm_gateway(),
+            model=REWRITE_MODEL,
+            messages=build_rewrite_messages(segment, context),
+            temperature=0.8,
+            max_tokens=4096,
+            use_cache=use_cache
+        )
+
+    return map_segments(rewrite_segment, original_text)
+
+def stream_rewrite_chapter(original_text: str, use_cache: bool = True):
+    """Same as rewrite_chapter(), but yields the rewrite as it is generated."""
+    def stream_segment(segment, context):
+        return cached_completion_stream(
+            get_llm_gateway(),
+            model=REWRITE_MODEL,
+            messages=build_rewrite_messages(segment, context),
+            temperature=0.8,
+            max_tokens=4096,
+            use_cache=use_cache
+        )
+
+    return stream_segments(stream_segment, original_text)
@@ -1,18 +1,38 @@
 import logging
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from scraping.scraper import scrape_chapter
-from ai.writer import rewrite_chapter
+from pydantic import BaseModel, Field
+from scraping.scraper import scrape_chapter, wait_for_screenshot
+from scraping.screenshots import find_screenshot, store_screenshot
+from scraping.browser_pool import get_browser_pool, shutdown_browser_pool
+from ai.writer import rewrite_chapter, stream_rewrite_chapter
 from ai.reviewer import review_chapter
 from ai.editor import edit_chapter
 from ai.human_feedback import log_feedback
+from ai.feedback_stats import get_feedback_stats
+from ai.llm_cache import get_llm_cache
 from ai.embeddings import store_chapter_embedding
+from ai.narration import audio_mime, find_narration, narration_file, shutdown_narration_pool
 from ai.voice import text_to_speech
+from ai.retrieval import SEARCH_MODE
+from ai.search_cache import get_search_cache
+from search import search_passages
+from utils.artifact_store import ARTIFACT_URL_PREFIX, get_artifact_store
 from utils.pdf_utils import generate_pdf
+from utils.job_queue import QUEUED, RUNNING, JobProgress, JobQueue, JobStore
+from utils.metrics import (
+    JOBS_IN_FLIGHT, PROMETHEUS_CONTENT_TYPE, REGISTRY, REQUESTS_IN_FLIGHT, run_in_context, stage_timer, start_trace
+)
+from utils.stage_graph import StageGraph, StageRun, shutdown_stage_pools
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from functools import partial
 from dotenv import load_dotenv
-from pathlib import Path
+from typing import List, Literal, Optional
+import json
+import os
+import time
 import uuid
 
 # === Logging setup ===
@@ -23,193 +43,486 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 # === FastAPI app setup ===
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("🌐 Warming up browser pool...")
+    get_browser_pool()
+    resumed = job_queue.resume()
+    if resumed:
+        logger.info(f"🔁 Resumed {resumed} unfinished job(s)")
+    yield
+    job_queue.shutdown(wait=False)
+    shutdown_stage_pools(wait=False)
+    shutdown_narration_pool(wait=False)
+    shutdown_browser_pool()
+
+app = FastAPI(lifespan=lifespan)
+app.mount("/static", StaticFiles(directory="static"), name="static")  # Outputs from before the artifact store
+app.mount(ARTIFACT_URL_PREFIX, StaticFiles(directory=get_artifact_store().blob_dir), name="artifacts")
 
 # === Request models ===
-class ChapterRequest(BaseModel):
+class ScreenshotOptions(BaseModel):
+    """Per-request screenshot settings; None falls back to SCREENSHOT_MODE / _FORMAT / _QUALITY."""
+    screenshot_mode: Optional[Literal["off", "viewport", "full"]] = None
+    screenshot_format: Optional[Literal["jpeg", "webp", "png"]] = None
+    screenshot_quality: Optional[int] = Field(None, ge=1, le=100)
+
+    def screenshot_options(self) -> dict:
+        return self.model_dump(include=set(SCREENSHOT_OPTIONS))
+
+class ChapterRequest(ScreenshotOptions):
     url: str
     feedback_score: int = 5
+    use_cache: bool = True
 
-class AgenticRewriteRequest(BaseModel):
+class AgenticRewriteRequest(ScreenshotOptions):
     url: str
+    use_cache: bool = True
 
 class AgenticApprovalRequest(BaseModel):
     chapter_id: str
     final_text: str
     feedback_score: int
+    use_cache: bool = True
 
-# === POST: Fully automated mode ===
-@app.post("/process-agentic/")
-def process_chapter(request: ChapterRequest):
-    chapter_id = str(uuid.uuid4())[:8]
-    base_name = f"chapter_{chapter_id}"
-    base_dir = Path("chapters")
-    static_dir = Path("static")
-    base_dir.mkdir(parents=True, exist_ok=True)
-    static_dir.mkdir(exist_ok=True)
-
-    raw_path = base_dir / f"{base_name}.txt"
-    screenshot_path = static_dir / f"{base_name}.png"
-    rewritten_path = base_dir / f"{base_name}_rewritten.txt"
-    reviewed_path = base_dir / f"{base_name}_reviewed.txt"
-    final_txt_path = base_dir / f"{base_name}_final.txt"
-    pdf_path = static_dir / f"{base_name}_final.pdf"
-    audio_path = static_dir / f"{base_name}.mp3"
-
-    logger.info(f"📥 Starting processing for: {request.url}")
-    logger.info("🌐 Scraping and taking screenshot...")
-    scraped_txt_path, _ = scrape_chapter(request.url, raw_path, screenshot_path)
-    raw_text = Path(scraped_txt_path).read_text(encoding="utf-8")
-
-    logger.info("✍️ Rewriting chapter with LLM...")
-    rewritten = rewrite_chapter(raw_text)
-    rewritten_path.write_text(rewritten, encoding="utf-8")
-
-    logger.info("🧠 Reviewing the rewritten content...")
-    reviewed = review_chapter(rewritten)
-    reviewed_path.write_text(reviewed, encoding="utf-8")
-
-    logger.info("🪄 Editing reviewed content...")
-    final_text = edit_chapter(reviewed)
-    final_txt_path.write_text(final_text, encoding="utf-8")
-
-    logger.info(f"📊 Logging feedback: {request.feedback_score}/5")
-    log_feedback(score=request.feedback_score, context=str(final_txt_path))
-
-    logger.info("🧬 Storing chapter embeddings for search...")
-    store_chapter_embedding(
-        title=f"Chapter {chapter_id}",
-        content=final_text,
-        feedback_score=request.feedback_score,
-        chapter_num=chapter_id
-    )
-
-    logger.info("📄 Generating PDF output...")
-    generate_pdf(content=final_text, title=f"Chapter {chapter_id}", output_path=str(pdf_path))
-
-    logger.info("🔊 Generating audio narration...")
-    text_to_speech(final_text, str(audio_path))
+# === Background job queue for the fully automated pipeline ===
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs/jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+
+POST_EDIT_STAGES = ("feedback", "embed", "pdf", "tts")
+SCREENSHOT_OPTIONS = ("screenshot_mode", "screenshot_format", "screenshot_quality")
+
+
+def screenshot_fields(chapter_id, screenshot) -> dict:
+    """Waits for a (possibly deferred) screenshot, stores it and its thumbnail, and returns their paths for the response."""
+    return store_screenshot(chapter_id, wait_for_screenshot(screenshot))
+
+
+def post_edit_stages(chapter_id, final_text, final_txt_path, feedback_score, pdf_path, audio_path,
+                     stage_context=None, skip=()) -> StageGraph:
+    """
+    The independent stages that follow the edit. The PDF is CPU-bound and
+    gets its own process; TTS spreads its segments over the narration pool.
+    Each stage logs its message when it starts, not when it is scheduled.
+    """
+    messages = {
+        "feedback": f"📊 Logging feedback: {feedback_score}/5",
+        "embed": "🧬 Storing chapter embeddings for search...",
+        "pdf": "📄 Generating PDF output...",
+        "tts": "🔊 Generating audio narration...",
+    }
+
+    @contextmanager
+    def logged_stage(name):
+        logger.info(messages[name])
+        with (stage_context(name) if stage_context else nullcontext()):
+            yield
+
+    graph = StageGraph(stage_context=logged_stage)
+    if "feedback" not in skip:
+        graph.add("feedback", log_feedback, score=feedback_score, context=str(final_txt_path))
+    if "embed" not in skip:
+        graph.add("embed", store_chapter_embedding,
+                  title=f"Chapter {chapter_id}", content=final_text, feedback_score=feedback_score, chapter_num=chapter_id)
+    if "pdf" not in skip:
+        graph.add("pdf", generate_pdf, content=final_text, title=f"Chapter {chapter_id}", output_path=str(pdf_path), process=True)
+    if "tts" not in skip:
+        graph.add("tts", text_to_speech, final_text, str(audio_path))
+    return graph
+
+
+def store_late_artifacts(run: StageRun, chapter_id, pdf_path, progress: JobProgress = None) -> dict:
+    """
+    Moves the PDF and narration into the artifact store as soon as each stage
+    finishes, and records them so pollers see them early; TTS returns its real path.
+    Returns name -> Future of the stored path (None if the stage failed), to
+    wait on after the run: its own wait() can return before these callbacks finish.
+    """
+    store = get_artifact_store()
+    stored = {}
+
+    def storer(name, path=None):
+        result = stored[name] = Future()
+
+        def store_output(future):
+            try:
+                blob = None
+                if future.exception() is None:
+                    blob = store.put_file(chapter_id, name, path or future.result())
+                    if progress is not None:
+                        progress.artifact(name, blob)
+                result.set_result(blob)
+            except Exception as e:
+                result.set_exception(e)
+        return store_output
+
+    if "pdf" in run.futures:
+        run.futures["pdf"].add_done_callback(storer("pdf", pdf_path))
+    if "tts" in run.futures:
+        run.futures["tts"].add_done_callback(storer("audio"))
+    return stored
+
+
+@contextmanager
+def tracked_stage(progress: JobProgress, name: str):
+    """A job stage that is also timed into the metrics and the job's trace."""
+    with stage_timer(name), progress.stage(name):
+        yield
+
+
+def run_agentic_pipeline(payload: dict, progress: JobProgress):
+    """
+    Runs every stage for one chapter, reporting progress to the job store.
+    Stages that succeeded in an earlier attempt are skipped on retry.
+    """
+    chapter_id = payload["chapter_id"]
+    url = payload["url"]
+    feedback_score = payload["feedback_score"]
+    use_cache = payload.get("use_cache", True)
+
+    # Outputs go to the artifact store; stages write to staging paths that are moved in when done
+    store = get_artifact_store()
+    pdf_path = store.staging_path("final.pdf")
+    audio_path = narration_file(store.staging_path("narration"))
+
+    def done(stage, artifact):
+        return progress.completed(stage) and store.path(chapter_id, artifact) is not None
+
+    logger.info(f"📥 Starting processing for: {url}")
+    screenshot = None
+    if not done("scrape", "raw_text"):
+        with tracked_stage(progress, "scrape"):
+            # The screenshot is captured while the LLM stages run and recorded at the end
+            logger.info("🌐 Scraping chapter text...")
+            scraped_txt_path, screenshot = scrape_chapter(
+                url, store.staging_path("raw.txt"), store.staging_path("screenshot"), defer_screenshot=True,
+                **{name: payload.get(name) for name in SCREENSHOT_OPTIONS}
+            )
+            progress.artifact("raw_text", store.put_file(chapter_id, "raw_text", scraped_txt_path))
+    raw_text = store.read_text(chapter_id, "raw_text")
+
+    if not done("rewrite", "rewritten_text"):
+        with tracked_stage(progress, "rewrite"):
+            logger.info("✍️ Rewriting chapter with LLM...")
+            progress.artifact("rewritten_text", store.put_text(chapter_id, "rewritten_text", rewrite_chapter(raw_text, use_cache=use_cache)))
+    rewritten = store.read_text(chapter_id, "rewritten_text")
+
+    if not done("review", "reviewed_text"):
+        with tracked_stage(progress, "review"):
+            logger.info("🧠 Reviewing the rewritten content...")
+            progress.artifact("reviewed_text", store.put_text(chapter_id, "reviewed_text", review_chapter(rewritten, use_cache=use_cache)))
+    reviewed = store.read_text(chapter_id, "reviewed_text")
+
+    if not done("edit", "final_text"):
+        with tracked_stage(progress, "edit"):
+            logger.info("🪄 Editing reviewed content...")
+            progress.artifact("final_text", store.put_text(chapter_id, "final_text", edit_chapter(reviewed, use_cache=use_cache)))
+    final_text = store.read_text(chapter_id, "final_text")
+    final_txt_path = store.path(chapter_id, "final_text")
+
+    # Feedback, embedding, PDF and TTS only depend on the final text, so they run side by side
+    finished = {name for name in POST_EDIT_STAGES if progress.completed(name)}
+    if store.path(chapter_id, "pdf") is None:
+        finished.discard("pdf")
+    if store.path(chapter_id, "audio") is None:
+        finished.discard("tts")
+    graph = post_edit_stages(chapter_id, final_text, final_txt_path, feedback_score, pdf_path, audio_path,
+                             stage_context=partial(tracked_stage, progress), skip=finished)
+    run = graph.run(wait=False)
+    stored = store_late_artifacts(run, chapter_id, pdf_path, progress)
+    run.wait()
+    for future in stored.values():
+        future.result()
+    if screenshot is not None:
+        for name, path in screenshot_fields(chapter_id, screenshot).items():
+            if path:
+                progress.artifact(name, path)
+    if run.errors:
+        raise RuntimeError("; ".join(f"{name}: {error}" for name, error in run.errors.items()))
 
     logger.info(f"✅ All steps completed for Chapter {chapter_id}")
 
+
+job_store = JobStore(JOB_DB_PATH)
+def run_traced_pipeline(payload: dict, progress: JobProgress):
+    with start_trace("process-agentic", job_id=progress.job_id, chapter_id=payload["chapter_id"], url=payload["url"]):
+        run_agentic_pipeline(payload, progress)
+
+
+job_queue = JobQueue(job_store, run_traced_pipeline, max_workers=JOB_WORKERS, kind="process-agentic")
+
+
+def job_response(job: dict) -> dict:
     return {
-        "status": "success",
-        "chapter_id": chapter_id,
-        "message": "✅ Chapter processed end-to-end",
-        "final_text_file": str(final_txt_path),
-        "pdf_file": str(pdf_path),
-        "audio_file": str(audio_path),
-        "screenshot": str(screenshot_path)
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "chapter_id": job["payload"].get("chapter_id"),
+        "url": job["payload"].get("url"),
+        "stages": job["stages"],
+        "artifacts": job["artifacts"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "status_url": f"/jobs/{job['job_id']}",
     }
 
+
+# === POST: Fully automated mode (queued, poll /jobs/{job_id}) ===
+@app.post("/process-agentic/", status_code=202)
+def process_chapter(request: ChapterRequest):
+    chapter_id = str(uuid.uuid4())[:8]
+    job = job_queue.submit({
+        "chapter_id": chapter_id,
+        "url": request.url,
+        "feedback_score": request.feedback_score,
+        "use_cache": request.use_cache,
+        **request.screenshot_options(),
+    })
+    logger.info(f"🗂️ Queued job {job['job_id']} for Chapter {chapter_id}")
+    return job_response(job)
+
+# === GET: Job status ===
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job_response(job)
+
+# === POST: Retry a failed job ===
+@app.post("/jobs/{job_id}/retry", status_code=202)
+def retry_job(job_id: str):
+    job = job_queue.retry(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job_response(job)
+
 # === POST: Step 1 - Rewrite only ===
 @app.post("/agentic/rewrite/")
 def agentic_rewrite(data: AgenticRewriteRequest):
     try:
         chapter_id = str(uuid.uuid4())[:8]
-        base_name = f"chapter_{chapter_id}"
-        base_dir = Path("chapters")
-        static_dir = Path("static")
-        base_dir.mkdir(parents=True, exist_ok=True)
-        static_dir.mkdir(exist_ok=True)
-
-        raw_path = base_dir / f"{base_name}.txt"
-        screenshot_path = static_dir / f"{base_name}.png"
+        store = get_artifact_store()
 
         logger.info(f"📥 Starting agentic rewrite for: {data.url}")
-        scraped_txt_path, _ = scrape_chapter(data.url, raw_path, screenshot_path)
-        raw_text = Path(scraped_txt_path).read_text(encoding="utf-8")
-
-        rewritten = rewrite_chapter(raw_text)
+        with REQUESTS_IN_FLIGHT.track(endpoint="rewrite"), start_trace("rewrite", chapter_id=chapter_id, url=data.url):
+            with stage_timer("scrape"):
+                scraped_txt_path, screenshot = scrape_chapter(
+                    data.url, store.staging_path("raw.txt"), store.staging_path("screenshot"), defer_screenshot=True,
+                    **data.screenshot_options()
+                )
+            raw_text = store.put_file(chapter_id, "raw_text", scraped_txt_path).read_text(encoding="utf-8")
+
+            with stage_timer("rewrite"):
+                rewritten = rewrite_chapter(raw_text, use_cache=data.use_cache)
         return {
             "chapter_id": chapter_id,
             "rewritten_text": rewritten,
-            "screenshot": str(screenshot_path)
+            **screenshot_fields(chapter_id, screenshot)
         }
     except Exception as e:
         logger.error(f"❌ Rewrite error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# === POST: Step 1 (streaming) - Rewrite as server-sent events ===
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/agentic/rewrite/stream")
+def agentic_rewrite_stream(data: AgenticRewriteRequest):
+    """
+    Same as /agentic/rewrite/, but streams the draft as SSE `token` events
+    while the LLM writes it. The full text is saved when the stream ends.
+    """
+    chapter_id = str(uuid.uuid4())[:8]
+    store = get_artifact_store()
+
+    def events():
+        try:
+            logger.info(f"📥 Starting streamed rewrite for: {data.url}")
+            with REQUESTS_IN_FLIGHT.track(endpoint="rewrite_stream"), start_trace("rewrite_stream", chapter_id=chapter_id, url=data.url):
+                yield sse_event("status", {"chapter_id": chapter_id, "stage": "scrape"})
+                with stage_timer("scrape"):
+                    scraped_txt_path, screenshot = scrape_chapter(
+                        data.url, store.staging_path("raw.txt"), store.staging_path("screenshot"), defer_screenshot=True,
+                        **data.screenshot_options()
+                    )
+                raw_text = store.put_file(chapter_id, "raw_text", scraped_txt_path).read_text(encoding="utf-8")
+
+                yield sse_event("status", {"chapter_id": chapter_id, "stage": "rewrite"})
+                parts = []
+                with stage_timer("rewrite"):
+                    for delta in stream_rewrite_chapter(raw_text, use_cache=data.use_cache):
+                        parts.append(delta)
+                        yield sse_event("token", {"text": delta})
+
+            rewritten_path = store.put_text(chapter_id, "rewritten_text", "".join(parts))
+            yield sse_event("done", {
+                "chapter_id": chapter_id,
+                "rewritten_file": str(rewritten_path),
+                **screenshot_fields(chapter_id, screenshot)
+            })
+        except Exception as e:
+            logger.error(f"❌ Streamed rewrite error: {e}")
+            yield sse_event("error", {"chapter_id": chapter_id, "detail": str(e)})
+
+    return StreamingResponse(run_in_context(events()), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 # === POST: Step 2 - Human Approval ===
 @app.post("/agentic/approve/")
 def agentic_approve(data: AgenticApprovalRequest):
     try:
-        base_name = f"chapter_{data.chapter_id}"
-        base_dir = Path("chapters")
-        static_dir = Path("static")
-        base_dir.mkdir(parents=True, exist_ok=True)
-        static_dir.mkdir(exist_ok=True)
-
-        reviewed_path = base_dir / f"{base_name}_reviewed.txt"
-        final_txt_path = base_dir / f"{base_name}_final.txt"
-        pdf_path = static_dir / f"{base_name}_final.pdf"
-        audio_path = static_dir / f"{base_name}.mp3"
-
-        logger.info("🧠 Reviewing the final human-edited content...")
-        reviewed = review_chapter(data.final_text)
-        reviewed_path.write_text(reviewed, encoding="utf-8")
-
-        logger.info("🪄 Editing reviewed content...")
-        final_text = edit_chapter(reviewed)
-        final_txt_path.write_text(final_text, encoding="utf-8")
-
-        logger.info(f"📊 Logging feedback: {data.feedback_score}/5")
-        log_feedback(score=data.feedback_score, context=str(final_txt_path))
-
-        logger.info("🧬 Storing embeddings...")
-        store_chapter_embedding(
-            title=f"Chapter {data.chapter_id}",
-            content=final_text,
-            feedback_score=data.feedback_score,
-            chapter_num=data.chapter_id
-        )
-
-        logger.info("📄 Generating PDF...")
-        generate_pdf(content=final_text, title=f"Chapter {data.chapter_id}", output_path=str(pdf_path))
-
-        logger.info("🔊 Generating audio...")
-        text_to_speech(final_text, str(audio_path))
+        store = get_artifact_store()
+        pdf_path = store.staging_path("final.pdf")
+        audio_path = narration_file(store.staging_path("narration"))
+
+        with REQUESTS_IN_FLIGHT.track(endpoint="approve"), start_trace("approve", chapter_id=data.chapter_id):
+            logger.info("🧠 Reviewing the final human-edited content...")
+            with stage_timer("review"):
+                reviewed = review_chapter(data.final_text, use_cache=data.use_cache)
+            store.put_text(data.chapter_id, "reviewed_text", reviewed)
+
+            logger.info("🪄 Editing reviewed content...")
+            with stage_timer("edit"):
+                final_text = edit_chapter(reviewed, use_cache=data.use_cache)
+            final_txt_path = store.put_text(data.chapter_id, "final_text", final_text)
+
+            graph = post_edit_stages(data.chapter_id, final_text, final_txt_path, data.feedback_score, pdf_path, audio_path,
+                                     stage_context=stage_timer)
+            run = graph.run(wait=False)
+            stored = store_late_artifacts(run, data.chapter_id, pdf_path)
+            run.wait()
+            pdf_file, audio_file = (stored[name].result() if name in stored else None for name in ("pdf", "audio"))
+        for name, error in run.errors.items():
+            logger.error(f"❌ {name} stage failed: {error}")
 
         return {
-            "status": "success",
-            "message": "✅ Chapter finalized after human intervention",
-            "pdf_file": str(pdf_path),
-            "audio_file": str(audio_path)
+            "status": "partial" if run.errors else "success",
+            "message": (f"⚠️ Chapter finalized, but {', '.join(sorted(run.errors))} failed" if run.errors
+                        else "✅ Chapter finalized after human intervention"),
+            "pdf_file": str(pdf_file) if pdf_file else None,
+            "audio_file": str(audio_file) if audio_file else None,
+            "errors": run.errors,
+            "timings": {name: round(seconds, 3) for name, seconds in run.timings.items()}
         }
     except Exception as e:
         logger.error(f"❌ Approval error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# === GET: Semantic search over the embedded chapters ===
+@app.get("/search")
+def semantic_search(q: str = Query(..., min_length=1), top_k: int = Query(3, ge=1, le=50), offset: int = Query(0, ge=0),
+                    mode: Optional[Literal["hybrid", "vector", "lexical"]] = None,
+                    min_score: Optional[int] = Query(None, ge=1, le=5), max_score: Optional[int] = Query(None, ge=1, le=5),
+                    chapter: Optional[List[str]] = Query(None), title: Optional[str] = None):
+    start = time.perf_counter()
+    filters = {"min_score": min_score, "max_score": max_score, "chapters": chapter, "title": title}
+    try:
+        hits, next_offset, cached = search_passages(q, top_k=top_k, offset=offset, filters=filters, mode=mode)
+    except Exception as e:
+        logger.error(f"❌ Search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "query": q,
+        "mode": mode or SEARCH_MODE,
+        "offset": offset,
+        "top_k": top_k,
+        "next_offset": next_offset,
+        "cached": cached,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        "results": [
+            {**{k: v for k, v in hit.items() if k != "text"}, "snippet": hit["text"][:400] + ("..." if len(hit["text"]) > 400 else "")}
+            for hit in hits
+        ],
+    }
+
+# === GET: Search result cache counters ===
+@app.get("/search/stats")
+def search_stats():
+    return get_search_cache().stats()
+
+# === GET: LLM response cache counters ===
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    return get_llm_cache().stats()
+
+# === GET: Running feedback aggregates ===
+@app.get("/feedback/stats")
+def feedback_stats():
+    return get_feedback_stats().snapshot()
+
+# === GET: Prometheus metrics ===
+@app.get("/metrics")
+def metrics():
+    for status, count in job_store.count_by_status(QUEUED, RUNNING).items():
+        JOBS_IN_FLIGHT.set(count, status=status)
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # === GET: Home Route ===
 @app.get("/", response_class=HTMLResponse)
 def read_root():
     return "<h2>✅ Automated Book Workflow API is running!</h2>"
 
+# === GET: A chapter's stored artifacts ===
+@app.get("/chapters/{chapter_id}/artifacts")
+def chapter_artifacts(chapter_id: str):
+    store = get_artifact_store()
+    manifest = store.manifest(chapter_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail=f"No artifacts stored for chapter {chapter_id}")
+    for stage, url in store.urls(chapter_id).items():
+        manifest["stages"][stage]["url"] = url
+    return manifest
+
+def legacy_output_urls(chapter_id: str) -> dict:
+    """URLs of a chapter processed before the artifact store, from its files in static/."""
+    base_name = f"chapter_{chapter_id}"
+    audio = find_narration("static", base_name)
+    screenshot, thumbnail = find_screenshot("static", base_name)
+    return {
+        "pdf": f"/static/{base_name}_final.pdf",
+        "audio": f"/static/{audio.name}" if audio else None,
+        "screenshot": f"/static/{screenshot.name}" if screenshot else None,
+        "thumbnail": f"/static/{thumbnail.name}" if thumbnail else None,
+    }
+
 # === GET: View Output ===
 @app.get("/view/{chapter_id}", response_class=HTMLResponse)
 def view_output(chapter_id: str):
-    base_name = f"chapter_{chapter_id}"
-    pdf_path = f"/static/{base_name}_final.pdf"
-    audio_path = f"/static/{base_name}.mp3"
-    screenshot_path = f"/static/{base_name}.png"
+    urls = get_artifact_store().urls(chapter_id) or legacy_output_urls(chapter_id)
+    if urls.get("pdf"):
+        pdf_html = f"""<iframe src="{urls["pdf"]}" width="100%" height="600px"></iframe><br>
+            <a href="{urls["pdf"]}" download>⬇️ Download PDF</a>"""
+    else:
+        pdf_html = "<p>No PDF has been generated for this chapter.</p>"
+    if urls.get("screenshot"):
+        # The page shows the small thumbnail; the full capture is one click away
+        preview = urls.get("thumbnail") or urls["screenshot"]
+        screenshot_html = f'<a href="{urls["screenshot"]}"><img src="{preview}" width="320px"></a>'
+    else:
+        screenshot_html = "<p>No screenshot was taken for this chapter.</p>"
+    if urls.get("audio"):
+        audio_html = f"""<audio controls>
+                <source src="{urls["audio"]}" type="{audio_mime(urls["audio"])}">
+                Your browser does not support the audio tag.
+            </audio>"""
+    else:
+        audio_html = "<p>No narration has been generated for this chapter.</p>"
 
     return f"""
     <html>
         <head><title>Chapter Output</title></head>
         <body>
             <h2>📘 Final Chapter Output</h2>
-            <iframe src="{pdf_path}" width="100%" height="600px"></iframe><br>
-            <a href="{pdf_path}" download>⬇️ Download PDF</a><br><br>
+            {pdf_html}<br><br>
 
             <h3>🔊 Listen to Audio:</h3>
-            <audio controls>
-                <source src="{audio_path}" type="audio/mpeg">
-                Your browser does not support the audio tag.
-            </audio><br><br>
+            {audio_html}<br><br>
 
             <h3>🖼️ Screenshot Taken During Scrape:</h3>
-            <img src="{screenshot_path}" width="600px"><br><br>
+            {screenshot_html}<br><br>
 
             <a href="/">🔙 Back to Home</a>
         </body>
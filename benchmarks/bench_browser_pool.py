@@ -0,0 +1,79 @@
+# benchmarks/bench_browser_pool.py
+"""
+Compares a cold browser per chapter (the old scrape_chapter behaviour)
+with the warm BrowserPool, on the local HTML fixtures.
+
+    python -m benchmarks.bench_browser_pool --rounds 3 --pool-size 2
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from playwright.sync_api import sync_playwright
+
+from benchmarks.fixture_server import chapter_urls, serve_fixtures
+from scraping.browser_pool import BrowserPool
+from scraping.scraper import scrape_chapter
+
+
+def cold_scrape(url: str, save_text_path: str, screenshot_path: str):
+    """The pre-pool implementation: launch, scrape, tear down."""
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.goto(url, wait_until="networkidle")
+        page.screenshot(path=screenshot_path, full_page=True)
+        content = page.locator("div#mw-content-text").inner_text()
+        Path(save_text_path).write_text(content, encoding="utf-8")
+        browser.close()
+
+
+def time_calls(fn, urls, out_dir, workers):
+    latencies = []
+
+    def one(i_url):
+        i, url = i_url
+        start = time.perf_counter()
+        fn(url, str(out_dir / f"chapter{i}.txt"), str(out_dir / f"chapter{i}.png"))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one, enumerate(urls)))
+    return time.perf_counter() - start, latencies
+
+
+def report(name, wall, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(
+        f"{name:<8} chapters={len(latencies):<4} wall={wall:6.2f}s "
+        f"mean={statistics.mean(latencies) * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold vs pooled Playwright scraping")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the fixture book")
+    parser.add_argument("--pool-size", type=int, default=2)
+    args = parser.parse_args()
+
+    with serve_fixtures() as base_url, tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        urls = chapter_urls(base_url) * args.rounds
+
+        wall, latencies = time_calls(cold_scrape, urls, out_dir, workers=args.pool_size)
+        report("cold", wall, latencies)
+
+        pool = BrowserPool(size=args.pool_size).start()
+        try:
+            pooled = lambda url, txt, png: scrape_chapter(url, txt, png, pool=pool)
+            wall, latencies = time_calls(pooled, urls, out_dir, workers=args.pool_size)
+            report("pooled", wall, latencies)
+            print(f"pool stats: {pool.stats}")
+        finally:
+            pool.close()
@@ -0,0 +1,227 @@
+# benchmarks/bench_e2e.py
+"""
+Offline end-to-end benchmark of the API pipeline. A fresh `uvicorn api:app`
+runs in a scratch directory for every concurrency level. It talks to the
+fake LLM server (OPENAI_BASE_URL) and scrapes the local fixture site. The
+benchmark keeps N /process-agentic/ jobs in flight and reports
+chapters/min, p50/p95 per stage and peak RSS of the API process tree.
+
+    python -m benchmarks.bench_e2e --concurrency 1,4,8 --chapters 16 --latency-ms 300
+    python -m benchmarks.bench_e2e --crawl        # also time main_ai.scrape_and_process
+
+The LLM cache is disabled so every run pays for its completions.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fake_llm_server import serve_fake_llm
+from benchmarks.fixture_server import chapter_urls, serve_fixtures
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+STAGES = ("scrape", "rewrite", "review", "edit", "feedback", "embed", "pdf", "tts")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def parse_ts(value: str) -> float:
+    return datetime.fromisoformat(value.rstrip("Z")).timestamp()
+
+
+def bench_env(workdir: Path, llm_url: str, workers: int) -> dict:
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_ROOT), os.getenv("PYTHONPATH")])),
+        "OPENAI_BASE_URL": llm_url,
+        "OPENROUTER_API_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "LLM_CACHE_DISABLED": "1",
+        "JOB_WORKERS": str(workers),
+        "JOB_DB_PATH": str(workdir / "jobs" / "jobs.db"),
+        "CHROMA_DIR": str(workdir / "chroma_db"),
+        "EMBEDDING_SOCKET": str(workdir / "embedding_service.sock"),
+        "TRACE_LOG_PATH": str(workdir / "logs" / "traces.jsonl"),
+    }
+
+
+# === Process tree memory (Linux /proc) ===
+def processes_in(workdir: Path):
+    """PIDs whose working directory is the scenario's scratch dir: the API, its pools and the embedding service."""
+    pids = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            if Path(os.readlink(entry / "cwd")) == workdir:
+                pids.append(int(entry.name))
+        except OSError:
+            continue
+    return pids
+
+
+def peak_rss_mb(pid: int) -> float:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def stop_processes(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+# === Scenarios ===
+def run_api_scenario(concurrency: int, urls, llm_url: str, timeout: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp).resolve()
+        (workdir / "static").mkdir()
+        port = free_port()
+        log = open(workdir / "api.log", "wb")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning"],
+            cwd=workdir, env=bench_env(workdir, llm_url, concurrency), stdout=log, stderr=subprocess.STDOUT,
+        )
+        base = f"http://127.0.0.1:{port}"
+        try:
+            with httpx.Client(base_url=base, timeout=30) as client:
+                deadline = time.monotonic() + 120
+                while True:
+                    try:
+                        client.get("/")
+                        break
+                    except httpx.TransportError:
+                        if server.poll() is not None or time.monotonic() > deadline:
+                            raise RuntimeError(f"API did not start; see {workdir / 'api.log'}:\n{(workdir / 'api.log').read_text()[-2000:]}")
+                        time.sleep(0.2)
+
+                pending, in_flight, finished = list(urls), {}, []
+                started = time.perf_counter()
+                deadline = time.monotonic() + timeout
+                while (pending or in_flight) and time.monotonic() < deadline:
+                    while pending and len(in_flight) < concurrency:
+                        job = client.post("/process-agentic/", json={"url": pending.pop(0), "use_cache": False}).json()
+                        in_flight[job["job_id"]] = job
+                    time.sleep(0.25)
+                    for job_id in list(in_flight):
+                        job = client.get(f"/jobs/{job_id}").json()
+                        if job["status"] in ("succeeded", "failed"):
+                            finished.append(job)
+                            del in_flight[job_id]
+                wall = time.perf_counter() - started
+
+            pids = processes_in(workdir)
+            rss = {pid: peak_rss_mb(pid) for pid in pids}
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            stop_processes(processes_in(workdir))
+            log.close()
+
+    return summarize(concurrency, finished, len(in_flight), wall, server.pid, rss)
+
+
+def summarize(concurrency, jobs, unfinished, wall, server_pid, rss):
+    ok = [j for j in jobs if j["status"] == "succeeded"]
+    stage_times = {stage: [] for stage in STAGES}
+    for job in ok:
+        for stage, record in job["stages"].items():
+            if record.get("started_at") and record.get("finished_at"):
+                stage_times.setdefault(stage, []).append(parse_ts(record["finished_at"]) - parse_ts(record["started_at"]))
+    job_times = [parse_ts(j["updated_at"]) - parse_ts(j["created_at"]) for j in ok]
+    return {
+        "concurrency": concurrency,
+        "succeeded": len(ok),
+        "failed": len(jobs) - len(ok),
+        "unfinished": unfinished,
+        "chapters_per_min": len(ok) / wall * 60 if wall else 0.0,
+        "job_p50": percentile(job_times, 50),
+        "job_p95": percentile(job_times, 95),
+        "stages": {s: (percentile(t, 50), percentile(t, 95)) for s, t in stage_times.items() if t},
+        "rss_server_mb": rss.get(server_pid, 0.0),
+        "rss_total_mb": sum(rss.values()),
+        "errors": sorted({j["error"] for j in jobs if j["status"] == "failed"}),
+    }
+
+
+def run_crawl_scenario(first_url: str, llm_url: str, workers: int, timeout: float):
+    """Times main_ai.scrape_and_process over the fixture book in batch-approval mode."""
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp).resolve()
+        code = (
+            "import asyncio, main_ai\n"
+            f"chapters = asyncio.run(main_ai.scrape_and_process({first_url!r}, workers={workers}, approval='batch'))\n"
+            "main_ai.shutdown_browser_pool()\n"
+            "print(len(chapters))\n"
+        )
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=bench_env(workdir, llm_url, workers),
+                                capture_output=True, text=True, timeout=timeout)
+        wall = time.perf_counter() - started
+        stop_processes(processes_in(workdir))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    chapters = int(result.stdout.strip().splitlines()[-1])
+    return chapters, wall
+
+
+def print_report(row):
+    print(f"\n▶ concurrency {row['concurrency']}: {row['succeeded']} ok, {row['failed']} failed, {row['unfinished']} unfinished")
+    print(f"  throughput   {row['chapters_per_min']:8.1f} chapters/min")
+    print(f"  job latency  p50 {row['job_p50']:7.2f}s   p95 {row['job_p95']:7.2f}s")
+    for stage, (p50, p95) in row["stages"].items():
+        print(f"  {stage:<12} p50 {p50:7.2f}s   p95 {p95:7.2f}s")
+    print(f"  peak RSS     {row['rss_server_mb']:8.1f} MB api, {row['rss_total_mb']:.1f} MB incl. workers/services")
+    for error in row["errors"]:
+        print(f"  ❌ {error[:200]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--concurrency", default="1,4", help="comma-separated jobs kept in flight")
+    parser.add_argument("--chapters", type=int, default=10, help="jobs per concurrency level (fixture pages are reused)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="fake LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="fake LLM generation speed")
+    parser.add_argument("--timeout", type=float, default=900, help="seconds per scenario")
+    parser.add_argument("--crawl", action="store_true", help="also benchmark main_ai.scrape_and_process")
+    args = parser.parse_args()
+
+    with serve_fixtures() as site, serve_fake_llm(latency_ms=args.latency_ms, tokens_per_second=args.tokens_per_second) as llm:
+        urls = chapter_urls(site)
+        print(f"📚 fixtures {site}   🤖 fake LLM {llm} ({args.latency_ms:.0f} ms TTFT, {args.tokens_per_second:.0f} tok/s)")
+        for level in (int(c) for c in args.concurrency.split(",")):
+            print_report(run_api_scenario(level, [urls[i % len(urls)] for i in range(args.chapters)], llm, args.timeout))
+
+        if args.crawl:
+            chapters, wall = run_crawl_scenario(urls[0], llm, workers=3, timeout=args.timeout)
+            print(f"\n▶ main_ai crawl: {chapters} chapters in {wall:.1f}s ({chapters / wall * 60:.1f} chapters/min)")
@@ -0,0 +1,70 @@
+# benchmarks/bench_embeddings.py
+"""
+Embedding ingestion throughput in passages per second: one encode() call
+per passage versus the batched bulk path, into a throwaway Chroma dir.
+Then the cost of re-storing the same chapters: unchanged, with new
+feedback scores only, and with one paragraph appended to every chapter.
+
+    python -m benchmarks.bench_embeddings --chapters 50 --batch-size 64
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+
+from benchmarks.fixture_server import FIXTURE_BOOK, FIXTURE_DIR
+
+
+def fixture_chapters(count):
+    pages = sorted((FIXTURE_DIR / "wiki" / FIXTURE_BOOK).glob("Chapter_*.html"))
+    texts = [re.sub(r"<[^>]+>", "", p.read_text(encoding="utf-8")) for p in pages]
+    return [
+        {"chapter_num": f"bench{i}", "title": f"Chapter {i}", "content": texts[i % len(texts)] * 3, "feedback_score": 4}
+        for i in range(count)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Passage embedding throughput")
+    parser.add_argument("--chapters", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CHROMA_DIR"] = tmp
+        os.environ["LEXICAL_INDEX_PATH"] = os.path.join(tmp, "lexical.db")
+        os.environ["INDEX_GENERATION_PATH"] = os.path.join(tmp, "index_generation")
+        from ai import embedding_index as embeddings
+
+        chapters = fixture_chapters(args.chapters)
+        passages = [p["text"] for c in chapters for p in embeddings.chapter_passages(c["content"])]
+
+        start = time.perf_counter()
+        for text in passages:
+            embeddings.encode([text])
+        single = time.perf_counter() - start
+        print(f"one-at-a-time encode: {len(passages) / single:8.1f} passages/s ({len(passages)} passages)")
+
+        start = time.perf_counter()
+        embeddings.encode(passages, batch_size=args.batch_size)
+        batched = time.perf_counter() - start
+        print(f"batched encode:       {len(passages) / batched:8.1f} passages/s (batch_size={args.batch_size})")
+
+        start = time.perf_counter()
+        stored = embeddings.store_chapters_bulk(chapters, batch_size=args.batch_size)
+        bulk = time.perf_counter() - start
+        print(f"bulk ingest + upsert: {stored / bulk:8.1f} passages/s ({args.chapters} chapters)")
+
+        def restore(label, chapters):
+            before = dict(embeddings.store_stats)
+            start = time.perf_counter()
+            embeddings.store_chapters_bulk(chapters, batch_size=args.batch_size)
+            elapsed = time.perf_counter() - start
+            encoded = embeddings.store_stats["passages_encoded"] - before["passages_encoded"]
+            print(f"re-store, {label:<17} {elapsed * 1000:8.1f} ms ({encoded} passages encoded, {bulk / elapsed:5.1f}x faster)")
+
+        restore("unchanged:", chapters)
+        restore("new scores:", [dict(c, feedback_score=5) for c in chapters])
+        restore("paragraph added:", [dict(c, content=c["content"] + "\n\nOne more closing paragraph.") for c in chapters])
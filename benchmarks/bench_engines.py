@@ -0,0 +1,90 @@
+# benchmarks/bench_engines.py
+"""
+Embedding engines compared on the fixture book: load time, throughput in
+passages per second, peak memory (RSS) and cosine parity with the
+sentence-transformers reference.
+
+    python -m benchmarks.bench_engines --chapters 20 --engines sentence-transformers onnx
+
+Each engine runs in its own process, so its peak RSS is its own.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_embeddings import fixture_chapters
+
+
+def run_engine(engine, texts_path, vectors_path, batch_size):
+    os.environ["EMBEDDING_ENGINE"] = engine
+    from ai.embedding_engines import get_engine
+
+    with open(texts_path, encoding="utf-8") as f:
+        texts = json.load(f)
+    start = time.perf_counter()
+    model = get_engine()
+    loaded = time.perf_counter() - start
+    model.encode(texts[:batch_size], batch_size=batch_size)  # Warm-up
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    np.save(vectors_path, np.asarray(vectors, dtype=np.float32))
+    return {
+        "name": model.name,
+        "load_s": loaded,
+        "passages_per_s": len(texts) / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding engine throughput, memory and parity")
+    parser.add_argument("--chapters", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--engines", nargs="+", default=["sentence-transformers", "onnx"])
+    parser.add_argument("--child", nargs=2, metavar=("TEXTS", "VECTORS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_engine(args.engines[0], *args.child, args.batch_size)))
+        sys.exit(0)
+
+    from ai.embedding_engines import parity_report
+    from utils.chunking import split_passages
+
+    texts = [p["text"] for c in fixture_chapters(args.chapters) for p in split_passages(c["content"])]
+    with tempfile.TemporaryDirectory() as tmp:
+        texts_path = os.path.join(tmp, "texts.json")
+        with open(texts_path, "w", encoding="utf-8") as f:
+            json.dump(texts, f)
+        print(f"{len(texts)} passages, batch_size={args.batch_size}")
+
+        reference = None
+        for engine in args.engines:
+            vectors_path = os.path.join(tmp, f"{engine}.npy")
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_engines", "--engines", engine, "--batch-size", str(args.batch_size),
+                 "--child", texts_path, vectors_path],
+                capture_output=True, text=True,
+            )
+            if out.returncode:
+                print(f"  {engine:<22} failed: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+                continue
+            row = json.loads(out.stdout.strip().splitlines()[-1])
+            vectors = np.load(vectors_path)
+            parity = ""
+            if reference is None:
+                reference = vectors
+            else:
+                report = parity_report(reference, vectors)
+                parity = f"  cosine min {report['min_cosine']:.4f} mean {report['mean_cosine']:.4f}"
+            print(f"  {row['name']:<40} load {row['load_s']:5.1f}s  {row['passages_per_s']:8.1f} passages/s  "
+                  f"peak RSS {row['peak_rss_mb']:7.1f} MB{parity}")
@@ -0,0 +1,73 @@
+# benchmarks/bench_feedback_store.py
+"""
+Write latency of the append-only feedback log as it grows, next to the
+old load-append-rewrite JSON approach.
+
+    python -m benchmarks.bench_feedback_store --entries 300000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from ai.human_feedback import FeedbackLog
+
+
+def entry(i):
+    return {"timestamp": "2025-07-15T10:00:00Z", "score": 1 + i % 5, "context": f"chapters/chapter_{i:06d}_final.txt"}
+
+
+def legacy_append(path, item):
+    logs = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            logs = json.load(f)
+    logs.append(item)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(logs, f, indent=2)
+
+
+def bench(append, total, checkpoints, sample=200):
+    """Appends `total` entries and reports the latency of `sample` writes at each checkpoint."""
+    rows = []
+    written = 0
+    for checkpoint in checkpoints:
+        while written < checkpoint - sample:
+            append(entry(written))
+            written += 1
+        latencies = []
+        while written < checkpoint:
+            start = time.perf_counter()
+            append(entry(written))
+            latencies.append(time.perf_counter() - start)
+            written += 1
+        rows.append((checkpoint, statistics.mean(latencies), sorted(latencies)[int(0.95 * (len(latencies) - 1))]))
+        if written >= total:
+            break
+    return rows
+
+
+def print_rows(name, rows):
+    for size, mean, p95 in rows:
+        print(f"{name:<10} log_size={size:>8} mean={mean * 1e6:9.1f}µs p95={p95 * 1e6:9.1f}µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feedback log write latency vs. log size")
+    parser.add_argument("--entries", type=int, default=300_000)
+    parser.add_argument("--legacy-entries", type=int, default=5_000, help="the legacy path is O(n) per write, keep it small")
+    args = parser.parse_args()
+
+    checkpoints = [c for c in (1_000, 10_000, 50_000, 100_000, 200_000, 300_000, 500_000) if c <= args.entries]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = FeedbackLog(os.path.join(tmp, "feedback.jsonl"))
+        print_rows("jsonl", bench(log.append, args.entries, checkpoints))
+        log.close()
+
+        legacy_path = os.path.join(tmp, "feedback.json")
+        legacy_checkpoints = [c for c in (500, 1_000, 2_500, 5_000, 10_000) if c <= args.legacy_entries]
+        print_rows("legacy", bench(lambda item: legacy_append(legacy_path, item), args.legacy_entries, legacy_checkpoints))
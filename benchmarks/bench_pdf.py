@@ -0,0 +1,168 @@
+# benchmarks/bench_pdf.py
+"""
+PDF rendering benchmark on a synthetic book. Each scenario runs in its
+own interpreter so peak RSS and the font caches are measured cold.
+
+    python -m benchmarks.bench_pdf --pages 500
+    python -m benchmarks.bench_pdf --pages 500 --chapter-calls 20
+    python -m benchmarks.bench_pdf --pages 1000 --scenarios book,parallel,parallel-reuse --workers 4
+
+  legacy-book  the old main_ai.save_pdf: one FPDF holding the whole book
+  book         BookBuilder: each chapter rendered alone and streamed into the book file
+  parallel     build_book: chapters rendered in --workers processes, merged behind a TOC
+  parallel-reuse  build_book again over a warm chapter cache (only the rebuild is timed)
+  legacy-pdf   the old generate_pdf: add_font + one multi_cell per line, per call
+  pdf          generate_pdf with the cached font, subsets and paragraph layout
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FONT_PATH = str(REPO_ROOT / "utils" / "fonts" / "DejaVuSans.ttf")
+CHARS_PER_PAGE = 2600  # 11pt DejaVu on A4 with 8 mm lines
+
+WORDS = ("keeper lamp harbour reef stair causeway storm shutter bell village signal tide lantern night winter "
+         "stranger brother master fire rain clock light quiet narrow northern broken long old").split()
+
+
+def chapter_text(seed: int, chars: int) -> str:
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < chars:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraphs.append(" ".join(sentences))
+        size += len(paragraphs[-1]) + 2
+    return "\n\n".join(paragraphs)
+
+
+def book(pages: int, pages_per_chapter: int):
+    for i in range(max(1, pages // pages_per_chapter)):
+        yield {"title": f"The Lantern Keeper, part {i + 1}", "content": chapter_text(i, pages_per_chapter * CHARS_PER_PAGE)}
+
+
+# === Scenarios (run in a child process) ===
+def legacy_save_pdf(chapters, output_path):
+    """main_ai.save_pdf before the streaming builder."""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_font("DejaVu", "", FONT_PATH, uni=True)
+    pdf.fonts["dejavu"]["ttffile"] = FONT_PATH
+    pdf.set_auto_page_break(auto=True, margin=15)
+    for i, chapter in enumerate(chapters, 1):
+        pdf.add_page()
+        pdf.set_font("DejaVu", size=14)
+        pdf.multi_cell(0, 10, f"Chapter {i}: {chapter['title']}\n\n")
+        pdf.set_font("DejaVu", size=11)
+        pdf.multi_cell(0, 8, chapter["content"])
+    pdf.output(output_path)
+
+
+def legacy_generate_pdf(content, title, output_path):
+    """utils.pdf_utils.generate_pdf before the font cache."""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.add_font("DejaVu", "", FONT_PATH, uni=True)
+    pdf.fonts["dejavu"]["ttffile"] = FONT_PATH
+    pdf.set_font("DejaVu", "", 14)
+    pdf.set_title(title)
+    for line in content.split("\n"):
+        pdf.multi_cell(0, 10, line.strip())
+    pdf.output(output_path)
+
+
+def book_chapters(pages, pages_per_chapter):
+    return ((f"Chapter {i}: {chapter['title']}", chapter["content"]) for i, chapter in enumerate(book(pages, pages_per_chapter), 1))
+
+
+def run_scenario(name, pages, pages_per_chapter, chapter_calls, workers, out_dir):
+    output = os.path.join(out_dir, f"{name}.pdf")
+    if name == "parallel-reuse":
+        from utils.pdf_utils import build_book
+
+        build_book(book_chapters(pages, pages_per_chapter), output, workers=workers, cache_dir=os.path.join(out_dir, "cache"))
+    start = time.perf_counter()
+    if name == "legacy-book":
+        legacy_save_pdf(book(pages, pages_per_chapter), output)
+    elif name == "book":
+        from utils.pdf_utils import BookBuilder
+
+        builder = BookBuilder(output, title="The Lantern Keeper")
+        for i, chapter in enumerate(book(pages, pages_per_chapter), 1):
+            builder.add_chapter(f"Chapter {i}: {chapter['title']}", chapter["content"])
+        builder.finish()
+    elif name in ("parallel", "parallel-reuse"):
+        from utils.pdf_utils import build_book
+
+        build_book(book_chapters(pages, pages_per_chapter), output, title="The Lantern Keeper",
+                   workers=workers, cache_dir=os.path.join(out_dir, "cache"))
+    else:
+        from utils.pdf_utils import generate_pdf
+
+        render = legacy_generate_pdf if name == "legacy-pdf" else generate_pdf
+        for i in range(chapter_calls):
+            render(chapter_text(i, 3 * CHARS_PER_PAGE), f"Chapter {i}", output)
+    seconds = time.perf_counter() - start
+
+    from pypdf import PdfReader
+
+    calls = chapter_calls if name in ("legacy-pdf", "pdf") else 1
+    return {
+        "scenario": name,
+        "seconds": seconds,
+        "pages": len(PdfReader(output).pages) * calls,
+        "calls": calls,
+        "size_mb": os.path.getsize(output) / 2**20,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def spawn(name, args):
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_pdf", "--run", name, "--pages", str(args.pages),
+         "--pages-per-chapter", str(args.pages_per_chapter), "--chapter-calls", str(args.chapter_calls), "--workers", str(args.workers)],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(row):
+    extra = f"{row['calls'] / row['seconds']:6.1f} calls/s" if row["calls"] > 1 else f"{row['size_mb']:6.1f} MB file"
+    print(
+        f"{row['scenario']:<14} pages={row['pages']:<5} wall={row['seconds']:7.2f}s "
+        f"{row['pages'] / row['seconds']:7.1f} pages/s  {extra}  peak RSS {row['rss_mb']:6.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Whole-book and per-chapter PDF rendering")
+    parser.add_argument("--pages", type=int, default=500, help="approximate book length")
+    parser.add_argument("--pages-per-chapter", type=int, default=10)
+    parser.add_argument("--chapter-calls", type=int, default=20, help="generate_pdf calls in the per-chapter scenarios")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="render processes in the parallel scenarios")
+    parser.add_argument("--scenarios", default="legacy-book,book,parallel,parallel-reuse,legacy-pdf,pdf")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        with tempfile.TemporaryDirectory() as tmp:
+            print(json.dumps(run_scenario(args.run, args.pages, args.pages_per_chapter, args.chapter_calls, args.workers, tmp)))
+    else:
+        for scenario in args.scenarios.split(","):
+            report(spawn(scenario, args))
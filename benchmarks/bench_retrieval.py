@@ -0,0 +1,103 @@
+# benchmarks/bench_retrieval.py
+"""
+Recall and latency of vector, lexical (BM25) and hybrid chapter search on
+a synthetic multi-book corpus, indexed into a throwaway Chroma dir.
+
+    python -m benchmarks.bench_retrieval --books 6 --chapters 25 --queries 200
+
+Every chapter names a few characters and places of its own, drawn from a
+pool of made-up names, so exact-name queries have known answers. Half of
+the queries also carry a min_score filter.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_pdf import chapter_text
+
+SYLLABLES = "ar bel cor dun el fen gar hal is jor kel lun mar nor ol pen quar ros sel tor ul ven wyn yar zel".split()
+QUERY_TEMPLATES = ("Where does {name} appear?", "{name}", "the chapter with {name} in it", "what happened to {name}")
+
+
+def made_up_name(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def build_corpus(books, chapters_per_book, names_per_chapter, seed=7):
+    """Chapters as store_chapters_bulk() takes them, plus name -> chapter ids."""
+    rng = random.Random(seed)
+    pool = sorted({made_up_name(rng) for _ in range(books * chapters_per_book * names_per_chapter * 2)})
+    chapters, mentions = [], {}
+    for book in range(books):
+        for num in range(1, chapters_per_book + 1):
+            chapter_id = f"b{book}c{num}"
+            paragraphs = chapter_text(book * 1000 + num, 3000).split("\n\n")
+            for name in rng.sample(pool, names_per_chapter):
+                i = rng.randrange(len(paragraphs))
+                paragraphs[i] = f"{paragraphs[i]} {name} was there."
+                mentions.setdefault(name, set()).add(chapter_id)
+            chapters.append({"chapter_num": chapter_id, "title": f"Book {book}, Chapter {num}",
+                             "content": "\n\n".join(paragraphs), "feedback_score": rng.randint(1, 5)})
+    return chapters, mentions
+
+
+def make_queries(chapters, mentions, count, seed=11):
+    rng = random.Random(seed)
+    scores = {c["chapter_num"]: c["feedback_score"] for c in chapters}
+    queries = []
+    for i in range(count):
+        name = rng.choice(sorted(mentions))
+        filters = {"min_score": 4} if i % 2 else None
+        relevant = {c for c in mentions[name] if filters is None or scores[c] >= 4}
+        if relevant:
+            queries.append((rng.choice(QUERY_TEMPLATES).format(name=name), filters, relevant))
+    return queries
+
+
+def run_mode(index, mode, queries, top_k):
+    # A cache that keeps nothing, so every query pays for its embedding like a cold one
+    query_cache = index.QueryEmbeddingCache(index.encode, max_size=0)
+    latencies, recalls = [], []
+    for query, filters, relevant in queries:
+        start = time.perf_counter()
+        raw = index.search_similar_chapters(query, top_k=top_k, filters=filters, mode=mode, query_cache=query_cache)
+        latencies.append(time.perf_counter() - start)
+        found = {str(meta["chapter"]) for meta in raw["metadatas"][0]}
+        recalls.append(len(found & relevant) / len(relevant))
+    latencies.sort()
+    return {
+        "recall": statistics.mean(recalls),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector vs lexical vs hybrid chapter retrieval")
+    parser.add_argument("--books", type=int, default=6)
+    parser.add_argument("--chapters", type=int, default=25, help="chapters per book")
+    parser.add_argument("--names", type=int, default=4, help="made-up names mentioned per chapter")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CHROMA_DIR"] = tmp
+        os.environ["LEXICAL_INDEX_PATH"] = os.path.join(tmp, "lexical.db")
+        os.environ["INDEX_GENERATION_PATH"] = os.path.join(tmp, "index_generation")
+        from ai import embedding_index as index
+
+        chapters, mentions = build_corpus(args.books, args.chapters, args.names)
+        start = time.perf_counter()
+        passages = index.store_chapters_bulk(chapters)
+        print(f"indexed {len(chapters)} chapters ({passages} passages) in {time.perf_counter() - start:.1f}s")
+
+        queries = make_queries(chapters, mentions, args.queries)
+        print(f"{len(queries)} exact-name queries, half with min_score=4, recall@{args.top_k}:")
+        for mode in ("vector", "lexical", "hybrid"):
+            row = run_mode(index, mode, queries, args.top_k)
+            print(f"  {mode:<8} recall {row['recall']:.3f}  p50 {row['p50_ms']:7.2f} ms  p95 {row['p95_ms']:7.2f} ms")
@@ -0,0 +1,81 @@
+# benchmarks/bench_scrape_backends.py
+"""
+Compares the plain-HTTP scrape backend with the pooled Playwright one on
+the local fixtures: pages/s, per-page latency and whether both backends
+extract the same title, text and next link.
+
+    python -m benchmarks.bench_scrape_backends --rounds 5 --workers 2
+    python -m benchmarks.bench_scrape_backends --backends http   # no browser needed
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixture_server import chapter_urls, serve_fixtures
+from scraping.scraper import fetch_chapter
+
+
+def run_backend(backend, urls, workers, pool=None):
+    latencies, pages = [], {}
+
+    def one(url):
+        start = time.perf_counter()
+        pages[url] = fetch_chapter(url, backend=backend, pool=pool)
+        latencies.append(time.perf_counter() - start)
+
+    fetch_chapter(urls[0], backend=backend, pool=pool)  # Warm-up: connection / browser start
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(one, urls))
+    return time.perf_counter() - start, latencies, pages
+
+
+def report(name, wall, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(
+        f"{name:<8} pages={len(latencies):<4} wall={wall:6.2f}s {len(latencies) / wall:7.1f} pages/s "
+        f"mean={statistics.mean(latencies) * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms"
+    )
+
+
+def compare(results):
+    """Prints every page where the backends disagree on title, text or next link."""
+    (first, pages), *others = results.items()
+    mismatches = 0
+    for name, other in others:
+        for url, page in pages.items():
+            for field in ("title", "content", "next_url"):
+                if page[field] != other[url][field]:
+                    mismatches += 1
+                    print(f"⚠️ {field} differs for {url} ({first} vs {name})")
+    print("✅ Backends agree on every page" if not mismatches else f"❌ {mismatches} differences")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plain HTTP vs Playwright scraping")
+    parser.add_argument("--backends", default="http,browser", help="comma-separated backends to compare")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the fixture book")
+    parser.add_argument("--workers", type=int, default=2, help="concurrent fetches (and browser pool size)")
+    args = parser.parse_args()
+
+    results = {}
+    with serve_fixtures() as base_url:
+        urls = chapter_urls(base_url) * args.rounds
+        for backend in args.backends.split(","):
+            pool = None
+            if backend == "browser":
+                from scraping.browser_pool import BrowserPool
+                pool = BrowserPool(size=args.workers).start()
+            try:
+                wall, latencies, pages = run_backend(backend, urls, args.workers, pool)
+            finally:
+                if pool:
+                    pool.close()
+            report(backend, wall, latencies)
+            results[backend] = pages
+
+    if len(results) > 1:
+        compare(results)
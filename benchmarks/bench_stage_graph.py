@@ -0,0 +1,88 @@
+# benchmarks/bench_stage_graph.py
+"""
+End-to-end latency of the post-edit stages (feedback, embed, PDF, TTS),
+run one after another as before versus fanned out by StageGraph.
+
+PDF rendering and the feedback log are the real implementations. TTS is
+replaced by an equivalent CPU-bound busy loop and embedding by a sleep
+(an IPC round-trip to the embedding service), since neither a speech
+engine nor the model has to be installed to run this.
+
+    python -m benchmarks.bench_stage_graph --rounds 5 --repeat 6
+"""
+
+import argparse
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from benchmarks.fixture_server import FIXTURE_BOOK, FIXTURE_DIR
+from ai.human_feedback import FeedbackLog
+from utils.pdf_utils import generate_pdf
+from utils.stage_graph import StageGraph, get_stage_process_pool, shutdown_stage_pools
+
+
+def fake_tts(text: str, output_path: str, seconds: float) -> str:
+    """Burns CPU for `seconds`, like a local speech engine would."""
+    deadline = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+    with open(output_path, "wb") as f:
+        f.write(b"RIFF")
+    return output_path
+
+
+def fake_embed(seconds: float):
+    time.sleep(seconds)
+
+
+def stages(tmp, i, text, args):
+    log = FeedbackLog(os.path.join(tmp, "feedback.jsonl"))
+    return [
+        ("feedback", log.append, (), {"entry": {"score": 4, "context": f"chapter_{i}"}}, False),
+        ("embed", fake_embed, (args.embed_ms / 1000,), {}, False),
+        ("pdf", generate_pdf, (), {"content": text, "title": f"Chapter {i}", "output_path": os.path.join(tmp, f"{i}.pdf")}, True),
+        ("tts", fake_tts, (text, os.path.join(tmp, f"{i}.wav"), args.tts_ms / 1000), {}, True),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Post-edit stage latency: sequential vs StageGraph")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=6, help="Fixture chapter copies per final text")
+    parser.add_argument("--tts-ms", type=float, default=800)
+    parser.add_argument("--embed-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    page = sorted((FIXTURE_DIR / "wiki" / FIXTURE_BOOK).glob("Chapter_*.html"))[0]
+    text = re.sub(r"<[^>]+>", "", page.read_text(encoding="utf-8")) * args.repeat
+
+    get_stage_process_pool().submit(time.sleep, 0).result()  # Spawn workers outside the timings
+    with tempfile.TemporaryDirectory() as tmp:
+        sequential, graph_times, stage_times = [], [], []
+        for i in range(args.rounds):
+            start = time.perf_counter()
+            for _, fn, fn_args, kwargs, _ in stages(tmp, i, text, args):
+                fn(*fn_args, **kwargs)
+            sequential.append(time.perf_counter() - start)
+
+            graph = StageGraph()
+            for name, fn, fn_args, kwargs, process in stages(tmp, i, text, args):
+                graph.add(name, fn, *fn_args, process=process, **kwargs)
+            start = time.perf_counter()
+            run = graph.run()
+            graph_times.append(time.perf_counter() - start)
+            assert not run.errors, run.errors
+            stage_times.append(run.timings)
+
+        seq, par = statistics.median(sequential), statistics.median(graph_times)
+        print(f"final text: {len(text)} chars, tts {args.tts_ms:.0f} ms, embed {args.embed_ms:.0f} ms, {os.cpu_count()} CPU(s)")
+        for name in stage_times[0]:
+            print(f"  {name:<8} {statistics.median(t[name] for t in stage_times) * 1000:8.1f} ms inside the graph")
+        print(f"sequential stages: {seq * 1000:8.1f} ms (median of {args.rounds})")
+        print(f"StageGraph:        {par * 1000:8.1f} ms (median of {args.rounds})")
+        print(f"latency reduction: {(1 - par / seq) * 100:5.1f}%")
+    shutdown_stage_pools()
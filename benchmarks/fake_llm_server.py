@@ -0,0 +1,138 @@
+# benchmarks/fake_llm_server.py
+"""
+OpenAI-compatible stub for /v1/chat/completions, so the pipeline can be
+benchmarked without OpenRouter. It answers with the passage it was sent
+(the text after the first blank line of the last user message), after
+`latency_ms` of time-to-first-token and at `tokens_per_second`.
+Streaming, including the final usage chunk, is supported.
+
+    python -m benchmarks.fake_llm_server --port 8766 --latency-ms 400 --tokens-per-second 150
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 uvicorn api:app
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TOKEN_RE = re.compile(r"\S+\s*")
+
+
+def count_tokens(text: str) -> int:
+    """Same ~4 characters per token estimate the chunker uses."""
+    return (len(text) + 3) // 4
+
+
+def reply_for(messages: list) -> str:
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    if isinstance(user, list):  # Content parts
+        user = " ".join(p.get("text", "") for p in user if isinstance(p, dict))
+    return user.split("\n\n", 1)[-1] if "\n\n" in user else user
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_ms = 200.0
+    tokens_per_second = 200.0
+    requests_served = 0
+    _count_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self._count_lock:
+            type(self).requests_served += 1
+
+        text = reply_for(body.get("messages", []))
+        max_tokens = body.get("max_tokens") or 4096
+        pieces = _TOKEN_RE.findall(text)[:max_tokens]
+        usage = {
+            "prompt_tokens": sum(count_tokens(m.get("content") or "") for m in body.get("messages", [])),
+            "completion_tokens": len(pieces),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "fake")
+
+        time.sleep(self.latency_ms / 1000)
+        if body.get("stream"):
+            self._stream(completion_id, model, pieces, usage, (body.get("stream_options") or {}).get("include_usage"))
+            return
+
+        time.sleep(len(pieces) / self.tokens_per_second)
+        self._send_json({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _send_json(self, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, completion_id, model, pieces, usage, include_usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send(chunk):
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for piece in pieces:
+            send({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+            time.sleep(1 / self.tokens_per_second)
+        send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if include_usage:
+            send({**base, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+@contextmanager
+def serve_fake_llm(port: int = 0, latency_ms: float = 200, tokens_per_second: float = 200):
+    """Runs the stub on a background thread and yields its OpenAI base URL (…/v1)."""
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), {
+        "latency_ms": latency_ms, "tokens_per_second": tokens_per_second, "requests_served": 0,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible fake LLM server")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency-ms", type=float, default=200, help="time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    args = parser.parse_args()
+
+    with serve_fake_llm(args.port, args.latency_ms, args.tokens_per_second) as base_url:
+        print(f"🤖 Fake LLM listening at {base_url} (OPENAI_BASE_URL)")
+        threading.Event().wait()
@@ -0,0 +1,59 @@
+# benchmarks/fixture_server.py
+"""
+Serves the saved Wikisource-style chapter pages under benchmarks/fixtures/
+so scrapers can be benchmarked without touching the network.
+
+    python -m benchmarks.fixture_server --port 8765
+"""
+
+import argparse
+import threading
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+FIXTURE_BOOK = "The_Lantern_Keeper"
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Maps extension-less wiki paths (/wiki/Book/Chapter_1) to the saved .html files."""
+
+    def translate_path(self, path):
+        local = super().translate_path(path)
+        if not Path(local).exists() and Path(local + ".html").exists():
+            return local + ".html"
+        return local
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+
+@contextmanager
+def serve_fixtures(port: int = 0):
+    """Runs the fixture server on a background thread and yields its base URL."""
+    handler = partial(FixtureHandler, directory=str(FIXTURE_DIR))
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def chapter_urls(base_url: str, book: str = FIXTURE_BOOK):
+    pages = sorted((FIXTURE_DIR / "wiki" / book).glob("Chapter_*.html"), key=lambda p: int(p.stem.split("_")[1]))
+    return [f"{base_url}/wiki/{book}/{p.stem}" for p in pages]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve local chapter fixtures")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with serve_fixtures(args.port) as base_url:
+        print(f"📚 Serving fixtures at {base_url}/wiki/{FIXTURE_BOOK}/Chapter_1")
+        threading.Event().wait()
@@ -1,30 +1,36 @@
 # main.py
 
-import os
 from scraping.scraper import scrape_chapter
+from scraping.browser_pool import shutdown_browser_pool
+from scraping.screenshots import store_screenshot
+from utils.artifact_store import get_artifact_store
 
-def process_chapter_from_url(url: str):
+def process_chapter_from_url(url: str, pool=None, backend: str = None):
     """
-    Scrapes a chapter from a URL and returns the paths to saved text and screenshot.
+    Scrapes a chapter from a URL into the artifact store and returns the
+    stored paths of its text and screenshot.
+    Reuses the warm browser pool across calls; backend="http" skips the browser
+    (and the screenshot) for static pages.
     """
     # Generate a clean chapter ID from URL
     chapter_id = url.strip("/").split("/")[-1].replace(" ", "_").replace("-", "_")
 
-    os.makedirs("chapters", exist_ok=True)
-    os.makedirs("screenshots", exist_ok=True)
+    store = get_artifact_store()
 
-    text_path = f"chapters/{chapter_id}.txt"
-    screenshot_path = f"screenshots/{chapter_id}.png"
-
-    scrape_chapter(
+    text_path, screenshot_path = scrape_chapter(
         url=url,
-        save_text_path=text_path,
-        screenshot_path=screenshot_path
+        save_text_path=store.staging_path("raw.txt"),
+        screenshot_path=store.staging_path("screenshot"),
+        pool=pool,
+        backend=backend
     )
 
-    return text_path, screenshot_path
+    return str(store.put_file(chapter_id, "raw_text", text_path)), store_screenshot(chapter_id, screenshot_path)["screenshot"]
 
 # For manual test runs
 if __name__ == "__main__":
     url = "https://en.wikisource.org/wiki/The_Gates_of_Morning/Book_1/Chapter_1"
-    process_chapter_from_url(url)
+    try:
+        process_chapter_from_url(url)
+    finally:
+        shutdown_browser_pool()
@@ -1,25 +1,27 @@
 import os
 import re
-import sys
-import json
 import asyncio
 import logging
-from urllib.parse import urljoin
-from fpdf import FPDF
-from playwright.async_api import async_playwright
-import httpx
 from dotenv import load_dotenv
 
-from ai.human_feedback import load_feedback, save_feedback
-from ai.embeddings import store_chapter_embedding
-from ai.voice import speak, listen
+from ai.human_feedback import save_feedback
+from ai.llm_gateway import get_async_llm_gateway, llm_api_key
+from ai.feedback_stats import get_feedback_stats
+from ai.embeddings import store_chapter_embedding, store_chapters_bulk
+from scraping.browser_pool import configure_browser_pool, shutdown_browser_pool
+from scraping.scraper import fetch_chapter, wait_for_screenshot
+from scraping.screenshots import store_screenshot
+from utils.artifact_store import get_artifact_store
+from utils.chunking import amap_segments, with_context
+from utils.crawl_manifest import CrawlManifest
+from utils.pdf_utils import PDF_CACHE_DIR, PDF_WORKERS, build_book
 
 # === ENV & CONSTANTS ===
 load_dotenv()
-FONT_NAME = "DejaVu"
-FONT_PATH = os.path.join("fonts", "DejaVuSans.ttf")
 OUTPUT_PDF = "book_output.pdf"
-API_KEY = os.getenv("OPENROUTER_API_KEY")
+REWRITE_WORKERS = int(os.getenv("REWRITE_WORKERS", "3"))
+SCRAPE_AHEAD = int(os.getenv("SCRAPE_AHEAD", "4"))
+API_KEY = llm_api_key()
 
 if not API_KEY:
     raise ValueError("❌ Set your API key as an environment variable: OPENROUTER_API_KEY")
@@ -31,23 +33,35 @@ def clean_filename(text):
     return re.sub(r"[\\/*?\"<>|]", "", text)
 
 
-def save_pdf(chapters):
-    if not os.path.isfile(FONT_PATH):
-        raise FileNotFoundError(f"Missing font at {FONT_PATH}")
-
-    pdf = FPDF()
-    pdf.add_font(FONT_NAME, "", FONT_PATH, uni=True)
-    pdf.set_auto_page_break(auto=True, margin=15)
-
-    for i, chapter in enumerate(chapters, 1):
-        pdf.add_page()
-        pdf.set_font(FONT_NAME, size=14)
-        pdf.multi_cell(0, 10, f"Chapter {i}: {chapter['title']}\n\n")
-        pdf.set_font(FONT_NAME, size=11)
-        pdf.multi_cell(0, 8, chapter["content"])
-
-    pdf.output(OUTPUT_PDF)
-    print(f"📘 PDF saved: {OUTPUT_PDF}")
+def save_pdf(chapters, output_path=OUTPUT_PDF, title="", workers=PDF_WORKERS, cache_dir=PDF_CACHE_DIR):
+    """
+    Renders the chapters (any iterable of dicts with "title" and "content")
+    in `workers` processes and merges them into the book behind a table of
+    contents. Chapters whose text is unchanged reuse their PDF from `cache_dir`.
+    """
+    stats = build_book(
+        ((f"Chapter {chapter.get('chapter_num', i)}: {chapter['title']}", chapter["content"]) for i, chapter in enumerate(chapters, 1)),
+        output_path, title=title, workers=workers, cache_dir=cache_dir,
+    )
+    if not stats["chapters"]:
+        print("⚠️ No chapters to write to the PDF.")
+        return None
+    print(f"📘 PDF saved: {output_path} ({stats['chapters']} chapters, {stats['pages']} pages, "
+          f"{stats['reused']} reused) in {stats['seconds']:.1f}s")
+    return output_path
+
+
+def iter_book_chapters(manifest):
+    """Title and final text of every approved chapter in the manifest, read from disk one at a time."""
+    approved = manifest.approved_chapters()
+    found = {chapter["chapter_num"] for chapter in approved}
+    missing = [n for n in manifest.chapter_nums() if manifest.stage(n, "approve") and n not in found]
+    if missing:
+        print(f"⚠️ Approved text of chapter(s) {', '.join(map(str, missing))} is missing (deleted or garbage-collected); "
+              "they are left out of the book. Rerun the crawl to process them again.")
+    for chapter in approved:
+        with open(chapter["path"], "r", encoding="utf-8") as f:
+            yield {"chapter_num": chapter["chapter_num"], "title": chapter["title"], "content": f.read()}
 
 
 def generate_adaptive_prompt(score_avg):
@@ -70,154 +84,303 @@ def generate_adaptive_prompt(score_avg):
 
 async def spin_chapter(text, chapter_num, score_avg):
     prompt = generate_adaptive_prompt(score_avg)
-    headers = {"Authorization": f"Bearer {API_KEY}"}
-    data = {
-        "model": "deepseek/deepseek-chat-v3-0324:free",
-        "messages": [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": f"Rewrite and review this:\n\n{text[:8000]}"}
-        ]
-    }
+    # The shared async gateway keeps connections alive across chapters and caps concurrent requests
+    gateway = get_async_llm_gateway()
+
+    async def spin_segment(segment, context):
+        response = await gateway.complete(
+            model="deepseek/deepseek-chat-v3-0324:free",
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": with_context(f"Rewrite and review this:\n\n{segment}", context)}
+            ]
+        )
+        return response.choices[0].message.content
 
     try:
-        async with httpx.AsyncClient(timeout=90) as client:
-            res = await client.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data)
-            res.raise_for_status()
-            content = res.json()["choices"][0]["message"]["content"]
-            return content
+        return await amap_segments(spin_segment, text)
     except Exception as e:
+        # Raised, not returned as text: a failed rewrite must stay incomplete so a rerun retries it
         print(f"❌ API error: {e}")
-        return "Rewrite failed."
+        raise
 
 
 def compute_feedback_average():
-    feedback = load_feedback()
-    if not isinstance(feedback, list) or len(feedback) == 0:
-        return 3.0  # Default neutral
-    scores = [entry["score"] for entry in feedback if isinstance(entry.get("score"), int)]
-    return sum(scores) / len(scores) if scores else 3.0
-
-
-async def scrape_and_process(start_url):
-    chapters = []
-    visited = set()
-    current_url = start_url
-    chapter_num = 1
-
-    os.makedirs("screenshots", exist_ok=True)
-    os.makedirs("chapters", exist_ok=True)
-
-    async with async_playwright() as p:
-        browser = await p.webkit.launch()
-        context = await browser.new_context()
-
-        while current_url and current_url not in visited:
-            visited.add(current_url)
-            print(f"\n✅ Processing chapter {chapter_num}: {current_url}")
-
-            page = await context.new_page()
-            await page.goto(current_url)
-
-            title = await page.title()
-            clean_title = title.replace(" - Wikisource, the free online library", "")
-            content = await page.inner_text("div#mw-content-text")
-
-            raw_path = f"chapters/chapter{chapter_num}.txt"
-            with open(raw_path, "w", encoding="utf-8") as f:
-                f.write(content)
-
-            screenshot_path = f"screenshots/chapter{chapter_num}.png"
-            await page.screenshot(path=screenshot_path, full_page=True)
-            print(f"📸 Saved screenshot")
-
-            score_avg = compute_feedback_average()
-            print("✍️ Rewriting chapter with LLM...")
-            rewritten_output = await spin_chapter(content, chapter_num, score_avg)
-
-            reviewed_path = f"chapters/chapter{chapter_num}_reviewed.txt"
-            with open(reviewed_path, "w", encoding="utf-8") as f:
-                f.write(rewritten_output)
-
-            print("=" * 60)
-            print(f"🧾 Reviewed Output for Chapter {chapter_num}:\n")
-            print(rewritten_output[:1000] + ("..." if len(rewritten_output) > 1000 else ""))
-            print("=" * 60)
-
-            speak("Chapter rewrite complete. Say approve, edit, or regenerate. Then rate 1 to 5.")
-            attempts = 0
-            while attempts < 3:
-                user_command = listen().lower().strip()
-                if any(x in user_command for x in ["approve", "edit", "regenerate"]):
-                    break
-                speak("Didn't catch that. Say approve, edit, or regenerate.")
-                attempts += 1
-
-            feedback_score = 3
-            decision = "a"
+    return get_feedback_stats().mean(default=3.0)  # Default neutral
+
+
+def ask_voice_approval(chapter_num, reviewed_path):
+    """Blocking voice prompt; returns (decision, feedback_score)."""
+    from ai.voice import speak, listen  # Microphone and TTS libraries are only needed for voice approval
+
+    speak("Chapter rewrite complete. Say approve, edit, or regenerate. Then rate 1 to 5.")
+    attempts = 0
+    while attempts < 3:
+        user_command = listen().lower().strip()
+        if any(x in user_command for x in ["approve", "edit", "regenerate"]):
+            break
+        speak("Didn't catch that. Say approve, edit, or regenerate.")
+        attempts += 1
+
+    feedback_score = 3
+    decision = "a"
+
+    if "edit" in user_command:
+        decision = "e"
+    elif "regenerate" in user_command:
+        decision = "r"
+
+    for word in user_command.split():
+        if word.isdigit() and 1 <= int(word) <= 5:
+            feedback_score = int(word)
+            break
+
+    if decision == "e":
+        print(f"Please manually edit the file: {reviewed_path}")
+        speak("Please edit the file and press Enter when done.")
+        input("🔧 Press Enter after editing...")
+
+    return decision, feedback_score
+
+
+async def scrape_and_process(start_url, workers=REWRITE_WORKERS, scrape_ahead=SCRAPE_AHEAD,
+                             approval="voice", default_score=3, backend=None, screenshot_mode=None,
+                             manifest=None, refresh=False):
+    """
+    Crawls a book as a producer/consumer pipeline: the scraper follows the
+    "→" links up to `scrape_ahead` chapters ahead while `workers` rewrite
+    tasks consume them. Approvals run in chapter order, either by voice or,
+    with approval="batch", non-interactively with `default_score`.
+    `backend` picks the scrape backend (see scraping/scraper.py); with
+    screenshot_mode="off" the default "auto" backend never starts a browser.
+    Screenshots are captured in the background while the chapter is rewritten.
+
+    Progress is checkpointed in a per-book CrawlManifest. A rerun resumes at
+    the first incomplete chapter; with `refresh` it re-scrapes from the start.
+    Either way, chapters whose scraped text is unchanged reuse their stored
+    rewrite and approval instead of calling the LLM again. Texts and
+    screenshots go to the artifact store as chapter "<book>/chapter<N>".
+    """
+    manifest = manifest or CrawlManifest.for_book(start_url)
+    book_dir = manifest.path.stem
+    store = get_artifact_store()
+
+    def chapter_key(chapter_num):
+        return f"{book_dir}/chapter{chapter_num}"
+
+    first_num, first_url = (1, start_url) if refresh else manifest.resume_point()
+    if first_num > 1:
+        print(f"⏩ Resuming {book_dir} at chapter {first_num}: {first_url}")
+
+    scraped = asyncio.Queue(maxsize=scrape_ahead)
+    screenshots = []  # (chapter number, deferred screenshot future), awaited before returning
+    rewritten = {}  # chapter_num -> Future of the rewrite result
+    loop = asyncio.get_running_loop()
+    total = None
+
+    def slot(chapter_num):
+        if chapter_num not in rewritten:
+            rewritten[chapter_num] = loop.create_future()
+        return rewritten[chapter_num]
+
+    async def scraper():
+        nonlocal total
+        visited = {manifest.chapter(n)["url"] for n in manifest.chapter_nums() if n < first_num}
+        current_url = first_url
+        chapter_num = first_num - 1
+        try:
+            while current_url and current_url not in visited:
+                visited.add(current_url)
+                chapter_num += 1
+                print(f"\n✅ Scraping chapter {chapter_num}: {current_url}")
 
-            if "edit" in user_command:
-                decision = "e"
-            elif "regenerate" in user_command:
-                decision = "r"
+                page_data = await asyncio.to_thread(
+                    fetch_chapter, current_url, screenshot_path=store.staging_path(f"chapter{chapter_num}"), backend=backend,
+                    wait_until="load", screenshot_mode=screenshot_mode, defer_screenshot=True
+                )
+                if page_data["screenshot"] is not None:
+                    screenshots.append((chapter_num, page_data["screenshot"]))
 
-            for word in user_command.split():
-                if word.isdigit() and 1 <= int(word) <= 5:
-                    feedback_score = int(word)
-                    break
+                raw_path = await asyncio.to_thread(store.put_text, chapter_key(chapter_num), "raw_text", page_data["content"])
+                changed = manifest.record_scrape(
+                    chapter_num, current_url, page_data["title"], page_data["content"], page_data["next_url"], raw_path
+                )
+                if not changed and manifest.completed(chapter_num, "rewrite"):
+                    print(f"♻️ Chapter {chapter_num} is unchanged since the last crawl")
 
-            if decision == "e":
-                print(f"Please manually edit the file: {reviewed_path}")
-                speak("Please edit the file and press Enter when done.")
-                input("🔧 Press Enter after editing...")
+                await scraped.put((chapter_num, page_data))
 
+                next_url = page_data["next_url"]
+                if next_url in visited:
+                    print("🛑 Loop detected. Stopping.")
+                    break
+                if not next_url:
+                    print("🏁 No next chapter found. Scraping complete.")
+                current_url = next_url
+        except Exception as e:
+            print(f"❌ Scraping stopped at chapter {chapter_num}: {e}")
+            chapter_num -= 1
+        finally:
+            total = chapter_num
+            for _ in range(workers):
+                await scraped.put(None)
+
+    async def rewriter():
+        while True:
+            item = await scraped.get()
+            if item is None:
+                return
+            chapter_num, page_data = item
             try:
-                save_feedback(chapter_num, decision, feedback_score)
+                if manifest.completed(chapter_num, "rewrite"):
+                    reviewed_path = manifest.stage(chapter_num, "rewrite")["artifacts"]["reviewed_text"]
+                    with open(reviewed_path, "r", encoding="utf-8") as f:
+                        output = f.read()
+                else:
+                    print(f"✍️ Rewriting chapter {chapter_num} with LLM...")
+                    output = await spin_chapter(page_data["content"], chapter_num, compute_feedback_average())
+
+                    reviewed_path = store.put_text(chapter_key(chapter_num), "reviewed_text", output)
+                    manifest.complete(chapter_num, "rewrite", {"reviewed_text": reviewed_path})
+                slot(chapter_num).set_result((page_data["title"], output, reviewed_path))
             except Exception as e:
-                print(f"⚠️ Could not save feedback: {e}")
-
+                slot(chapter_num).set_exception(e)
+
+    async def approver():
+        chapters = []
+        batch = []
+        chapter_num = first_num
+        while total is None or chapter_num <= total:
+            waiter = slot(chapter_num)
+            while not waiter.done() and total is None:
+                await asyncio.wait([waiter, scraper_task], return_when=asyncio.FIRST_COMPLETED)
+            if total is not None and chapter_num > total:
+                break
             try:
-                store_chapter_embedding(
-                    chapter_num=chapter_num,
-                    title=clean_title,
-                    content=rewritten_output,
-                    feedback_score=feedback_score
-                )
+                clean_title, rewritten_output, _ = await waiter
             except Exception as e:
-                print(f"⚠️ Failed to store embedding: {e}")
+                print(f"⚠️ Skipping chapter {chapter_num}: {e}")
+                chapter_num += 1
+                continue
+
+            if manifest.completed(chapter_num, "approve"):
+                approved = manifest.stage(chapter_num, "approve")
+                decision, feedback_score = approved["decision"], approved["feedback_score"]
+                with open(approved["artifacts"]["final_text"], "r", encoding="utf-8") as f:
+                    rewritten_output = f.read()
+                print(f"♻️ Chapter {chapter_num} was already approved ({decision}, {feedback_score}/5)")
+            else:
+                print("=" * 60)
+                print(f"🧾 Reviewed Output for Chapter {chapter_num}:\n")
+                print(rewritten_output[:1000] + ("..." if len(rewritten_output) > 1000 else ""))
+                print("=" * 60)
+
+                if approval == "batch":
+                    decision, feedback_score = "a", default_score
+                else:
+                    # Stored blobs are never edited in place; the reviewer edits a working copy
+                    edit_path = store.staging_path(f"chapter{chapter_num}_edit.txt")
+                    edit_path.write_text(rewritten_output, encoding="utf-8")
+                    decision, feedback_score = await asyncio.to_thread(ask_voice_approval, chapter_num, edit_path)
+                    if decision == "e":
+                        rewritten_output = edit_path.read_text(encoding="utf-8")
+                    edit_path.unlink()
+
+                try:
+                    save_feedback(chapter_num, decision, feedback_score)
+                except Exception as e:
+                    print(f"⚠️ Could not save feedback: {e}")
+                final_path = store.put_text(chapter_key(chapter_num), "final_text", rewritten_output)
+                manifest.complete(chapter_num, "approve", {"final_text": final_path},
+                                  title=clean_title, decision=decision, feedback_score=feedback_score)
+
+            embedding = {
+                "chapter_num": chapter_num,
+                "title": clean_title,
+                "content": rewritten_output,
+                "feedback_score": feedback_score
+            }
+            if manifest.completed(chapter_num, "embed"):
+                pass
+            elif approval == "batch":
+                batch.append(embedding)
+            else:
+                try:
+                    await asyncio.to_thread(store_chapter_embedding, **embedding)
+                    manifest.complete(chapter_num, "embed")
+                except Exception as e:
+                    print(f"⚠️ Failed to store embedding: {e}")
 
             chapters.append({
+                "chapter_num": chapter_num,
                 "title": clean_title,
                 "content": rewritten_output
             })
+            chapter_num += 1
 
-            next_link = await page.query_selector('a:has-text("→")')
-            if next_link:
-                href = await next_link.get_attribute("href")
-                next_url = urljoin(current_url, href)
-                if next_url in visited:
-                    print("🛑 Loop detected. Stopping.")
-                    break
-                current_url = next_url
-                chapter_num += 1
-            else:
-                print("🏁 No next chapter found. Scraping complete.")
-                break
+        if batch:
+            try:
+                count = await asyncio.to_thread(store_chapters_bulk, batch)
+                print(f"📦 Embedded {len(batch)} chapters ({count} passages) into ChromaDB.")
+                for embedding in batch:
+                    manifest.complete(embedding["chapter_num"], "embed")
+            except Exception as e:
+                print(f"⚠️ Failed to store embeddings: {e}")
+        return chapters
 
-            await page.close()
+    scraper_task = asyncio.create_task(scraper())
+    rewriter_tasks = [asyncio.create_task(rewriter()) for _ in range(workers)]
+    chapters = await approver()
+    await asyncio.gather(scraper_task, *rewriter_tasks)
+    def save_screenshot(chapter_num, screenshot):
+        return store_screenshot(chapter_key(chapter_num), wait_for_screenshot(screenshot))["screenshot"]
 
-        await browser.close()
-        return chapters
+    saved = [path for path in await asyncio.gather(*(asyncio.to_thread(save_screenshot, n, s) for n, s in screenshots)) if path]
+    if saved:
+        print(f"📸 Saved {len(saved)} screenshot(s) to the artifact store")
+    return chapters
 
 
 # === ENTRY POINT ===
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python main_ai.py <starting_url>")
-        sys.exit(1)
-
-    url = sys.argv[1]
-    print(f"🚀 Starting from: {url}")
-    chapters = asyncio.run(scrape_and_process(url))
-    if chapters:
-        save_pdf(chapters)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Crawl, rewrite and approve a whole book")
+    parser.add_argument("url", help="URL of the first chapter")
+    parser.add_argument("--workers", type=int, default=REWRITE_WORKERS, help="concurrent LLM rewrites")
+    parser.add_argument("--scrape-ahead", type=int, default=SCRAPE_AHEAD, help="chapters scraped ahead of the rewriters")
+    parser.add_argument("--approval", choices=["voice", "batch"], default="voice",
+                        help="voice: approve each chapter by voice; batch: approve everything non-interactively")
+    parser.add_argument("--score", type=int, default=3, choices=range(1, 6), help="feedback score used in batch mode")
+    parser.add_argument("--backend", choices=["auto", "http", "browser"], default=None,
+                        help="scrape backend (default: SCRAPE_BACKEND or auto)")
+    parser.add_argument("--screenshot-mode", choices=["off", "viewport", "full"], default=None,
+                        help="chapter screenshots (default: SCREENSHOT_MODE or full)")
+    parser.add_argument("--no-screenshots", action="store_true", help="same as --screenshot-mode off; no browser for static pages")
+    parser.add_argument("--browser", choices=["chromium", "firefox", "webkit"], default=os.getenv("BROWSER_TYPE", "webkit"),
+                        help="browser for browser-backend scraping (default: BROWSER_TYPE or webkit, as crawls always used)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="re-scrape every chapter from the start URL; unchanged chapters still skip the LLM")
+    parser.add_argument("--rebuild-pdf", action="store_true", help="only rebuild the PDF from the chapters stored in the manifest")
+    parser.add_argument("--pdf-workers", type=int, default=PDF_WORKERS, help="processes rendering chapter PDFs")
+    args = parser.parse_args()
+
+    configure_browser_pool(browser_type=args.browser)
+    manifest = CrawlManifest.for_book(args.url)
+    if not args.rebuild_pdf:
+        print(f"🚀 Starting from: {args.url} (manifest: {manifest.path})")
+        try:
+            asyncio.run(scrape_and_process(
+                args.url, workers=args.workers, scrape_ahead=args.scrape_ahead,
+                approval=args.approval, default_score=args.score,
+                backend=args.backend, screenshot_mode="off" if args.no_screenshots else args.screenshot_mode,
+                manifest=manifest, refresh=args.refresh
+            ))
+        finally:
+            shutdown_browser_pool()
+
+    # The book is rebuilt from every stored chapter, including those finished in earlier runs
+    book_title = manifest.path.stem.replace("_", " ")
+    pdf_cache = os.path.join("chapters", manifest.path.stem, "pdf")
+    if save_pdf(iter_book_chapters(manifest), title=book_title, workers=args.pdf_workers, cache_dir=pdf_cache):
         print("✅ PDF generation complete.")
@@ -0,0 +1,180 @@
+# scraping/browser_pool.py
+
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from playwright.sync_api import sync_playwright
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))
+BROWSER_TYPE = os.getenv("BROWSER_TYPE", "chromium")  # chromium, firefox or webkit
+
+_STOP = object()
+
+
+class _BrowserWorker(threading.Thread):
+    """
+    Owns one Playwright instance, browser, context and page.
+
+    Sync Playwright objects may only be used from the thread that created
+    them, so every task for this browser is executed on this thread.
+    """
+
+    def __init__(self, pool, index):
+        super().__init__(name=f"browser-worker-{index}", daemon=True)
+        self.pool = pool
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.uses = 0
+
+    def _launch(self):
+        if self.playwright is None:
+            self.playwright = sync_playwright().start()
+        launcher = getattr(self.playwright, self.pool.browser_type)
+        self.browser = launcher.launch(headless=self.pool.headless)
+        self.context = self.browser.new_context()
+        self.page = self.context.new_page()
+        self.uses = 0
+        self.pool._count("launches")
+
+    def _close_browser(self):
+        if self.browser is not None:
+            try:
+                self.browser.close()
+            except Exception:
+                pass  # Already gone (crashed or disconnected)
+        self.browser = self.context = self.page = None
+
+    def _ensure_page(self):
+        if self.browser is None or not self.browser.is_connected():
+            self._close_browser()
+            self._launch()
+        elif self.page is None or self.page.is_closed():
+            self.page = self.context.new_page()
+        return self.page
+
+    def run(self):
+        try:
+            self._launch()
+        except Exception as e:
+            print(f"⚠️ Browser warm-up failed, will retry on first task: {e}")
+            self._close_browser()
+        self.pool._ready.release()
+
+        while True:
+            task = self.pool._tasks.get()
+            if task is _STOP:
+                break
+            fn, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                page = self._ensure_page()
+                future.set_result(fn(page))
+            except Exception as e:
+                future.set_exception(e)
+                if self.browser is not None and not self.browser.is_connected():
+                    print("⚠️ Browser crashed, recycling it.")
+                    self.pool._count("crashes")
+                    self._close_browser()
+            finally:
+                self.uses += 1
+                if self.uses >= self.pool.max_uses:
+                    self.pool._count("recycles")
+                    self._close_browser()
+
+        self._close_browser()
+        if self.playwright is not None:
+            self.playwright.stop()
+
+
+class BrowserPool:
+    """
+    Long-lived pool of warm headless browsers.
+
+    `size` browsers run on their own threads, which also caps how many
+    pages are loaded at once. Each browser is recycled after `max_uses`
+    tasks or as soon as it crashes.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = MAX_USES, browser_type: str = BROWSER_TYPE, headless: bool = True):
+        self.size = size
+        self.max_uses = max_uses
+        self.browser_type = browser_type
+        self.headless = headless
+        self.stats = {"tasks": 0, "launches": 0, "recycles": 0, "crashes": 0}
+        self._stats_lock = threading.Lock()
+        self._tasks = queue.Queue()
+        self._ready = threading.Semaphore(0)
+        self._workers = []
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def start(self):
+        if self._workers:
+            return self
+        self._workers = [_BrowserWorker(self, i) for i in range(self.size)]
+        for worker in self._workers:
+            worker.start()
+        for _ in self._workers:
+            self._ready.acquire()
+        return self
+
+    def submit(self, fn) -> Future:
+        """Schedule `fn(page)` on the next free browser."""
+        if not self._workers:
+            self.start()
+        self._count("tasks")
+        future = Future()
+        self._tasks.put((fn, future))
+        return future
+
+    def run(self, fn, timeout: float = None):
+        return self.submit(fn).result(timeout=timeout)
+
+    async def arun(self, fn):
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def close(self):
+        for _ in self._workers:
+            self._tasks.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+
+# === Process-wide default pool ===
+_default_pool = None
+_default_options = {}
+_default_lock = threading.Lock()
+
+
+def configure_browser_pool(**options):
+    """Sets BrowserPool options (e.g. browser_type) for the process-wide pool; call it before the pool starts."""
+    with _default_lock:
+        if _default_pool is not None:
+            raise RuntimeError("The browser pool is already running")
+        _default_options.update(options)
+
+
+def get_browser_pool() -> BrowserPool:
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = BrowserPool(**_default_options).start()
+        return _default_pool
+
+
+def shutdown_browser_pool():
+    global _default_pool
+    with _default_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+            _default_pool = None
@@ -0,0 +1,197 @@
+# scraping/http_scraper.py
+"""
+Browser-free fast path for static MediaWiki/Wikisource pages: one pooled
+HTTP client plus a streaming stdlib HTML parser that pulls out the
+chapter text, title and "→" link, i.e. what read_chapter_page() reads
+from a rendered page.
+"""
+
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from urllib.parse import quote, unquote, urljoin, urlparse
+
+import httpx
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_HTTP_TIMEOUT", "20"))
+USER_AGENT = os.getenv("SCRAPE_USER_AGENT", "automated-book-workflow/1.0 (chapter scraper)")
+CONTENT_ID = "mw-content-text"
+NEXT_LINK_TEXT = "→"
+
+# Elements whose boundaries become line breaks, like innerText: paragraphs and headings get a blank line
+_PARAGRAPH_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "table", "ul", "ol", "dl"}
+_LINE_TAGS = {"div", "li", "tr", "dd", "dt", "section", "center", "caption", "hr"}
+_SKIP_TAGS = {"script", "style", "noscript", "template"}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_SPACE_RE = re.compile(r"\s+")
+
+
+class NeedsBrowser(Exception):
+    """The page has no server-rendered chapter text; it has to be rendered in Playwright."""
+
+
+class ChapterExtractor(HTMLParser):
+    """
+    Collects the text of the element with id `content_id` (the whole
+    document when None), the page <title> and the first link whose text
+    contains "→", in a single pass.
+    """
+
+    def __init__(self, content_id: str = CONTENT_ID):
+        super().__init__(convert_charrefs=True)
+        self.content_id = content_id
+        self.title = ""
+        self.next_href = None
+        self.found_content = content_id is None
+        self._parts = []
+        self._content_depth = 0 if content_id is None else None  # Open elements inside the content root
+        self._skip_depth = 0
+        self._in_title = False
+        self._link_href = None
+        self._link_text = []
+
+    def _inside(self) -> bool:
+        return self._content_depth is not None
+
+    def _break(self, lines: int):
+        if self._inside():
+            self._parts.append(lines)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag == "a" and self.next_href is None:
+            self._link_href, self._link_text = dict(attrs).get("href"), []
+
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        if self._inside():
+            if tag not in _VOID_TAGS:
+                self._content_depth += 1
+        elif self.content_id and dict(attrs).get("id") == self.content_id:
+            self.found_content = True
+            self._content_depth = 0
+
+        if tag == "br":
+            self._break(1)
+        elif tag in _PARAGRAPH_TAGS:
+            self._break(2)
+        elif tag in _LINE_TAGS:
+            self._break(1)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag == "a" and self._link_href is not None:
+            if NEXT_LINK_TEXT in "".join(self._link_text):
+                self.next_href = self._link_href
+            self._link_href = None
+        if tag in _SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+        if tag in _PARAGRAPH_TAGS:
+            self._break(2)
+        elif tag in _LINE_TAGS:
+            self._break(1)
+        if self._inside() and tag not in _VOID_TAGS:
+            if self._content_depth == 0 and self.content_id is not None:
+                self._content_depth = None  # Left the content root
+            else:
+                self._content_depth -= 1
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        if self._link_href is not None:
+            self._link_text.append(data)
+        if self._inside() and not self._skip_depth:
+            text = _SPACE_RE.sub(" ", data)
+            if text.strip() or (self._parts and isinstance(self._parts[-1], str)):
+                self._parts.append(text)
+
+    @property
+    def text(self) -> str:
+        out, pending = [], 0
+        for part in self._parts:
+            if isinstance(part, int):
+                pending = max(pending, part)
+                continue
+            if out and pending:
+                out.append("\n" * pending)
+            pending = 0
+            out.append(part)
+        return "\n".join(line.strip() for line in "".join(out).split("\n")).strip()
+
+
+def extract_chapter(html: str, url: str, title_suffix: str = "", content_id: str = CONTENT_ID) -> dict:
+    """Parses one chapter page into the same dict read_chapter_page() returns."""
+    extractor = ChapterExtractor(content_id)
+    extractor.feed(html)
+    extractor.close()
+    content = extractor.text
+    if not extractor.found_content or not content:
+        raise NeedsBrowser(f"No server-rendered #{content_id} text at {url}")
+    return {
+        "url": url,
+        "title": _SPACE_RE.sub(" ", extractor.title).strip().replace(title_suffix, ""),
+        "content": content,
+        "next_url": urljoin(url, extractor.next_href) if extractor.next_href else None,
+    }
+
+
+def parse_api_url(url: str):
+    """MediaWiki parse API URL for a /wiki/<Page> URL, or None for other URLs."""
+    parsed = urlparse(url)
+    if not parsed.path.startswith("/wiki/"):
+        return None
+    page = unquote(parsed.path[len("/wiki/"):])
+    return f"{parsed.scheme}://{parsed.netloc}/w/api.php?action=parse&format=json&formatversion=2&prop=text&redirects=1&page={quote(page)}"
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Shared keep-alive client for every HTTP scrape."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                timeout=HTTP_TIMEOUT_SECONDS,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+            )
+        return _client
+
+
+def fetch_chapter_page(url: str, title_suffix: str = "", client: httpx.Client = None) -> dict:
+    """
+    Fetches a chapter over plain HTTP. Falls back to the MediaWiki parse
+    API when the HTML has no content, and raises NeedsBrowser when neither
+    has the chapter text.
+    """
+    client = client or get_http_client()
+    response = client.get(url)
+    response.raise_for_status()
+    try:
+        return extract_chapter(response.text, url, title_suffix)
+    except NeedsBrowser:
+        api_url = parse_api_url(url)
+        if api_url is None:
+            raise
+
+    try:
+        api_response = client.get(api_url)
+        api_response.raise_for_status()
+        parsed = api_response.json()["parse"]
+    except (httpx.HTTPError, ValueError, KeyError) as e:
+        raise NeedsBrowser(f"No server-rendered text at {url} and the parse API failed: {e}")
+    chapter = extract_chapter(parsed["text"], url, content_id=None)
+    chapter["title"] = parsed.get("title", "")
+    return chapter
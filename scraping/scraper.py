@@ -1,29 +1,171 @@
 # scraping/scraper.py
 
-from playwright.sync_api import sync_playwright
+from concurrent.futures import Future
+from functools import partial
+from urllib.parse import urljoin
 import os
 
-def scrape_chapter(url: str, save_text_path: str, screenshot_path: str):
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)  # headless=True for production
-        page = browser.new_page()
-        page.goto(url, wait_until="networkidle")
+from scraping.browser_pool import get_browser_pool
+from scraping.http_scraper import NeedsBrowser, fetch_chapter_page
+from scraping.screenshots import capture_screenshot, resolve_settings
 
-        # Save screenshot
-        os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
-        page.screenshot(path=screenshot_path, full_page=True)
+CONTENT_SELECTOR = "div#mw-content-text"
+NEXT_LINK_SELECTOR = 'a:has-text("→")'
+TITLE_SUFFIX = " - Wikisource, the free online library"
 
-        # Get and save text (try multiple selectors for robustness)
-        content = page.locator("div#mw-content-text").inner_text()
-        if not content:
-            raise ValueError("❌ Could not find content on page. Check selector or structure.")
+# auto: text over plain HTTP unless the page needs JavaScript, browser only for screenshots; http / browser: force one backend
+BACKENDS = ("auto", "http", "browser")
+SCRAPE_BACKEND = os.getenv("SCRAPE_BACKEND", "auto").lower()
 
-        os.makedirs(os.path.dirname(save_text_path), exist_ok=True)
-        with open(save_text_path, "w", encoding="utf-8") as f:
-            f.write(content)
 
-        browser.close()
-        print(f"✅ Scraped and saved: {url}")
+def read_chapter_page(page, url: str, screenshot_path: str = None, wait_until: str = "networkidle",
+                      screenshot_mode: str = None, screenshot_format: str = None, screenshot_quality: int = None,
+                      on_text=None):
+    """
+    Loads a chapter in a (pooled) page and returns its title, text and next-chapter URL.
+    `on_text` receives the chapter before the screenshot is taken, so callers can
+    start on the text while the page is still being captured.
+    """
+    page.goto(url, wait_until=wait_until)
 
-        # ✅ Return paths so api.py can unpack them
-        return save_text_path, screenshot_path
+    content = page.locator(CONTENT_SELECTOR).inner_text()
+
+    next_url = None
+    next_link = page.query_selector(NEXT_LINK_SELECTOR)
+    if next_link:
+        href = next_link.get_attribute("href")
+        if href:
+            next_url = urljoin(url, href)
+
+    chapter = {
+        "url": url,
+        "title": page.title().replace(TITLE_SUFFIX, ""),
+        "content": content,
+        "next_url": next_url,
+        "screenshot": None,
+    }
+    if on_text is not None:
+        on_text(dict(chapter))
+    if screenshot_path:
+        chapter["screenshot"] = capture_screenshot(page, screenshot_path, screenshot_mode, screenshot_format, screenshot_quality)
+    return chapter
+
+
+def screenshot_page(page, url: str, screenshot_path: str, wait_until: str = "networkidle",
+                    screenshot_mode: str = None, screenshot_format: str = None, screenshot_quality: int = None):
+    """Loads a page only to screenshot it, for chapters whose text came over plain HTTP."""
+    page.goto(url, wait_until=wait_until)
+    return capture_screenshot(page, screenshot_path, screenshot_mode, screenshot_format, screenshot_quality)
+
+
+def _screenshot_of(task: Future) -> Future:
+    """A future for the screenshot path of a pooled read_chapter_page task."""
+    screenshot = Future()
+
+    def resolve(done):
+        if done.exception() is not None:
+            screenshot.set_exception(done.exception())
+        else:
+            screenshot.set_result(done.result()["screenshot"])
+
+    task.add_done_callback(resolve)
+    return screenshot
+
+
+def wait_for_screenshot(screenshot, timeout: float = None):
+    """Path of a possibly deferred screenshot, or None when it was skipped or failed."""
+    if isinstance(screenshot, Future):
+        try:
+            return screenshot.result(timeout=timeout)
+        except Exception as e:
+            print(f"⚠️ Screenshot failed: {e}")
+            return None
+    return screenshot
+
+
+def fetch_chapter(url: str, screenshot_path: str = None, backend: str = None, pool=None, wait_until: str = "networkidle",
+                  screenshot_mode: str = None, screenshot_format: str = None, screenshot_quality: int = None,
+                  defer_screenshot: bool = False):
+    """
+    Returns a chapter's title, text, next-chapter URL and screenshot from the
+    chosen backend. In auto mode the text comes over plain HTTP whenever the
+    page is server-rendered, and the browser is only used for the screenshot.
+
+    With `defer_screenshot`, the chapter is returned as soon as its text is
+    available and "screenshot" is a Future of the screenshot path.
+    """
+    backend = (backend or SCRAPE_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown scrape backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    screenshot_mode, screenshot_format, screenshot_quality = resolve_settings(screenshot_mode, screenshot_format, screenshot_quality)
+    if screenshot_mode == "off":
+        screenshot_path = None
+    if backend == "http" and screenshot_path:
+        print(f"⚠️ Screenshots need the browser backend; skipping {screenshot_path}")
+        screenshot_path = None
+    settings = {
+        "wait_until": wait_until,
+        "screenshot_mode": screenshot_mode,
+        "screenshot_format": screenshot_format,
+        "screenshot_quality": screenshot_quality,
+    }
+
+    chapter = None
+    if backend in ("http", "auto"):
+        try:
+            chapter = fetch_chapter_page(url, title_suffix=TITLE_SUFFIX)
+            chapter["screenshot"] = None
+        except NeedsBrowser as e:
+            if backend == "http":
+                raise
+            print(f"↩️ {e}; rendering in the browser")
+
+    if chapter is not None:
+        if screenshot_path:
+            task = (pool or get_browser_pool()).submit(partial(screenshot_page, url=url, screenshot_path=str(screenshot_path), **settings))
+            chapter["screenshot"] = task if defer_screenshot else task.result()
+        return chapter
+
+    pool = pool or get_browser_pool()
+    read = partial(read_chapter_page, url=url, screenshot_path=str(screenshot_path) if screenshot_path else None, **settings)
+    if not (defer_screenshot and screenshot_path):
+        return pool.run(read)
+
+    text_ready = Future()
+    task = pool.submit(partial(read, on_text=text_ready.set_result))
+
+    def forward_failure(done):
+        if done.exception() is not None and not text_ready.done():
+            text_ready.set_exception(done.exception())
+
+    task.add_done_callback(forward_failure)
+    chapter = text_ready.result()
+    chapter["screenshot"] = _screenshot_of(task)
+    return chapter
+
+
+def scrape_chapter(url: str, save_text_path: str, screenshot_path: str, pool=None, backend: str = None,
+                   screenshot_mode: str = None, screenshot_format: str = None, screenshot_quality: int = None,
+                   defer_screenshot: bool = False):
+    """
+    Saves a chapter's text and returns (text path, screenshot). The screenshot
+    is the saved path (its extension follows the format), None when skipped,
+    or a Future of the path with `defer_screenshot`.
+    """
+    chapter = fetch_chapter(
+        url, screenshot_path=screenshot_path, backend=backend, pool=pool, screenshot_mode=screenshot_mode,
+        screenshot_format=screenshot_format, screenshot_quality=screenshot_quality, defer_screenshot=defer_screenshot,
+    )
+
+    content = chapter["content"]
+    if not content:
+        raise ValueError("❌ Could not find content on page. Check selector or structure.")
+
+    os.makedirs(os.path.dirname(save_text_path), exist_ok=True)
+    with open(save_text_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    print(f"✅ Scraped and saved: {url}")
+
+    # ✅ Return paths so api.py can unpack them
+    return save_text_path, chapter["screenshot"]
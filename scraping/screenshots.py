@@ -0,0 +1,114 @@
+# scraping/screenshots.py
+"""
+Chapter screenshots: off, viewport-only or full-page captures, encoded as
+PNG, JPEG or WebP, plus a small JPEG thumbnail of the top of the page for
+the Streamlit and /view pages.
+"""
+
+import io
+import os
+from pathlib import Path
+
+from PIL import Image
+
+from utils.artifact_store import get_artifact_store
+
+MODES = ("off", "viewport", "full")
+FORMATS = ("jpeg", "webp", "png")
+EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+SCREENSHOT_MODE = os.getenv("SCREENSHOT_MODE", "full").lower()
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "jpeg").lower()
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "70"))
+THUMBNAIL_WIDTH = int(os.getenv("SCREENSHOT_THUMBNAIL_WIDTH", "320"))
+THUMBNAIL_MAX_HEIGHT = int(os.getenv("SCREENSHOT_THUMBNAIL_MAX_HEIGHT", "480"))
+THUMBNAIL_SUFFIX = "_thumb.jpg"
+
+
+def resolve_settings(mode: str = None, format: str = None, quality: int = None):
+    """Fills in the env defaults and validates one request's screenshot settings."""
+    mode = (mode or SCREENSHOT_MODE).lower()
+    format = (format or SCREENSHOT_FORMAT).lower()
+    if format == "jpg":
+        format = "jpeg"
+    if mode not in MODES:
+        raise ValueError(f"Unknown screenshot mode: {mode} (expected one of {', '.join(MODES)})")
+    if format not in FORMATS:
+        raise ValueError(f"Unknown screenshot format: {format} (expected one of {', '.join(FORMATS)})")
+    quality = SCREENSHOT_QUALITY if quality is None else quality
+    return mode, format, max(1, min(int(quality), 100))
+
+
+def screenshot_file(base_path, format: str = None) -> Path:
+    """`base_path` with the extension of the screenshot format (chapter_x -> chapter_x.jpg)."""
+    _, format, _ = resolve_settings(format=format)
+    base_path = Path(base_path)
+    if base_path.suffix.lower() in (*EXTENSIONS.values(), ".jpeg"):
+        base_path = base_path.with_suffix("")
+    return base_path.with_name(base_path.name + EXTENSIONS[format])
+
+
+def thumbnail_file(screenshot_path) -> Path:
+    screenshot_path = Path(screenshot_path)
+    return screenshot_path.with_name(screenshot_path.stem + THUMBNAIL_SUFFIX)
+
+
+def find_screenshot(directory, base_name: str):
+    """The (screenshot, thumbnail) saved for `base_name` in any format, as paths or None."""
+    for extension in EXTENSIONS.values():
+        path = Path(directory) / f"{base_name}{extension}"
+        if path.exists():
+            thumbnail = thumbnail_file(path)
+            return path, thumbnail if thumbnail.exists() else None
+    return None, None
+
+
+def save_thumbnail(image: Image.Image, path, quality: int = SCREENSHOT_QUALITY):
+    """Scales the page to THUMBNAIL_WIDTH and keeps its top THUMBNAIL_MAX_HEIGHT pixels."""
+    scale = THUMBNAIL_WIDTH / image.width
+    thumbnail = image.convert("RGB").resize((THUMBNAIL_WIDTH, max(1, round(image.height * scale))), Image.LANCZOS)
+    thumbnail = thumbnail.crop((0, 0, THUMBNAIL_WIDTH, min(thumbnail.height, THUMBNAIL_MAX_HEIGHT)))
+    thumbnail.save(path, "JPEG", quality=quality, optimize=True)
+    return path
+
+
+def capture_screenshot(page, path, mode: str = None, format: str = None, quality: int = None, thumbnail: bool = True):
+    """
+    Screenshots an already loaded page to `path` (its extension is replaced
+    to match the format) and writes the thumbnail next to it. Returns the
+    screenshot path, or None when the mode is "off".
+    """
+    mode, format, quality = resolve_settings(mode, format, quality)
+    if mode == "off":
+        return None
+    path = screenshot_file(path, format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Playwright encodes PNG and JPEG itself; WebP is re-encoded from a PNG capture
+    options = {"type": "jpeg", "quality": quality} if format == "jpeg" else {"type": "png"}
+    data = page.screenshot(full_page=mode == "full", **options)
+    image = None
+    if format == "webp":
+        image = Image.open(io.BytesIO(data))
+        image.save(path, "WEBP", quality=quality, method=4)
+    else:
+        path.write_bytes(data)
+
+    if thumbnail:
+        save_thumbnail(image or Image.open(io.BytesIO(data)), thumbnail_file(path), quality)
+    return str(path)
+
+
+def store_screenshot(chapter_id, path, store=None) -> dict:
+    """
+    Moves a captured screenshot and its thumbnail into the artifact store.
+    Returns their stored paths as {"screenshot", "thumbnail"} (None when absent).
+    """
+    store = store or get_artifact_store()
+    if not path:
+        return {"screenshot": None, "thumbnail": None}
+    thumbnail = thumbnail_file(path)
+    return {
+        "screenshot": str(store.put_file(chapter_id, "screenshot", path)),
+        "thumbnail": str(store.put_file(chapter_id, "thumbnail", thumbnail)) if thumbnail.exists() else None,
+    }
@@ -1,23 +1,65 @@
+import json
+import os
+
 from ai.embeddings import search_similar_chapters
+from ai.retrieval import normalize_filters, resolve_mode
+from ai.search_cache import get_search_cache, normalize_query
+from utils.metrics import SEARCH_REQUESTS
+
+# Ranks fetched and cached per query at once, so paging through them stays in the cache
+SEARCH_PAGE_DEPTH = int(os.getenv("SEARCH_PAGE_DEPTH", "20"))
+
+
+def _ranked_hits(query: str, depth: int, filters: dict, mode: str):
+    raw = search_similar_chapters(query, top_k=depth, filters=filters or None, mode=mode)
+    documents = raw.get("documents", [[]])[0]
+    distances = raw.get("distances", [[]])[0]
+    relevance = raw.get("scores", [[None] * len(documents)])[0]
+    hits = []
+    for doc, meta, distance, fused in zip(documents, raw.get("metadatas", [[]])[0], distances, relevance):
+        hits.append({
+            "chapter": meta.get("chapter", "N/A"),
+            "title": meta.get("title", "Untitled"),
+            "score": meta.get("score", 0),
+            "distance": None if distance is None else float(distance),
+            "relevance": fused,
+            "passage": meta.get("passage"),
+            "text": doc,
+        })
+    return hits
+
 
-def search_chapters(query: str):
+def search_passages(query: str, top_k: int = 3, offset: int = 0, filters: dict = None, mode: str = None):
     """
-    Perform semantic search and format results for frontend display.
+    One page of matching chapters, best first: (hits, next_offset, cached).
+    The first SEARCH_PAGE_DEPTH ranks (or more, for deeper pages) are cached
+    together for a short TTL, so repeated queries and their next pages skip
+    the model and Chroma; any index write expires them. `mode` and `filters`
+    are passed to ai.embeddings.search_similar_chapters.
     """
-    raw = search_similar_chapters(query)
+    mode = resolve_mode(mode)
+    filters = normalize_filters(filters)
+    depth = -(-(offset + top_k) // SEARCH_PAGE_DEPTH) * SEARCH_PAGE_DEPTH
+    key = (normalize_query(query), depth, mode, json.dumps(filters, sort_keys=True))
+    # One rank past the depth tells whether a page ending on the boundary has a next page
+    ranked, cached = get_search_cache().get_or_compute(key, lambda: _ranked_hits(query, depth + 1, filters, mode))
+    SEARCH_REQUESTS.inc(cached=str(cached).lower())
+    next_offset = offset + top_k if len(ranked) > offset + top_k else None
+    return ranked[offset:offset + top_k], next_offset, cached
 
-    # Check if results are valid
-    documents = raw.get("documents", [[]])[0]
-    metadatas = raw.get("metadatas", [[]])[0]
+
+def search_chapters(query: str, top_k: int = 3, offset: int = 0, filters: dict = None, mode: str = None):
+    """
+    Perform semantic search and format results for frontend display.
+    """
+    hits, _, _ = search_passages(query, top_k=top_k, offset=offset, filters=filters, mode=mode)
 
     # Format combined output
     results = []
-    for doc, meta in zip(documents, metadatas):
-        chapter = meta.get("chapter", "N/A")
-        title = meta.get("title", "Untitled")
-        score = meta.get("score", 0)
+    for hit in hits:
+        doc = hit["text"]
         snippet = doc[:400] + "..." if len(doc) > 400 else doc
-        result_text = f"📘 Chapter {chapter}: {title}\n🔍 Score: {score:.2f}\n\n{snippet}"
+        result_text = f"📘 Chapter {hit['chapter']}: {hit['title']}\n🔍 Score: {hit['score']:.2f}\n\n{snippet}"
         results.append(result_text)
 
     return results
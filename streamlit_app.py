@@ -2,51 +2,64 @@
 
 import streamlit as st
 import requests
+import json
 import os
+import time
 from pathlib import Path
 
+from ai.narration import audio_mime
+from utils.artifact_store import get_artifact_store
+
 BASE_API = "http://localhost:8000"
+JOB_POLL_SECONDS = 2
 
 st.set_page_config(page_title="📘 AI-Powered Book Chapter Processor", layout="wide")
 st.title("📚 Automated Book Workflow")
 
+# === Helper to Show the Scrape Screenshot ===
+def show_screenshot(data, caption):
+    """Shows the small thumbnail rather than the full-page capture, which can be megabytes."""
+    image = data.get("thumbnail") or data.get("screenshot")
+    if image and os.path.exists(image):
+        st.image(image, caption=caption)
+        if data.get("screenshot"):
+            st.caption(f"Full screenshot: {data['screenshot']}")
+
 # === Helper to Show All Outputs (Auto Mode) ===
-def show_output(data, chapter_id):
-    final_file = Path(data["final_text_file"])
-    base_path = final_file.with_name(final_file.stem.replace("_final", ""))
-    pdf_file = data["pdf_file"]
-    audio_file = data["audio_file"]
-    screenshot = data.get("screenshot")
+def show_output(chapter_id):
+    """Every stored output of the chapter, looked up in its artifact manifest."""
+    store = get_artifact_store()
+    pdf_file = store.path(chapter_id, "pdf")
+    audio_file = store.path(chapter_id, "audio")
 
     # Display Screenshot
-    if screenshot and os.path.exists(screenshot):
-        st.image(screenshot, caption="Chapter Screenshot", use_column_width=True)
+    show_screenshot({name: store.path(chapter_id, name) for name in ("screenshot", "thumbnail")}, "Chapter Screenshot")
 
     # Display All Text Versions
     file_map = {
-        "📝 Original": str(base_path) + ".txt",
-        "✍️ Rewritten": str(base_path) + "_rewritten.txt",
-        "🔍 Reviewed": str(base_path) + "_reviewed.txt",
-        "✅ Final": str(base_path) + "_final.txt"
+        "📝 Original": "raw_text",
+        "✍️ Rewritten": "rewritten_text",
+        "🔍 Reviewed": "reviewed_text",
+        "✅ Final": "final_text"
     }
 
     st.subheader("📄 Text Versions")
-    for label, path in file_map.items():
+    for label, stage in file_map.items():
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                st.markdown(f"**{label}**")
-                st.text_area(label, f.read(), height=300, key=label)
-        except FileNotFoundError:
-            st.error(f"{label} file not found: {path}")
+            text = store.read_text(chapter_id, stage)
+            st.markdown(f"**{label}**")
+            st.text_area(label, text, height=300, key=label)
+        except FileNotFoundError as e:
+            st.error(f"{label} file not found: {e}")
 
     # PDF Preview & Download
-    if os.path.exists(pdf_file):
+    if pdf_file:
         st.subheader("📕 PDF Preview & Download")
         with open(pdf_file, "rb") as f:
             st.download_button(
                 label="📥 Download PDF",
                 data=f,
-                file_name=os.path.basename(pdf_file),
+                file_name=f"chapter_{chapter_id}_final.pdf",
                 mime="application/pdf"
             )
         st.components.v1.html(
@@ -55,23 +68,55 @@ def show_output(data, chapter_id):
         )
 
     # Audio Playback
-    if os.path.exists(audio_file):
+    if audio_file:
         st.subheader("🔊 Audio Narration")
-        st.audio(audio_file, format="audio/mp3")
+        mime = audio_mime(audio_file)
+        st.audio(str(audio_file), format=mime)
         with open(audio_file, "rb") as f:
             st.download_button(
-                label="📥 Download MP3",
+                label="📥 Download Audio",
                 data=f,
-                file_name=os.path.basename(audio_file),
-                mime="audio/mpeg"
+                file_name=f"chapter_{chapter_id}{audio_file.suffix}",
+                mime=mime
             )
 
+# === Helper to Render a Streamed Rewrite (SSE) ===
+def read_rewrite_stream(response):
+    """Shows the draft as tokens arrive; returns the same fields as /agentic/rewrite/."""
+    status = st.empty()
+    draft = st.empty()
+    text = ""
+    event = "message"
+    result = {}
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            payload = json.loads(line[len("data:"):].strip())
+            if event == "status":
+                status.info(f"⏳ {payload['stage']}...")
+                result.update(payload)
+            elif event == "token":
+                text += payload["text"]
+                draft.markdown(text)
+            elif event == "done":
+                result.update(payload)
+            elif event == "error":
+                raise RuntimeError(payload["detail"])
+        elif not line:
+            event = "message"
+    status.empty()
+    draft.empty()
+    result["rewritten_text"] = text
+    return result
+
 # === UI Logic ===
 mode = st.radio("Choose Mode:", ["🔁 Fully Agentic (Auto)", "👤 Human-in-the-loop (Manual Review)"])
 
 with st.form("chapter_form"):
     url = st.text_input("Enter Chapter URL (e.g., Wikisource):")
     feedback_score = st.slider("Rate the last output (feedback)", 1, 5, 5)
+    screenshot_mode = st.selectbox("Screenshot", ["full", "viewport", "off"], help="Full page, visible area only, or none")
     submitted = st.form_submit_button("🚀 Start Processing")
 
 # ========== FULLY AUTOMATED MODE ==========
@@ -79,20 +124,31 @@ if submitted and mode == "🔁 Fully Agentic (Auto)":
     if not url:
         st.warning("⚠️ Please enter a valid URL.")
     else:
-        with st.spinner("🤖 Running full agentic pipeline..."):
-            try:
-                response = requests.post(f"{BASE_API}/process-agentic/", json={
-                    "url": url,
-                    "feedback_score": feedback_score
-                })
-                if response.status_code == 200:
-                    data = response.json()
-                    chapter_id = data["chapter_id"]
-                    show_output(data, chapter_id)
+        try:
+            response = requests.post(f"{BASE_API}/process-agentic/", json={
+                "url": url,
+                "feedback_score": feedback_score,
+                "screenshot_mode": screenshot_mode
+            })
+            if response.status_code in (200, 202):
+                job = response.json()
+                status_box = st.empty()
+                with st.spinner(f"🤖 Running full agentic pipeline (job {job['job_id']})..."):
+                    while job["status"] in ("queued", "running"):
+                        stages = ", ".join(f"{name}: {info.get('status')}" for name, info in job["stages"].items())
+                        status_box.info(f"⏳ {job['status']} — {stages or 'waiting for a worker'}")
+                        time.sleep(JOB_POLL_SECONDS)
+                        job = requests.get(f"{BASE_API}{job['status_url']}").json()
+                status_box.empty()
+
+                if job["status"] == "succeeded":
+                    show_output(job["chapter_id"])
                 else:
-                    st.error(f"❌ API error: {response.status_code}")
-            except Exception as e:
-                st.exception(e)
+                    st.error(f"❌ Job {job['job_id']} failed: {job['error']}")
+            else:
+                st.error(f"❌ API error: {response.status_code}")
+        except Exception as e:
+            st.exception(e)
 
 # ========== HUMAN-IN-THE-LOOP MODE ==========
 elif submitted and mode == "👤 Human-in-the-loop (Manual Review)":
@@ -101,17 +157,15 @@ elif submitted and mode == "👤 Human-in-the-loop (Manual Review)":
     else:
         with st.spinner("📥 Scraping & Rewriting..."):
             try:
-                response = requests.post(f"{BASE_API}/agentic/rewrite/", json={"url": url})
+                response = requests.post(f"{BASE_API}/agentic/rewrite/stream", json={"url": url, "screenshot_mode": screenshot_mode}, stream=True)
                 if response.status_code == 200:
-                    result = response.json()
+                    result = read_rewrite_stream(response)
                     chapter_id = result["chapter_id"]
                     rewritten_text = result["rewritten_text"]
-                    screenshot = result.get("screenshot")
 
                     st.success("✅ Rewriting complete! Please edit and approve below:")
 
-                    if screenshot and os.path.exists(screenshot):
-                        st.image(screenshot, caption="Screenshot during scrape", use_column_width=True)
+                    show_screenshot(result, "Screenshot during scrape")
 
                     edited_text = st.text_area("✍️ Edit Rewritten Text", rewritten_text, height=500)
                     approve_btn = st.button("✅ Approve & Finalize")
@@ -133,7 +187,7 @@ elif submitted and mode == "👤 Human-in-the-loop (Manual Review)":
                                 if pdf_file and os.path.exists(pdf_file):
                                     st.subheader("📕 Final PDF")
                                     with open(pdf_file, "rb") as f:
-                                        st.download_button("📥 Download PDF", f, file_name=os.path.basename(pdf_file))
+                                        st.download_button("📥 Download PDF", f, file_name=f"chapter_{chapter_id}_final.pdf")
                                         st.components.v1.html(
                                             f"""<iframe src="file://{os.path.abspath(pdf_file)}" width="100%" height="600"></iframe>""",
                                             height=600,
@@ -141,9 +195,9 @@ elif submitted and mode == "👤 Human-in-the-loop (Manual Review)":
 
                                 if audio_file and os.path.exists(audio_file):
                                     st.subheader("🔊 Audio Narration")
-                                    st.audio(audio_file)
+                                    st.audio(audio_file, format=audio_mime(audio_file))
                                     with open(audio_file, "rb") as f:
-                                        st.download_button("📥 Download MP3", f, file_name=os.path.basename(audio_file))
+                                        st.download_button("📥 Download Audio", f, file_name=f"chapter_{chapter_id}{Path(audio_file).suffix}")
                             else:
                                 st.error(f"❌ Approval failed: {approval.text}")
                 else:
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+from utils.artifact_store import ArtifactStore
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_identical_outputs_share_one_blob(tmp_path):
+    store = ArtifactStore(tmp_path)
+    staged = store.staging_path("final.pdf")
+    staged.write_bytes(b"%PDF-1.3 same")
+    pdf = store.put_file("a1", "pdf", staged)
+    assert not staged.exists() and pdf.suffix == ".pdf"
+    assert store.put_text("a1", "final_text", "Text") == store.put_text("b2", "final_text", "Text")
+    assert store.put_bytes("b2", "pdf", b"%PDF-1.3 same", ".pdf") == pdf
+
+    manifest = store.manifest("a1")
+    assert set(manifest["stages"]) == {"pdf", "final_text"}
+    assert manifest["stages"]["pdf"]["size"] == len(b"%PDF-1.3 same")
+    assert store.read_text("b2", "final_text") == "Text"
+    assert store.urls("a1")["pdf"] == f"/artifacts/{pdf.parent.name}/{pdf.name}"
+    assert store.manifest("missing") is None and store.path("a1", "audio") is None
+
+    # Ids with slashes (book/chapterN) map to one flat, sharded manifest file
+    store.put_text("Book_1/chapter3", "raw_text", "Raw")
+    assert store.manifest_path("Book_1/chapter3").parent.parent == store.manifest_dir
+
+
+def test_restoring_a_stage_keeps_created_at_unless_the_content_changed(tmp_path):
+    store = ArtifactStore(tmp_path)
+    store.put_text("c", "final_text", "v1")
+    first = store.manifest("c")["stages"]["final_text"]
+    store.put_text("c", "final_text", "v1")
+    assert store.manifest("c")["stages"]["final_text"]["created_at"] == first["created_at"]
+    store.put_text("c", "final_text", "v2")
+    assert store.manifest("c")["stages"]["final_text"]["blob"] != first["blob"]
+
+
+def test_gc_removes_unreferenced_blobs_and_evicts_chapters_only_when_asked(tmp_path):
+    store = ArtifactStore(tmp_path)
+    old_text = store.put_text("old", "final_text", "x" * 100)
+    store.put_text("old", "final_text", "y" * 100)  # The first version is no longer referenced
+    shared = store.put_text("old", "raw_text", "shared" * 10)
+    store.put_text("new", "raw_text", "shared" * 10)
+    store.put_text("new", "final_text", "z" * 100)
+
+    age(old_text, 7200)
+    stats = store.gc(grace_seconds=3600)
+    assert not old_text.exists() and stats["removed_blobs"] == 1 and stats["evicted_chapters"] == 0
+
+    # Texts can't be regenerated: over the quota they stay unless eviction is asked for
+    manifest = store.manifest_path("old")
+    store.put_text("new", "final_text", "z" * 100)
+    stats = store.gc(quota_bytes=200, grace_seconds=3600)
+    assert stats["evicted_chapters"] == 0 and stats["bytes"] == 260 and manifest.exists()
+
+    # With it, the least recently updated chapter goes; its shared blob stays
+    stats = store.gc(quota_bytes=200, grace_seconds=3600, evict=True)
+    assert stats["evicted_chapters"] == 1 and not manifest.exists()
+    assert shared.exists() and store.path("new", "raw_text") == shared
+    assert stats["bytes"] == 160 and stats["blobs"] == 2
+
+
+def test_gc_over_quota_drops_regenerable_outputs_first(tmp_path):
+    store = ArtifactStore(tmp_path)
+    store.put_bytes("old", "pdf", b"%PDF" * 50, ".pdf")
+    shared_audio = store.put_bytes("old", "audio", b"ID3" * 10, ".mp3")
+    store.put_text("old", "final_text", "approved " * 10)
+    store.put_bytes("new", "pdf", b"%PDF new" * 10, ".pdf")
+    store.put_bytes("new", "audio", b"ID3" * 10, ".mp3")
+
+    assert store.gc(quota_bytes=200, dry_run=True)["dropped_stages"] == 2 and store.path("old", "pdf")
+    stats = store.gc(quota_bytes=200)
+    # The oldest chapter's PDF and narration go; its approved text and the newer chapter stay
+    assert stats["dropped_stages"] == 2 and stats["evicted_chapters"] == 0 and stats["bytes"] <= 200
+    assert set(store.manifest("old")["stages"]) == {"final_text"}
+    assert store.read_text("old", "final_text").startswith("approved")
+    assert shared_audio.exists() and store.path("new", "audio") == shared_audio and store.path("new", "pdf")
+
+
+def test_concurrent_writers_of_one_manifest_keep_every_stage(tmp_path):
+    # Separate instances share no thread lock, like the API and main_ai in two processes
+    stores = [ArtifactStore(tmp_path) for _ in range(4)]
+    threads = [
+        threading.Thread(target=lambda s=s, n=n: [s.put_text("shared", f"stage{n}_{i}", f"{n}/{i}") for i in range(10)])
+        for n, s in enumerate(stores)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(stores[0].manifest("shared")["stages"]) == 40
@@ -0,0 +1,107 @@
+import pytest
+
+from scraping import browser_pool
+from scraping.browser_pool import BrowserPool
+
+
+class FakeBrowser:
+    def __init__(self, launched):
+        self.connected = True
+        self.closed = False
+        launched.append(self)
+
+    def is_connected(self):
+        return self.connected
+
+    def new_context(self):
+        return self
+
+    def new_page(self):
+        return FakePage(self)
+
+    def close(self):
+        self.closed = True
+        self.connected = False
+
+
+class FakePage:
+    def __init__(self, browser):
+        self.browser = browser
+
+    def is_closed(self):
+        return False
+
+
+class FakePlaywright:
+    """sync_playwright() stand-in: every launcher records the browsers it starts, by type."""
+
+    def __init__(self):
+        self.launched = {"chromium": [], "firefox": [], "webkit": []}
+
+    def __call__(self):
+        return self
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def __getattr__(self, name):
+        if name not in self.launched:
+            raise AttributeError(name)
+        launched = self.launched[name]
+
+        class Launcher:
+            @staticmethod
+            def launch(headless=True):
+                return FakeBrowser(launched)
+        return Launcher
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+    fake = FakePlaywright()
+    monkeypatch.setattr(browser_pool, "sync_playwright", fake)
+    return fake
+
+
+def test_browser_is_recycled_after_max_uses(playwright):
+    pool = BrowserPool(size=1, max_uses=2, browser_type="webkit").start()
+    try:
+        browsers = [pool.run(lambda page: page.browser, timeout=5) for _ in range(5)]
+    finally:
+        pool.close()
+    launched = playwright.launched["webkit"]
+    assert browsers == [launched[0], launched[0], launched[1], launched[1], launched[2]]
+    assert all(b.closed for b in launched) and playwright.launched["chromium"] == []
+    assert pool.stats == {"tasks": 5, "launches": 3, "recycles": 2, "crashes": 0}
+
+
+def test_pool_recovers_from_a_crashed_browser(playwright):
+    pool = BrowserPool(size=1, max_uses=50).start()
+
+    def crash(page):
+        page.browser.connected = False
+        raise RuntimeError("Target page, context or browser has been closed")
+
+    try:
+        first = pool.run(lambda page: page.browser, timeout=5)
+        with pytest.raises(RuntimeError):
+            pool.run(crash, timeout=5)
+        second = pool.run(lambda page: page.browser, timeout=5)
+    finally:
+        pool.close()
+    assert second is not first and first.closed
+    assert pool.stats["crashes"] == 1 and pool.stats["launches"] == 2
+
+
+def test_default_pool_uses_the_configured_browser(playwright, monkeypatch):
+    monkeypatch.setattr(browser_pool, "_default_options", {})
+    browser_pool.configure_browser_pool(browser_type="webkit", size=1)
+    try:
+        assert browser_pool.get_browser_pool().run(lambda page: page.browser, timeout=5) is playwright.launched["webkit"][0]
+        with pytest.raises(RuntimeError):
+            browser_pool.configure_browser_pool(browser_type="chromium")
+    finally:
+        browser_pool.shutdown_browser_pool()
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from utils.chunking import estimate_tokens, join_passages, map_segments, split_passages, split_segments, stream_segments
+
+
+def test_passages_are_token_bounded_and_overlap():
+    text = " ".join(f"w{i}" for i in range(500))
+    passages = split_passages(text, max_tokens=100, overlap=20)
+
+    assert all(len(p["text"].split()) <= 100 for p in passages)
+    assert passages[0]["text"].split()[-20:] == passages[1]["text"].split()[:20]
+    assert passages[-1]["text"].split()[-1] == "w499"
+
+
+def test_passages_stitch_back_to_original():
+    text = "The keeper climbed the stair.\nThe lamp burned all night.  " * 80
+    passages = split_passages(text, max_tokens=50, overlap=10)
+
+    assert all(text[p["start"]:p["end"]] == p["text"] for p in passages)
+    assert join_passages(passages) == text.strip()
+
+
+def test_short_and_empty_text():
+    assert split_passages("") == []
+    assert [p["text"] for p in split_passages("one short line")] == ["one short line"]
+
+
+def test_segments_keep_paragraphs_within_budget():
+    paragraphs = [f"Paragraph {i}. " + "The lamp burned all night. " * 20 for i in range(12)]
+    segments = split_segments("\n\n".join(paragraphs), max_tokens=400)
+
+    assert len(segments) > 1
+    assert all(estimate_tokens(s) <= 400 for s in segments)
+    assert [p for s in segments for p in s.split("\n\n")] == [p.strip() for p in paragraphs]
+
+
+def test_oversized_paragraph_splits_at_sentences():
+    paragraph = "The keeper climbed the stair. " * 200
+    segments = split_segments(paragraph, max_tokens=100)
+
+    assert all(estimate_tokens(s) <= 100 for s in segments)
+    assert all(s.endswith("stair.") for s in segments)
+
+
+def test_map_segments_is_ordered_and_concurrent():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 100 for i in range(8))
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fn(segment, context):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return segment.upper()
+
+    result = map_segments(fn, text, max_tokens=150, concurrency=4)
+
+    assert result == "\n\n".join(s.upper() for s in split_segments(text, max_tokens=150))
+    assert peak[0] > 1
+
+
+def test_stream_segments_yields_in_order():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 100 for i in range(4))
+
+    def stream_fn(segment, context):
+        time.sleep(0.05 if segment.startswith("Paragraph 0") else 0)
+        yield segment.split(".")[0]
+        yield "|"
+
+    assert "".join(stream_segments(stream_fn, text, max_tokens=150)) == "\n\n".join(
+        f"Paragraph {i}|" for i in range(4)
+    )
+
+
+def test_single_segment_text_passes_through_unchanged():
+    text = "  Chapter One\nThe keeper woke.\nThe lamp was out.\n\n"
+    assert split_segments(text) == [text]
+    prompts = []
+    map_segments(lambda segment, context: prompts.append(segment) or segment, text)
+    assert prompts == [text]  # Same prompt as before segmenting, so cached completions still hit
+
+
+def test_closing_stream_segments_stops_producers_without_waiting():
+    text = "\n\n".join(f"Paragraph {i}. " + "word " * 100 for i in range(6))
+    started, closed = [], []
+
+    def stream_fn(segment, context):
+        started.append(segment.split(".")[0])
+        try:
+            for _ in range(1000):
+                time.sleep(0.01)
+                yield "x"
+        finally:
+            closed.append(segment.split(".")[0])
+
+    stream = stream_segments(stream_fn, text, max_tokens=150, concurrency=2)
+    assert next(stream) == "x"
+    begun = time.monotonic()
+    stream.close()  # What Starlette does when the SSE client disconnects
+    assert time.monotonic() - begun < 1  # Not the ~10 s the two running streams would take to finish
+
+    deadline = time.monotonic() + 2
+    while len(closed) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    # Both running LLM streams were closed and the four queued segments never started
+    assert sorted(closed) == sorted(started) == ["Paragraph 0", "Paragraph 1"]
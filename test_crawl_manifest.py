@@ -0,0 +1,52 @@
+import json
+
+from utils.crawl_manifest import CrawlManifest, book_key
+
+
+def crawl(manifest, tmp_path, chapters, stages=("rewrite", "approve", "embed")):
+    """Records fully processed chapters: (url, text, next_url) tuples."""
+    for num, (url, text, next_url) in enumerate(chapters, 1):
+        raw = tmp_path / f"chapter{num}.txt"
+        raw.write_text(text, encoding="utf-8")
+        manifest.record_scrape(num, url, f"Chapter {num}", text, next_url, raw)
+        for stage in stages:
+            manifest.complete(num, stage, {"final_text": raw} if stage == "approve" else None, decision="a", feedback_score=4)
+
+
+def test_book_key_and_persistence(tmp_path):
+    assert book_key("https://en.wikisource.org/wiki/The_Gates_of_Morning/Book_1/Chapter_1") == "The_Gates_of_Morning_Book_1"
+
+    manifest = CrawlManifest.for_book("https://w.test/wiki/Book/Chapter_1", tmp_path)
+    crawl(manifest, tmp_path, [("https://w.test/wiki/Book/Chapter_1", "one", None)])
+
+    reloaded = CrawlManifest(tmp_path / "Book.json")
+    assert reloaded.is_complete(1)
+    assert json.loads((tmp_path / "Book.json").read_text())["chapters"]["1"]["next_url"] is None
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_resume_point_is_first_incomplete_chapter(tmp_path):
+    urls = [f"https://w.test/wiki/Book/Chapter_{n}" for n in (1, 2, 3)]
+    manifest = CrawlManifest.for_book(urls[0], tmp_path)
+    assert manifest.resume_point() == (1, urls[0])
+
+    crawl(manifest, tmp_path, [(urls[0], "one", urls[1]), (urls[1], "two", urls[2])])
+    assert manifest.resume_point() == (2, urls[1])  # Complete book: re-check the last chapter for a new link
+
+    manifest.record_scrape(3, urls[2], "Chapter 3", "three", None, tmp_path / "chapter1.txt")
+    assert manifest.resume_point() == (3, urls[2])
+
+    (tmp_path / "chapter1.txt").unlink()  # A missing artifact makes its stage incomplete again
+    assert manifest.resume_point() == (1, urls[0])
+
+
+def test_changed_content_resets_later_stages(tmp_path):
+    url = "https://w.test/wiki/Book/Chapter_1"
+    manifest = CrawlManifest.for_book(url, tmp_path)
+    crawl(manifest, tmp_path, [(url, "one", None)])
+
+    assert manifest.record_scrape(1, url, "Chapter 1", "one", None, tmp_path / "chapter1.txt") is False
+    assert manifest.completed(1, "rewrite")
+    assert manifest.record_scrape(1, url, "Chapter 1", "one, revised", None, tmp_path / "chapter1.txt") is True
+    assert not manifest.completed(1, "rewrite") and manifest.completed(1, "scrape")
+    assert manifest.approved_chapters() == []
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+from ai.embedding_engines import OnnxEngine, default_onnx_file, parity_report, resolve_engine
+from utils.chunking import split_passages
+
+VOCAB = {"[PAD]": 0, "[UNK]": 1, "lantern": 2, "keeper": 3, "storm": 4, "reef": 5}
+
+
+class OneHotSession:
+    """Stands in for an ONNX Runtime session: each token's hidden state is its one-hot id."""
+
+    def __init__(self, inputs=("input_ids", "attention_mask", "token_type_ids")):
+        self.inputs = inputs
+        self.batches = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name=name) for name in self.inputs]
+
+    def run(self, outputs, feeds):
+        assert set(feeds) == set(self.inputs)
+        self.batches.append(feeds["input_ids"].shape)
+        return [np.eye(len(VOCAB), dtype=np.float32)[feeds["input_ids"]]]
+
+
+def word_tokenizer():
+    tokenizer = Tokenizer(WordLevel(VOCAB, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    return tokenizer
+
+
+def test_onnx_engine_pools_batches_and_keeps_order():
+    session = OneHotSession(inputs=("input_ids", "attention_mask"))
+    engine = OnnxEngine(session=session, tokenizer=word_tokenizer())
+    vectors = engine.encode(["storm storm reef", "lantern", "keeper lantern"], batch_size=2)
+
+    # Masked mean of one-hot tokens, normalized; padding never counts
+    expected = np.zeros((3, len(VOCAB)), dtype=np.float32)
+    expected[0, [4, 5]] = [2, 1]
+    expected[1, 2] = 1
+    expected[2, [2, 3]] = 1
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert np.allclose(vectors, expected)
+    assert session.batches == [(2, 2), (1, 3)]  # Sorted by length, so the short texts share a batch
+    assert np.allclose(engine.encode("lantern"), expected[1])
+    assert engine.name == "onnx:all-MiniLM-L6-v2:model_quint8_avx2"
+
+
+def test_onnx_tokenizer_splits_long_chapters_untruncated():
+    engine = OnnxEngine(session=OneHotSession(), tokenizer=word_tokenizer())
+    text = " ".join(["lantern keeper storm reef"] * 200)
+    passages = split_passages(text, max_tokens=200, overlap=40, tokenizer=engine.tokenizer)
+    assert passages[-1]["end"] == len(text)
+    assert len(engine._batch_tokenizer.encode(text).ids) == 256
+
+
+def test_parity_report_and_engine_names():
+    reference = np.array([[1.0, 0.0], [0.0, 1.0]])
+    assert parity_report(reference, reference * 3)["ok"]
+    report = parity_report(reference, [[1.0, 0.1], [1.0, 1.0]], threshold=0.98)
+    assert not report["ok"] and report["min_cosine"] == pytest.approx(0.7071, abs=1e-4)
+    assert resolve_engine("ONNX") == "onnx"
+    with pytest.raises(ValueError):
+        resolve_engine("tensorflow")
+
+
+def test_onnx_file_matches_the_cpu():
+    assert default_onnx_file("arm64") == default_onnx_file("aarch64") == "onnx/model_qint8_arm64.onnx"
+    assert default_onnx_file("x86_64") == default_onnx_file("AMD64") == "onnx/model_quint8_avx2.onnx"
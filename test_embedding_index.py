@@ -0,0 +1,149 @@
+import hashlib
+import importlib
+
+import chromadb
+import numpy as np
+import pytest
+
+from ai import embedding_engines
+from ai.lexical_index import LexicalIndex
+
+
+class CountingEngine:
+    """Stands in for MiniLM: a fixed vector per text, whitespace tokens, and a log of what was encoded."""
+
+    name = "fake:engine"
+    tokenizer = None
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=64):
+        self.encoded.extend(texts)
+        vectors = np.array([np.frombuffer(hashlib.sha256(t.encode("utf-8")).digest()[:8], dtype=np.uint8) for t in texts],
+                           dtype=np.float32) + 1
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """ai.embedding_index over a throwaway Chroma collection and BM25 index, with 10-token passages."""
+    monkeypatch.setattr(embedding_engines, "_engine", CountingEngine())
+    monkeypatch.setenv("CHROMA_DIR", str(tmp_path / "chroma_import"))
+    monkeypatch.setenv("LEXICAL_INDEX_PATH", str(tmp_path / "lexical_import.db"))
+    monkeypatch.chdir(tmp_path)  # ai.lexical_index may already be imported with the default relative path
+    module = importlib.import_module("ai.embedding_index")
+    monkeypatch.setattr(module, "model", CountingEngine())
+    monkeypatch.setattr(module, "collection", chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_or_create_collection("chapters"))
+    monkeypatch.setattr(module, "lexical", LexicalIndex(str(tmp_path / "lexical.db")))
+    monkeypatch.setattr(module, "bump_index_generation", lambda: None)
+    monkeypatch.setattr(module, "PASSAGE_TOKENS", 10)
+    monkeypatch.setattr(module, "PASSAGE_OVERLAP", 2)
+    return module
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def chapter(num, content, score=3, title=None):
+    return {"chapter_num": num, "title": title or f"Chapter {num}", "content": content, "feedback_score": score}
+
+
+def test_lexical_index_is_backfilled_before_the_first_write(index):
+    # Chapters indexed before BM25 existed live only in Chroma
+    index.collection.add(ids=["chapter1", "chapter2#p0"], documents=["Captain Quenby sailed", "The lighthouse keeper"],
+                         embeddings=index.model.encode(["a", "b"]).tolist(),
+                         metadatas=[{"chapter": 1, "title": "Old", "score": 4}, {"chapter": 2, "title": "Older", "score": 2, "doc_id": "chapter2"}])
+    assert not index.lexical.synced()
+
+    index.store_chapters_bulk([chapter(3, "A storm on the reef")])
+    assert index.lexical.synced() and index.lexical.count() == 3
+    assert [hit[2]["doc_id"] for hit in index.lexical.search("quenby keeper", 5)] == ["chapter1", "chapter2"]
+    hits = index.search_similar_chapters("Quenby", top_k=3, mode="lexical")
+    assert hits["ids"][0] == ["chapter1"]
+
+    # The marker persists, so a restarted process never rebuilds again
+    reopened = LexicalIndex(index.lexical.path)
+    assert reopened.synced()
+    index.collection.add(ids=["chapter9"], documents=["Only in Chroma"], embeddings=index.model.encode(["c"]).tolist())
+    assert index.sync_lexical_index() == 0 and index.lexical.count() == 3
+
+
+def stored(index, doc_id):
+    got = index.collection.get(where={"doc_id": doc_id}, include=["documents", "metadatas"])
+    return sorted(zip(got["ids"], got["documents"], got["metadatas"]), key=lambda p: p[2]["passage"])
+
+
+def test_unchanged_and_rescored_chapters_encode_nothing(index):
+    text = words("w", 30)  # 10-token passages every 8 tokens: 4 passages
+    assert index.store_chapters_bulk([chapter(1, text)]) == 4
+    assert len(index.model.encoded) == 4
+
+    index.model.encoded.clear()
+    assert index.store_chapters_bulk([chapter(1, text)]) == 4
+    assert index.model.encoded == []
+
+    index.store_chapters_bulk([chapter(1, text, score=5, title="Renamed")])
+    assert index.model.encoded == []
+    assert {(meta["score"], meta["title"]) for _, _, meta in stored(index, "chapter1")} == {(5, "Renamed")}
+    assert len(index.lexical.search("w3", 5, {"min_score": 5})) == 1
+
+
+def test_edited_and_shorter_chapters_reuse_unchanged_passages(index):
+    text = words("w", 30)
+    index.store_chapters_bulk([chapter(1, text)])
+    first = stored(index, "chapter1")
+
+    # Appending changes the last passage and adds one; the first three keep their vectors
+    index.model.encoded.clear()
+    appended = text + " " + words("x", 6)
+    index.store_chapters_bulk([chapter(1, appended)])
+    assert index.model.encoded == [words("w", 30).split(" ", 24)[-1] + " " + words("x", 4), "x2 x3 x4 x5"]
+    assert [p[1] for p in stored(index, "chapter1")][:3] == [p[1] for p in first][:3]
+
+    # Editing one word re-encodes only the passage it falls in
+    index.model.encoded.clear()
+    edited = appended.replace("w12", "changed")
+    index.store_chapters_bulk([chapter(1, edited)])
+    assert len(index.model.encoded) == 1 and "changed" in index.model.encoded[0]
+
+    # A shorter chapter leaves none of its old passages behind
+    index.model.encoded.clear()
+    index.store_chapters_bulk([chapter(1, words("w", 12))])
+    assert [p[0] for p in stored(index, "chapter1")] == ["chapter1#p0", "chapter1#p1"]
+    assert index.model.encoded == ["w8 w9 w10 w11"]  # p0 is the same text as before
+    assert index.collection.count() == 2 and index.lexical.count() == 2
+
+
+def test_legacy_documents_are_replaced_and_reencoded(index):
+    vector = index.model.encode(["legacy"]).tolist()
+    index.collection.add(ids=["chapter7"], documents=[words("w", 12)], embeddings=vector,
+                         metadatas=[{"chapter": 7, "title": "Old", "score": 2}])
+    index.collection.add(ids=["chapter8#p0", "chapter8#p1", "chapter8#p2"], documents=["a", "b", "c"], embeddings=vector * 3,
+                         metadatas=[{"chapter": 8, "doc_id": "chapter8", "passage": i} for i in range(3)])
+
+    index.model.encoded.clear()
+    index.store_chapters_bulk([chapter(7, words("w", 12)), chapter(8, words("w", 12))])
+    # No stored hashes to trust: everything is encoded once (the two chapters share their passages)
+    assert sorted(index.model.encoded) == ["w0 w1 w2 w3 w4 w5 w6 w7 w8 w9", "w8 w9 w10 w11"]
+    assert sorted(index.collection.get()["ids"]) == ["chapter7#p0", "chapter7#p1", "chapter8#p0", "chapter8#p1"]
+
+
+def test_store_planned_from_a_stale_snapshot_leaves_no_orphans(index, monkeypatch):
+    # Two stores of one chapter both read it before either wrote; the longer one wrote first
+    index.store_chapters_bulk([chapter(1, words("w", 30))])
+    real_stored_passages = index.stored_passages
+    monkeypatch.setattr(index, "stored_passages", lambda doc_ids: {})
+    index.store_chapters_bulk([chapter(1, words("v", 12))])
+    assert [p[0] for p in stored(index, "chapter1")] == ["chapter1#p0", "chapter1#p1"]
+    assert index.lexical.count() == 2
+
+    # A rescore planned before another store rewrote the chapter doesn't stamp its metadata on the new passages
+    snapshot = real_stored_passages(["chapter1"])
+    monkeypatch.setattr(index, "stored_passages", real_stored_passages)
+    index.store_chapters_bulk([chapter(1, words("u", 20), score=1)])
+    monkeypatch.setattr(index, "stored_passages", lambda doc_ids: snapshot)
+    index.store_chapters_bulk([chapter(1, words("v", 12), score=5)])
+    passages = stored(index, "chapter1")
+    assert [p[1].split()[0] for p in passages] == ["u0", "u8", "u16"] and {p[2]["score"] for p in passages} == {1}
@@ -0,0 +1,121 @@
+import os
+import stat
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from ai import embedding_service
+from ai.embedding_service import EmbeddingService, EmbeddingServiceClient, EmbeddingServiceError, EncodeBatcher, connect
+
+
+def fake_index(calls):
+    def encode(texts, batch_size=64):
+        calls.append(("encode", list(texts)))
+        return np.array([[float(len(t)), 1.0] for t in texts], dtype=np.float32)
+
+    def store_chapters_bulk(chapters, encoder=None, write_lock=None):
+        calls.append(("store", [c["chapter_num"] for c in chapters]))
+        return sum(len(encoder([c["content"]])) for c in chapters)
+
+    def search_similar_chapters(query, top_k=3, offset=0, query_cache=None, filters=None, mode=None, write_lock=None):
+        calls.append(("search", query, top_k, offset, filters, mode))
+        return {"ids": [["chapter1#p0"]], "distances": [[np.float32(0.5)]], "query": query_cache.encode(query)}
+
+    return SimpleNamespace(
+        encode=encode, store_chapters_bulk=store_chapters_bulk, search_similar_chapters=search_similar_chapters,
+        backfill=lambda encoder=None, write_lock=None: 0, collection=SimpleNamespace(count=lambda: 7),
+        store_stats={"chapters_changed": 1}, model=SimpleNamespace(name="fake:engine"),
+    )
+
+
+def start_service(address, calls):
+    service = EmbeddingService(address, index=fake_index(calls))
+    listener = service.listen()
+    threading.Thread(target=service.serve_forever, args=(listener,), daemon=True).start()
+    return service
+
+
+def test_encode_batcher_merges_concurrent_requests_and_splits_results():
+    batches = []
+
+    def encode(texts):
+        batches.append(list(texts))
+        if "boom" in texts:
+            raise RuntimeError("model failed")
+        return [[len(t)] for t in texts]
+
+    batcher = EncodeBatcher(encode, max_batch=100, wait_ms=200)
+    results = {}
+    threads = [threading.Thread(target=lambda n=n: results.__setitem__(n, batcher.encode(["x" * n] * n))) for n in (1, 2, 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(batches) == 1 and sorted(len(t) for t in batches[0]) == [1, 2, 2, 3, 3, 3]
+    assert results == {n: [[n]] * n for n in (1, 2, 3)}
+    assert batcher.batches == 1 and batcher.texts == 6 and batcher.encode([]) == []
+
+    # A batch closes at max_batch texts, and a failing batch fails every request in it
+    small = EncodeBatcher(encode, max_batch=2, wait_ms=200)
+    assert small.encode(["a", "b"]) == [[1], [1]]
+    with pytest.raises(RuntimeError, match="model failed"):
+        small.encode(["boom"])
+    assert small.encode(["ok"]) == [[2]]
+
+
+def test_service_answers_authenticated_json_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_service, "AUTHKEY", "")
+    address = str(tmp_path / "svc.sock")
+    calls = []
+    start_service(address, calls)
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(address + ".key").st_mode) == 0o600
+
+    client = EmbeddingServiceClient(address, autostart=False)
+    assert client.call("ping") == "pong"
+    assert client.call("encode", texts=["ab", "c"]) == [[2.0, 1.0], [1.0, 1.0]]
+    assert client.call("store", chapters=[{"chapter_num": 3, "content": "abc"}]) == 1
+    result = client.call("search", query="lantern", top_k=5, offset=10, filters={"min_score": 0.5}, mode="hybrid")
+    assert result == {"ids": [["chapter1#p0"]], "distances": [[0.5]], "query": [7.0, 1.0]}
+    assert ("search", "lantern", 5, 10, {"min_score": 0.5}, "hybrid") in calls
+    stats = client.call("stats")
+    assert stats["passages"] == 7 and stats["engine"] == "fake:engine" and stats["stores"] == {"chapters_changed": 1}
+    with pytest.raises(EmbeddingServiceError, match="Unknown embedding service op"):
+        client.call("drop_everything")
+
+    # Without the key, nothing past the handshake is read
+    with pytest.raises(EmbeddingServiceError, match="authentication failed"):
+        connect(address, authkey="not-the-key")
+    assert client.call("ping") == "pong"
+
+
+def test_client_autostarts_one_service_for_concurrent_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_service, "AUTHKEY", "")
+    address = str(tmp_path / "svc.sock")
+    calls, spawned = [], []
+
+    def fake_popen(args, env=None, **kwargs):
+        spawned.append(args)
+        assert env["EMBEDDING_SOCKET"] == address
+
+        def boot():
+            time.sleep(0.3)  # Clients poll until the service is listening
+            start_service(address, calls)
+
+        threading.Thread(target=boot, daemon=True).start()
+
+    monkeypatch.setattr(embedding_service.subprocess, "Popen", fake_popen)
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(EmbeddingServiceClient(address).call("ping"))) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert results == ["pong"] * 4
+    assert len(spawned) == 1 and spawned[0][-1] == "ai.embedding_service"
+
+    with pytest.raises(FileNotFoundError):
+        EmbeddingServiceClient(str(tmp_path / "other.sock"), autostart=False).call("ping")
@@ -0,0 +1,32 @@
+import openai
+
+from benchmarks.fake_llm_server import serve_fake_llm
+
+
+def chat(text):
+    return [
+        {"role": "system", "content": "You are an expert AI writer."},
+        {"role": "user", "content": f"Rewrite the following passage:\n\n{text}"},
+    ]
+
+
+def test_completion_echoes_passage_with_usage():
+    with serve_fake_llm(latency_ms=0, tokens_per_second=10_000) as base_url:
+        client = openai.OpenAI(api_key="test", base_url=base_url)
+        response = client.chat.completions.create(model="fake", messages=chat("The lamp burned all night."), max_tokens=100)
+
+    assert response.choices[0].message.content == "The lamp burned all night."
+    assert response.usage.completion_tokens == 5
+    assert response.usage.prompt_tokens > 0
+
+
+def test_stream_yields_deltas_and_final_usage():
+    with serve_fake_llm(latency_ms=0, tokens_per_second=10_000) as base_url:
+        client = openai.OpenAI(api_key="test", base_url=base_url)
+        chunks = list(client.chat.completions.create(
+            model="fake", messages=chat("one two three"), max_tokens=100,
+            stream=True, stream_options={"include_usage": True},
+        ))
+
+    assert "".join(c.choices[0].delta.content or "" for c in chunks if c.choices) == "one two three"
+    assert chunks[-1].usage.completion_tokens == 3
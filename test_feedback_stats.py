@@ -0,0 +1,50 @@
+import os
+
+from ai.feedback_stats import FeedbackStats
+from ai.human_feedback import FeedbackLog
+
+
+def test_aggregates_follow_appends(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    log = FeedbackLog(path)
+    stats = FeedbackStats(path, window=2)
+    assert stats.mean() == 3.0
+
+    log.append({"chapter": "chapter1", "score": 5})
+    log.append({"chapter": "chapter1", "score": 3})
+    log.append({"chapter": "chapter2", "score": 1})
+    log.append({"context": "chapters/x_final.txt", "score": "n/a"})
+
+    assert stats.mean() == 3.0
+    assert stats.count == 3
+    assert stats.recent_mean() == 2.0
+    assert stats.chapter_mean("chapter1") == 4.0
+    assert stats.chapter_mean("chapter9", default=None) is None
+
+    log.append({"chapter": "chapter2", "score": 5})
+    assert stats.mean() == 3.5
+    assert stats.chapter_mean("chapter2") == 3.0
+
+
+def test_partial_line_is_read_once_complete(tmp_path):
+    path = tmp_path / "feedback.jsonl"
+    path.write_text('{"score": 4}\n{"score": ', encoding="utf-8")
+    stats = FeedbackStats(str(path))
+    assert stats.mean() == 4.0
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("2}\n")
+    assert stats.mean() == 3.0
+
+
+def test_replaced_log_is_reloaded(tmp_path):
+    path = tmp_path / "feedback.jsonl"
+    path.write_text('{"score": 1}\n{"score": 1}\n', encoding="utf-8")
+    stats = FeedbackStats(str(path))
+    assert stats.mean() == 1.0
+
+    replacement = tmp_path / "new.jsonl"
+    replacement.write_text('{"score": 5}\n', encoding="utf-8")
+    os.replace(replacement, path)
+    assert stats.mean() == 5.0
+    assert stats.count == 1
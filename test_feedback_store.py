@@ -0,0 +1,46 @@
+import json
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from ai.human_feedback import FeedbackLog, migrate_legacy_log
+
+
+def append_many(path, writer, count):
+    log = FeedbackLog(path, fsync_every=8)
+    for i in range(count):
+        log.append({"writer": writer, "i": i, "score": 4})
+    log.close()
+
+
+def test_concurrent_thread_appends_are_not_lost(tmp_path):
+    log = FeedbackLog(str(tmp_path / "feedback.jsonl"))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: log.append({"i": i, "score": 5}), range(500)))
+    log.close()
+
+    assert sorted(e["i"] for e in log.read()) == list(range(500))
+
+
+def test_concurrent_process_appends_are_not_lost(tmp_path):
+    path = str(tmp_path / "feedback.jsonl")
+    procs = [multiprocessing.Process(target=append_many, args=(path, w, 200)) for w in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    entries = FeedbackLog(path).read()
+    assert len(entries) == 800
+    assert {(e["writer"], e["i"]) for e in entries} == {(w, i) for w in range(4) for i in range(200)}
+
+
+def test_migration_moves_legacy_entries_first(tmp_path):
+    legacy = tmp_path / "feedback_log.json"
+    legacy.write_text(json.dumps([{"score": 2}, {"score": 3}]), encoding="utf-8")
+    path = str(tmp_path / "feedback_log.jsonl")
+    FeedbackLog(path).append({"score": 5})
+
+    assert migrate_legacy_log(str(legacy), path) == 2
+    assert migrate_legacy_log(str(legacy), path) == 0
+    assert [e["score"] for e in FeedbackLog(path).read()] == [2, 3, 5]
+    assert (tmp_path / "feedback_log.json.migrated").exists()
@@ -0,0 +1,32 @@
+import pytest
+
+from benchmarks.fixture_server import FIXTURE_BOOK, FIXTURE_DIR, chapter_urls, serve_fixtures
+from scraping.http_scraper import NeedsBrowser, extract_chapter, parse_api_url
+from scraping.scraper import TITLE_SUFFIX, scrape_chapter
+
+
+def test_extracts_fixture_chapter():
+    html = (FIXTURE_DIR / "wiki" / FIXTURE_BOOK / "Chapter_1.html").read_text(encoding="utf-8")
+    page = extract_chapter(html, f"http://wiki.test/wiki/{FIXTURE_BOOK}/Chapter_1", TITLE_SUFFIX)
+
+    assert page["title"] == "The Lantern Keeper/Chapter 1"
+    assert page["next_url"] == f"http://wiki.test/wiki/{FIXTURE_BOOK}/Chapter_2"
+    assert "\n\n" in page["content"]
+    assert "<" not in page["content"]
+
+
+def test_empty_content_needs_browser():
+    html = '<html><body><div id="mw-content-text"><script>render()</script></div></body></html>'
+    with pytest.raises(NeedsBrowser):
+        extract_chapter(html, "http://wiki.test/wiki/Book/Chapter_1")
+    assert parse_api_url("http://wiki.test/wiki/Book/Chapter_1").endswith("page=Book/Chapter_1")
+    assert parse_api_url("http://wiki.test/static/page.html") is None
+
+
+def test_scrape_chapter_over_http(tmp_path):
+    with serve_fixtures() as base_url:
+        url = chapter_urls(base_url)[0]
+        text_path, screenshot_path = scrape_chapter(url, str(tmp_path / "chapter1.txt"), None, backend="http")
+
+    assert screenshot_path is None
+    assert (tmp_path / "chapter1.txt").read_text(encoding="utf-8").strip()
@@ -0,0 +1,42 @@
+from ai.lexical_index import LexicalIndex
+from ai.retrieval import chroma_where, reciprocal_rank_fusion
+
+
+def passages(chapter, title, score, texts):
+    doc_id = f"chapter{chapter}"
+    ids = [f"{doc_id}#p{i}" for i in range(len(texts))]
+    metas = [{"chapter": chapter, "title": title, "score": score, "doc_id": doc_id, "passage": i} for i in range(len(texts))]
+    return [doc_id], ids, texts, metas
+
+
+def test_lexical_index_matches_names_and_applies_filters(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.db"))
+    index.replace(*passages(1, "The Reef", 2, ["Captain Quenby sailed past the reef.", "The storm broke at night."]))
+    index.replace(*passages("2", "Harrowgate", 5, ["Nobody in Harrowgate had heard of Quenby.", "Storms, storms and more storms."]))
+    index.replace(*passages(3, "The Lamp", 4, ["The keeper trimmed the lamp."]))
+
+    # The title is indexed too, so both passages of "Harrowgate" match; the one naming it ranks first
+    assert [hit[0] for hit in index.search("Where is Harrowgate?", 5)] == ["chapter2#p0", "chapter2#p1"]
+    assert {hit[0] for hit in index.search("quenby", 5)} == {"chapter1#p0", "chapter2#p0"}
+    assert [hit[0] for hit in index.search("quenby", 5, {"min_score": 4})] == ["chapter2#p0"]
+    assert {hit[0] for hit in index.search("quenby storm", 5, {"chapters": [1]})} == {"chapter1#p0", "chapter1#p1"}
+    assert index.search("storming", 5, {"title": "Harrowgate"})[0][2]["doc_id"] == "chapter2"
+    assert index.search("?!", 5) == []
+
+    # Re-storing a chapter replaces all of its passages
+    index.replace(*passages(1, "The Reef", 2, ["Calm water."]))
+    assert index.count() == 4
+    assert [hit[0] for hit in index.search("quenby", 5)] == ["chapter2#p0"]
+
+
+def test_filters_and_fusion():
+    assert chroma_where({}) is None
+    assert chroma_where({"min_score": 4, "title": None}) == {"score": {"$gte": 4}}
+    assert chroma_where({"max_score": 3, "chapters": ["7", "intro"]}) == {"$and": [
+        {"score": {"$lte": 3}},
+        {"$or": [{"chapter": {"$in": ["7", "intro"]}}, {"chapter": {"$in": [7]}}]},
+    ]}
+
+    fused = reciprocal_rank_fusion(["a", "b", "c"], ["c", "d"], k=60)
+    assert [id_ for id_, _ in fused] == ["c", "a", "b", "d"]
+    assert fused[0][1] == 1 / 63 + 1 / 61
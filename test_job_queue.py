@@ -0,0 +1,71 @@
+import time
+
+from utils.job_queue import FAILED, SUCCEEDED, JobQueue, JobStore
+
+
+def wait_for(store, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+def test_job_reports_stages_and_artifacts(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+
+    def handler(payload, progress):
+        with progress.stage("scrape"):
+            progress.artifact("raw_text", f"chapters/{payload['chapter_id']}.txt")
+
+    queue = JobQueue(store, handler, max_workers=1)
+    job = queue.submit({"chapter_id": "abc"})
+    job = wait_for(store, job["job_id"])
+    queue.shutdown()
+
+    assert job["status"] == SUCCEEDED
+    assert job["stages"]["scrape"]["status"] == SUCCEEDED
+    assert job["artifacts"] == {"raw_text": "chapters/abc.txt"}
+
+
+def test_retry_skips_completed_stages(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    calls = []
+
+    def handler(payload, progress):
+        if not progress.completed("rewrite"):
+            with progress.stage("rewrite"):
+                calls.append("rewrite")
+        with progress.stage("edit"):
+            calls.append("edit")
+            if calls.count("edit") == 1:
+                raise RuntimeError("LLM timeout")
+
+    queue = JobQueue(store, handler, max_workers=1)
+    job = wait_for(store, queue.submit({})["job_id"])
+    assert job["status"] == FAILED
+    assert job["stages"]["edit"]["error"] == "LLM timeout"
+
+    queue.retry(job["job_id"])
+    job = wait_for(store, job["job_id"])
+    queue.shutdown()
+
+    assert job["status"] == SUCCEEDED
+    assert job["attempts"] == 2
+    assert calls == ["rewrite", "edit", "edit"]
+
+
+def test_jobs_survive_restart(tmp_path):
+    db_path = tmp_path / "jobs.db"
+    job = JobStore(db_path).create("job", {"n": 1})
+
+    ran = []
+    store = JobStore(db_path)
+    queue = JobQueue(store, lambda payload, progress: ran.append(payload["n"]), max_workers=1)
+    assert queue.resume() == 1
+    wait_for(store, job["job_id"])
+    queue.shutdown()
+
+    assert ran == [1]
@@ -0,0 +1,50 @@
+import time
+
+from ai.llm_cache import LLMCache, make_cache_key
+
+
+def key_for(text, instruction="Modernize the language."):
+    messages = [
+        {"role": "system", "content": f"You are an expert AI writer. {instruction}"},
+        {"role": "user", "content": f"Rewrite the following passage:\n\n{text}"},
+    ]
+    return make_cache_key("deepseek/deepseek-chat-v3-0324:free", messages, 0.8, 4096)
+
+
+def test_key_covers_prompt_and_input():
+    assert key_for("Chapter 1") == key_for("Chapter 1")
+    assert key_for("Chapter 1") != key_for("Chapter 2")
+    assert key_for("Chapter 1") != key_for("Chapter 1", instruction="Add vivid imagery.")
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = LLMCache(tmp_path / "llm.db")
+    key = key_for("Chapter 1")
+
+    assert cache.get(key) is None
+    cache.put(key, "rewritten chapter")
+    assert cache.get(key) == "rewritten chapter"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMCache(tmp_path / "llm.db", ttl_seconds=0.01)
+    cache.put("k", "value")
+    time.sleep(0.02)
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = LLMCache(tmp_path / "llm.db", max_entries=2)
+    cache.put("a", "1")
+    time.sleep(0.01)
+    cache.put("b", "2")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
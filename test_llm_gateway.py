@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import openai
+import pytest
+
+from ai.llm_gateway import AsyncLLMGateway, LLMGateway, retry_delay
+
+
+def completion(text="ok"):
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "m",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+    }
+
+
+def gateway_for(handler, **kwargs):
+    sleeps = []
+    gateway = LLMGateway(base_url="http://llm.test/v1", api_key="test", sleep=sleeps.append,
+                         http_client=httpx.Client(transport=httpx.MockTransport(handler)), **kwargs)
+    return gateway, sleeps
+
+
+def test_retries_429_honouring_retry_after():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "7"}, json={"error": {"message": "slow down"}})
+        if len(calls) == 2:
+            return httpx.Response(503, json={"error": {"message": "busy"}})
+        return httpx.Response(200, json=completion("done"))
+
+    gateway, sleeps = gateway_for(handler)
+    response = gateway.complete(model="m", messages=[{"role": "user", "content": "hi"}])
+
+    assert response.choices[0].message.content == "done"
+    assert len(calls) == 3
+    assert sleeps[0] == 7
+    assert 0 < sleeps[1] <= 2  # Exponential backoff for the second attempt
+
+
+def test_gives_up_after_max_retries_and_does_not_retry_client_errors():
+    gateway, sleeps = gateway_for(lambda r: httpx.Response(500, json={"error": {"message": "down"}}), max_retries=2)
+    with pytest.raises(openai.InternalServerError):
+        gateway.complete(model="m", messages=[])
+    assert len(sleeps) == 2
+
+    gateway, sleeps = gateway_for(lambda r: httpx.Response(400, json={"error": {"message": "bad"}}))
+    with pytest.raises(openai.BadRequestError):
+        gateway.complete(model="m", messages=[])
+    assert sleeps == []
+
+
+def test_per_model_concurrency_cap():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def handler(request):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return httpx.Response(200, json=completion())
+
+    gateway, _ = gateway_for(handler, max_concurrency=8, model_concurrency=2)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(lambda _: gateway.complete(model="m", messages=[]), range(6)))
+
+    assert peak[0] == 2
+
+
+def test_retry_after_http_date_and_async_gateway():
+    error = openai.RateLimitError("slow", response=httpx.Response(
+        429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, request=httpx.Request("POST", "http://llm.test")
+    ), body=None)
+    assert retry_delay(error, 0) == 0  # Date in the past: retry at once
+
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "1"}, json={"error": {"message": "slow down"}})
+        return httpx.Response(200, json=completion("async"))
+
+    async def run():
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+
+        gateway = AsyncLLMGateway(base_url="http://llm.test/v1", api_key="test", sleep=fake_sleep,
+                                  http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        response = await gateway.complete(model="m", messages=[])
+        return response.choices[0].message.content, sleeps
+
+    assert asyncio.run(run()) == ("async", [1])
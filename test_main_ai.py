@@ -0,0 +1,127 @@
+import asyncio
+import importlib
+
+import pytest
+
+from utils.artifact_store import ArtifactStore
+from utils.crawl_manifest import CrawlManifest
+
+BOOK = "https://w.test/wiki/Book"
+
+
+@pytest.fixture
+def crawl(monkeypatch, tmp_path):
+    """
+    Runs main_ai.scrape_and_process over a fake book of `pages` (chapter text
+    per URL, in "→" order) with batch approval; `spin` replaces the LLM rewrite.
+    """
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.chdir(tmp_path)
+    main_ai = importlib.import_module("main_ai")
+    store = ArtifactStore(tmp_path / "artifacts")
+    embedded, feedback = [], []
+    monkeypatch.setattr(main_ai, "get_artifact_store", lambda: store)
+    monkeypatch.setattr(main_ai, "compute_feedback_average", lambda: 3.0)
+    monkeypatch.setattr(main_ai, "save_feedback", lambda *args: feedback.append(args))
+    monkeypatch.setattr(main_ai, "store_chapters_bulk", lambda chapters: embedded.extend(chapters) or len(chapters))
+
+    def run(pages, spin, workers=3, scrape_ahead=2, refresh=False):
+        urls = [f"{BOOK}/Chapter_{n}" for n in range(1, len(pages) + 1)]
+
+        def fetch_chapter(url, **kwargs):
+            n = urls.index(url)
+            if pages[n] is None:
+                raise RuntimeError(f"page {n + 1} is down")
+            return {"title": f"Chapter {n + 1}", "content": pages[n], "screenshot": None,
+                    "next_url": urls[n + 1] if n + 1 < len(urls) else None}
+
+        monkeypatch.setattr(main_ai, "fetch_chapter", fetch_chapter)
+        monkeypatch.setattr(main_ai, "spin_chapter", spin)
+        manifest = CrawlManifest(tmp_path / "Book.json", urls[0])
+        chapters = asyncio.run(asyncio.wait_for(main_ai.scrape_and_process(
+            urls[0], workers=workers, scrape_ahead=scrape_ahead, approval="batch", default_score=4,
+            manifest=manifest, refresh=refresh,
+        ), timeout=10))  # A lost end-of-crawl sentinel would otherwise hang the approver
+        return chapters, manifest
+
+    run.main_ai, run.store, run.embedded, run.feedback = main_ai, store, embedded, feedback
+    return run
+
+
+def test_chapters_are_approved_in_order_whatever_order_rewrites_finish(crawl):
+    finished = []
+
+    async def slower_first(text, chapter_num, score_avg):
+        await asyncio.sleep(0.01 * (6 - chapter_num))
+        finished.append(chapter_num)
+        return text.upper()
+
+    chapters, manifest = crawl(["one", "two", "three", "four", "five"], slower_first, workers=5, scrape_ahead=5)
+    assert finished != sorted(finished)
+    assert [(c["chapter_num"], c["content"]) for c in chapters] == [(1, "ONE"), (2, "TWO"), (3, "THREE"), (4, "FOUR"), (5, "FIVE")]
+
+    # Batch approval: every chapter accepted with the default score, then embedded in one bulk call
+    assert crawl.feedback == [(n, "a", 4) for n in range(1, 6)]
+    assert [c["chapter_num"] for c in crawl.embedded] == [1, 2, 3, 4, 5]
+    assert all(manifest.completed(n, stage) for n in range(1, 6) for stage in ("rewrite", "approve", "embed"))
+    assert manifest.stage(3, "approve")["decision"] == "a"
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_crawl_ends_when_scraping_fails(crawl, workers):
+    async def spin(text, chapter_num, score_avg):
+        return text.upper()
+
+    # Page 3 is down: the crawl ends after chapter 2 instead of waiting for it
+    chapters, manifest = crawl(["one", "two", None, "four"], spin, workers=workers)
+    assert [c["chapter_num"] for c in chapters] == [1, 2]
+    assert manifest.chapter(3) is None and manifest.resume_point()[0] == 2
+
+    # Once the page is back, a rerun follows chapter 2's "→" link to the rest of the book
+    chapters, _ = crawl(["one", "two", "three", "four"], spin, workers=workers)
+    assert [c["chapter_num"] for c in chapters] == [2, 3, 4]
+
+
+def test_failed_rewrite_of_the_last_chapter_is_skipped(crawl):
+    async def spin(text, chapter_num, score_avg):
+        if chapter_num == 3:
+            raise RuntimeError("context length exceeded")
+        return text.upper()
+
+    chapters, _ = crawl(["one", "two", "three"], spin, workers=2)
+    assert [c["chapter_num"] for c in chapters] == [1, 2]
+    assert [args[0] for args in crawl.feedback] == [1, 2]
+    assert [c["chapter_num"] for c in crawl.embedded] == [1, 2]
+
+
+def test_failed_rewrite_stays_incomplete_and_is_retried(crawl):
+    async def flaky(text, chapter_num, score_avg):
+        if text == "two":
+            raise RuntimeError("429 rate limited")
+        return text.upper()
+
+    chapters, manifest = crawl(["one", "two", "three"], flaky)
+    assert [c["chapter_num"] for c in chapters] == [1, 3]
+    assert not manifest.completed(2, "rewrite") and not manifest.completed(2, "approve")
+    assert manifest.resume_point()[0] == 2
+
+    calls = []
+
+    async def healthy(text, chapter_num, score_avg):
+        calls.append(chapter_num)
+        return text.upper()
+
+    chapters, manifest = crawl(["one", "two", "three"], healthy)
+    assert calls == [2]  # Chapter 3 was already done; only the failed chapter hit the LLM again
+    assert [c["content"] for c in chapters] == ["TWO", "THREE"]
+    assert [c["chapter_num"] for c in crawl.main_ai.iter_book_chapters(manifest)] == [1, 2, 3]
+
+
+def test_rebuilt_book_warns_about_missing_approved_chapters(crawl, capsys):
+    async def spin(text, chapter_num, score_avg):
+        return text.upper()
+
+    _, manifest = crawl(["one", "two"], spin)
+    crawl.store.path("Book/chapter1", "final_text").unlink()
+    assert [c["content"] for c in crawl.main_ai.iter_book_chapters(manifest)] == ["TWO"]
+    assert "chapter(s) 1 is missing" in capsys.readouterr().out
@@ -0,0 +1,62 @@
+import json
+
+from utils import metrics
+from utils.chunking import map_segments
+from utils.metrics import Counter, Gauge, Histogram, MetricsRegistry, record_llm_usage, stage_timer, start_trace
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    seconds = Histogram("stage_seconds", "Stage time.", ["stage"], buckets=(0.1, 1), registry=registry)
+    calls = Counter("calls_total", "Calls.", ["model"], registry=registry)
+    in_flight = Gauge("in_flight", "Busy.", [], registry=registry)
+
+    seconds.observe(0.05, stage="pdf")
+    seconds.observe(0.5, stage="pdf")
+    calls.inc(model='a"b')
+    in_flight.set(2)
+
+    text = registry.render()
+    assert "# TYPE stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="pdf",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="pdf",le="+Inf"} 2' in text
+    assert 'stage_seconds_count{stage="pdf"} 2' in text
+    assert 'calls_total{model="a\\"b"} 1' in text
+    assert "in_flight 2" in text
+
+
+def test_trace_collects_stages_and_tokens_across_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "TRACE_LOG_PATH", str(tmp_path / "traces.jsonl"))
+    usage = {"prompt_tokens": 100, "completion_tokens": 40}
+
+    def fake_llm(segment, context):
+        record_llm_usage("test-model", usage)
+        return segment
+
+    with start_trace("test", chapter_id="abc"):
+        with stage_timer("rewrite"):
+            map_segments(fake_llm, "\n\n".join(["word " * 300] * 4), max_tokens=400)
+        with stage_timer("review"):
+            record_llm_usage("test-model", cached=True)
+
+    record = json.loads((tmp_path / "traces.jsonl").read_text().splitlines()[-1])
+    assert record["chapter_id"] == "abc" and record["status"] == "succeeded"
+    assert set(record["stages"]) == {"rewrite", "review"}
+    assert record["llm_calls"] == 5 and record["cache_hits"] == 1
+    assert record["tokens"] == {"prompt": 400, "completion": 160}
+    assert metrics.LLM_TOKENS.value(model="test-model", stage="rewrite", kind="prompt") >= 400
+
+
+def test_failed_stage_is_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "TRACE_LOG_PATH", str(tmp_path / "traces.jsonl"))
+    before = metrics.STAGE_FAILURES.value(stage="tts")
+    try:
+        with start_trace("test"), stage_timer("tts"):
+            raise RuntimeError("no audio device")
+    except RuntimeError:
+        pass
+
+    record = json.loads((tmp_path / "traces.jsonl").read_text())
+    assert record["status"] == "failed"
+    assert record["stages"]["tts"]["error"] == "no audio device"
+    assert metrics.STAGE_FAILURES.value(stage="tts") == before + 1
@@ -0,0 +1,81 @@
+import warnings
+import wave
+
+import pytest
+
+import ai.narration as narration
+from ai.narration import narrate, split_segments, voice_settings
+
+
+def fake_synthesize(calls):
+    """Writes 10 ms of 8 kHz audio per character, instead of running pyttsx3."""
+    def synthesize(text, path, settings):
+        calls.append(text)
+        with wave.open(path, "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(8000)
+            out.writeframes(b"\1\0" * 80 * len(text))
+        return path
+    return synthesize
+
+
+def test_split_segments_cuts_long_paragraphs_at_sentences():
+    text = "Short  one.\n\n  \n" + " ".join(f"Sentence number {n}." for n in range(10)) + "\nStill the same paragraph."
+    segments = split_segments(text, max_chars=60)
+    assert segments[0] == "Short one."
+    assert all(len(s) <= 60 for s in segments)
+    assert " ".join(segments[1:]) == " ".join(f"Sentence number {n}." for n in range(10)) + " Still the same paragraph."
+
+
+def test_narrate_reuses_unchanged_segments(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(narration, "synthesize_segment", fake_synthesize(calls))
+    monkeypatch.setattr(narration.shutil, "which", lambda name: None)
+    cache = str(tmp_path / "cache")
+
+    # No ffmpeg: the MP3 request falls back to a WAV, and the real path is returned
+    path = narrate("First paragraph.\n\nSecond paragraph.", tmp_path / "chapter_1.mp3", cache_dir=cache, parallel=False)
+    assert path == str(tmp_path / "chapter_1.wav")
+    with wave.open(path, "rb") as audio:
+        assert audio.getnframes() == 80 * (16 + 17) + 8000 * narration.NARRATION_PAUSE_MS // 1000
+    assert calls == ["First paragraph.", "Second paragraph."]
+
+    narrate("First paragraph.\n\nSecond paragraph, edited.", tmp_path / "chapter_1.mp3", cache_dir=cache, parallel=False)
+    assert calls[2:] == ["Second paragraph, edited."]
+
+    # Other voice settings are cached separately
+    narrate("First paragraph.", tmp_path / "chapter_1.wav", settings=voice_settings(rate=120), cache_dir=cache, parallel=False)
+    assert calls[3:] == ["First paragraph."]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["cache", "chapter_1.wav"]
+
+
+def test_aiff_segments_are_converted_before_joining(tmp_path, monkeypatch):
+    """pyttsx3's nsss driver on macOS writes big-endian AIFF even into a .wav path."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import aifc
+
+    def synthesize_aiff(text, path, settings):
+        with aifc.open(str(path), "wb") as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(8000)
+            out.writeframes(b"\0\1" * 80 * len(text))  # Big-endian 1
+        return path
+
+    monkeypatch.setattr(narration, "synthesize_segment", synthesize_aiff)
+    monkeypatch.setattr(narration.shutil, "which", lambda name: None)
+    path = narrate("One.\n\nTwo.", tmp_path / "chapter_1.wav", cache_dir=str(tmp_path / "cache"), parallel=False)
+    with wave.open(path, "rb") as audio:
+        frames = audio.readframes(80 * 4)
+    assert frames == b"\1\0" * 80 * 4
+    cached = list((tmp_path / "cache").rglob("*.wav"))
+    assert len(cached) == 2 and all(p.read_bytes()[:4] == b"RIFF" for p in cached)
+
+
+def test_ensure_wav_rejects_unknown_audio(tmp_path):
+    path = tmp_path / "segment.wav"
+    path.write_bytes(b"ID3\4" + b"\0" * 20)
+    with pytest.raises(ValueError):
+        narration.ensure_wav(str(path))
@@ -0,0 +1,72 @@
+from pypdf import PdfReader
+
+from utils.pdf_utils import BookBuilder, build_book, generate_pdf, paragraphs
+
+
+def test_generate_pdf_keeps_paragraphs(tmp_path):
+    content = "  First line\nsecond line  \n\n\n   \nSecond paragraph ünïcode ✓\r\n"
+    assert list(paragraphs(content)) == ["First line\nsecond line", "Second paragraph ünïcode ✓"]
+
+    output = generate_pdf(content, "Chapter ✓", str(tmp_path / "chapter.pdf"))
+    reader = PdfReader(output)
+    assert reader.metadata.title == "Chapter ✓"
+    text = reader.pages[0].extract_text()
+    assert "second line" in text and "Second paragraph ünïcode ✓" in text
+
+
+def test_book_builder_streams_chapters_into_one_pdf(tmp_path):
+    long_text = "\n\n".join(f"Paragraph {n} of the lantern keeper's night." for n in range(120))
+    output = tmp_path / "book.pdf"
+    builder = BookBuilder(str(output), title="The Gates of Morning ✓")
+    assert builder.add_chapter("Chapter 1: Ünïcode", long_text) == 0
+    second = builder.add_chapter("Chapter 2: Short", "Only one page.")
+    assert builder.finish() == str(output)
+
+    reader = PdfReader(str(output), strict=True)
+    assert len(reader.pages) == builder.page_count == second + 1 > 2
+    assert reader.metadata.title == "The Gates of Morning ✓"
+    assert reader.pages[0].extract_text().startswith("Chapter 1: Ünïcode")
+    assert "Only one page." in reader.pages[second].extract_text()
+    assert [p.name for p in tmp_path.iterdir()] == ["book.pdf"]
+
+
+def test_build_book_adds_contents_and_reuses_unchanged_chapters(tmp_path):
+    chapters = [(f"Chapter {n}: “Quoted” ✓", "\n\n".join(f"Chapter {n}, paragraph {p}." for p in range(60))) for n in (1, 2, 3)]
+    output, cache = str(tmp_path / "book.pdf"), str(tmp_path / "cache")
+
+    stats = build_book(iter(chapters), output, title="Book", workers=1, cache_dir=cache)
+    assert (stats["chapters"], stats["rendered"], stats["reused"]) == (3, 3, 0)
+    reader = PdfReader(output, strict=True)
+    assert len(reader.pages) == stats["pages"]
+    contents = reader.pages[0].extract_text()
+    assert "Contents" in contents and "Chapter 3: “Quoted” ✓" in contents
+    assert len(reader.pages[0]["/Annots"]) == 3
+    assert [item.title for item in reader.outline] == [title for title, _ in chapters]
+    third = reader.get_destination_page_number(reader.outline[2])
+    assert reader.pages[third].extract_text().startswith("Chapter 3")
+    assert f"Chapter 3: “Quoted” ✓ {third + 1}" in contents
+
+    chapters[1] = (chapters[1][0], "Rewritten.")
+    stats = build_book(iter(chapters), output, workers=1, cache_dir=cache)
+    assert (stats["rendered"], stats["reused"]) == (1, 2)
+
+
+def test_font_subset_cache_is_local_to_chapter_pdfs(tmp_path):
+    import fpdf.fpdf
+    from fpdf.ttfonts import TTFontFile
+
+    from utils import pdf_utils
+
+    pdf_utils._subsets.clear()
+    generate_pdf("The same few letters.", "One", str(tmp_path / "one.pdf"))
+    generate_pdf("The same few letters.", "Two", str(tmp_path / "two.pdf"))
+    assert len(pdf_utils._subsets) == 1
+    assert fpdf.fpdf.TTFontFile is TTFontFile  # Plain FPDF documents still subset the usual way
+
+
+def test_bundled_font_ignores_the_path_stored_in_its_metrics():
+    # utils/fonts/DejaVuSans.pkl was built on another machine and names its absolute font path
+    from utils import pdf_utils
+
+    pdf_utils._font_metrics.clear()
+    assert pdf_utils.ChapterPDF().fonts["dejavu"]["ttffile"] == pdf_utils.FONT_PATH
@@ -0,0 +1,68 @@
+import io
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PIL import Image
+
+from benchmarks.fixture_server import chapter_urls, serve_fixtures
+from scraping.scraper import fetch_chapter
+from scraping.screenshots import THUMBNAIL_MAX_HEIGHT, THUMBNAIL_WIDTH, capture_screenshot, find_screenshot
+
+
+class FakePage:
+    """Stands in for a Playwright page: a tall page, or just its top when full_page is False."""
+
+    def __init__(self):
+        self.captures = []
+
+    def goto(self, url, wait_until=None):
+        self.url = url
+
+    def screenshot(self, full_page=False, type="png", quality=None):
+        self.captures.append(full_page)
+        image = Image.new("RGB", (1280, 6000 if full_page else 720), "white")
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG" if type == "jpeg" else "PNG", **({"quality": quality} if quality else {}))
+        return buffer.getvalue()
+
+
+class FakePool:
+    def __init__(self):
+        self.page = FakePage()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, fn) -> Future:
+        return self.executor.submit(fn, self.page)
+
+    def run(self, fn):
+        return self.submit(fn).result()
+
+
+def test_capture_encodes_format_and_thumbnail(tmp_path):
+    page = FakePage()
+    path = capture_screenshot(page, tmp_path / "chapter_1.png", mode="viewport", format="webp", quality=50)
+
+    assert path.endswith("chapter_1.webp")
+    assert page.captures == [False]
+    assert Image.open(path).format == "WEBP"
+    screenshot, thumbnail = find_screenshot(tmp_path, "chapter_1")
+    assert str(screenshot) == path
+    with Image.open(thumbnail) as image:
+        assert image.format == "JPEG" and image.width == THUMBNAIL_WIDTH
+    assert capture_screenshot(page, tmp_path / "chapter_2", mode="off") is None
+
+
+def test_text_returned_before_deferred_screenshot(tmp_path):
+    pool = FakePool()
+    with serve_fixtures() as base_url:
+        url = chapter_urls(base_url)[0]
+        chapter = fetch_chapter(url, screenshot_path=tmp_path / "chapter_1", pool=pool, backend="auto",
+                                screenshot_mode="full", screenshot_format="jpeg", defer_screenshot=True)
+        assert chapter["content"]
+        path = chapter["screenshot"].result(timeout=10)
+
+        skipped = fetch_chapter(url, screenshot_path=tmp_path / "chapter_2", pool=pool, screenshot_mode="off")
+
+    assert path.endswith(".jpg") and pool.page.captures == [True]
+    with Image.open(tmp_path / "chapter_1_thumb.jpg") as image:
+        assert image.size == (THUMBNAIL_WIDTH, THUMBNAIL_MAX_HEIGHT)
+    assert skipped["screenshot"] is None and len(pool.page.captures) == 1
@@ -0,0 +1,58 @@
+import time
+
+import search
+from ai.search_cache import QueryEmbeddingCache, SearchResultCache, bump_index_generation
+
+
+def test_query_embeddings_are_cached_by_normalized_query():
+    calls = []
+    cache = QueryEmbeddingCache(lambda texts: calls.append(texts) or [[len(t)] for t in texts], max_size=2)
+    assert cache.encode("Lantern  Keeper") == cache.encode(" lantern keeper") == [14]
+    cache.encode("storm")
+    cache.encode("reef")  # Evicts "lantern keeper", the least recently used
+    cache.encode("lantern keeper")
+    assert calls == [["lantern keeper"], ["storm"], ["reef"], ["lantern keeper"]]
+    assert cache.stats() == {"entries": 2, "hits": 1, "misses": 4}
+
+
+def test_results_expire_on_index_write_and_ttl(tmp_path, monkeypatch):
+    generation = str(tmp_path / "index_generation")
+    cache = SearchResultCache(ttl_seconds=30, generation_path=generation)
+    assert cache.get_or_compute("q", lambda: [1]) == ([1], False)
+    assert cache.get_or_compute("q", lambda: [2]) == ([1], True)
+
+    bump_index_generation(generation)
+    assert cache.get_or_compute("q", lambda: [3]) == ([3], False)
+
+    now = time.monotonic()
+    monkeypatch.setattr("ai.search_cache.time.monotonic", lambda: now + 31)
+    assert cache.get_or_compute("q", lambda: [4]) == ([4], False)
+
+
+def test_search_pages_come_from_one_cached_fetch(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_search(query, top_k=3, offset=0, filters=None, mode=None):
+        calls.append(top_k)
+        n = min(top_k, 7)
+        return {
+            "documents": [[f"passage {i}" for i in range(n)]],
+            "metadatas": [[{"chapter": i, "title": f"Chapter {i}", "score": 4, "passage": 0} for i in range(n)]],
+            "distances": [[i / 10 for i in range(n)]],
+        }
+
+    monkeypatch.setattr(search, "search_similar_chapters", fake_search)
+    monkeypatch.setattr(search, "get_search_cache", lambda cache=SearchResultCache(generation_path=str(tmp_path / "g")): cache)
+    monkeypatch.setattr(search, "SEARCH_PAGE_DEPTH", 5)
+
+    hits, next_offset, cached = search.search_passages("Lantern", top_k=3)
+    assert ([h["chapter"] for h in hits], next_offset, cached) == ([0, 1, 2], 3, False)
+    # A page ending on the depth boundary still links to the next one (7 hits exist)
+    hits, next_offset, cached = search.search_passages("lantern ", top_k=2, offset=3)
+    assert ([h["chapter"] for h in hits], next_offset, cached) == ([3, 4], 5, True)
+    hits, next_offset, _ = search.search_passages("lantern", top_k=3, offset=3)
+    assert ([h["chapter"] for h in hits], next_offset) == ([3, 4, 5], 6)
+    hits, next_offset, cached = search.search_passages("lantern", top_k=3, offset=6)
+    assert ([h["chapter"] for h in hits], next_offset, cached) == ([6], None, True)
+    assert calls == [6, 11]
+    assert search.search_chapters("lantern", top_k=1)[0].startswith("📘 Chapter 0: Chapter 0")
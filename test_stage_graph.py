@@ -0,0 +1,66 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.job_queue import SUCCEEDED, JobProgress, JobStore
+from utils.stage_graph import StageGraph, StageSkipped
+
+
+def sleepy(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+def test_independent_stages_run_concurrently():
+    graph = StageGraph(thread_pool=ThreadPoolExecutor(max_workers=4))
+    for name in ("feedback", "embed", "pdf", "tts"):
+        graph.add(name, sleepy, 0.2, name)
+
+    start = time.perf_counter()
+    run = graph.run()
+    elapsed = time.perf_counter() - start
+
+    assert run.results == {n: n for n in ("feedback", "embed", "pdf", "tts")}
+    assert elapsed < 0.6
+
+
+def test_failure_keeps_other_artifacts_and_skips_dependents():
+    graph = StageGraph(thread_pool=ThreadPoolExecutor(max_workers=4))
+    graph.add("pdf", sleepy, 0.05, "chapter.pdf")
+    graph.add("tts", fail, "no audio device")
+    graph.add("upload", sleepy, 0, "uploaded", after=["tts"])
+    run = graph.run()
+
+    assert run.results == {"pdf": "chapter.pdf"}
+    assert run.errors["tts"] == "no audio device"
+    assert isinstance(run.futures["upload"].exception(), StageSkipped)
+
+
+def test_late_artifacts_and_stage_context(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    job = store.create("test", {})
+    progress = JobProgress(store, job["job_id"])
+
+    graph = StageGraph(stage_context=progress.stage, thread_pool=ThreadPoolExecutor(max_workers=2))
+    graph.add("pdf", sleepy, 0, "fast.pdf")
+    graph.add("tts", sleepy, 0.3, "slow.wav")
+    run = graph.run(wait=False)
+
+    assert run.result("pdf", timeout=1) == "fast.pdf"
+    assert "tts" in run.pending
+    run.wait()
+    stages = store.get(job["job_id"])["stages"]
+    assert stages["pdf"]["status"] == SUCCEEDED and stages["tts"]["status"] == SUCCEEDED
+
+
+def test_process_stage(tmp_path):
+    graph = StageGraph(thread_pool=ThreadPoolExecutor(max_workers=2))
+    graph.add("square", pow, 12, 2, process=True)
+    graph.add("bad", fail, "boom", process=True)
+    run = graph.run()
+
+    assert run.results == {"square": 144}
+    assert run.errors == {"bad": "boom"}
@@ -0,0 +1,347 @@
+# utils/artifact_store.py
+"""
+Content-addressed store for chapter outputs (texts, PDFs, narration,
+screenshots), replacing the per-name files in chapters/, static/ and
+screenshots/:
+
+    artifacts/
+      blobs/ab/abcdef...pdf       one file per distinct content (sha256 + extension)
+      manifests/3f/<id>.json      chapter id -> stage -> blob, size, timestamps
+      staging/                    files still being written, moved into blobs/ when done
+
+Identical outputs (the same text approved twice, an unchanged re-render)
+are stored once. A chapter's manifest path is computed from its id, so a
+lookup never lists a directory, and both trees are sharded by a two-hex
+prefix so no directory grows past a few thousand entries. `gc` deletes
+blobs no manifest references and, over a size quota, the outputs that can
+be regenerated (PDFs, narration, screenshots) of the least recently updated
+chapters. Texts, including approved ones, are only evicted with --evict:
+
+    python -m utils.artifact_store gc --quota-mb 2048
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # Windows: the thread lock alone
+    fcntl = None
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+ARTIFACT_QUOTA_MB = float(os.getenv("ARTIFACT_QUOTA_MB", "0"))  # 0 keeps every referenced blob
+# Unreferenced blobs and staging files younger than this are kept: a writer may not have recorded them yet
+ARTIFACT_GC_GRACE_SECONDS = float(os.getenv("ARTIFACT_GC_GRACE_SECONDS", "3600"))
+ARTIFACT_URL_PREFIX = "/artifacts"
+# Rebuilt from the final text (pdf, audio) or the source page (screenshots), so a quota may drop them
+REPRODUCIBLE_STAGES = ("pdf", "audio", "screenshot", "thumbnail")
+
+_HASH_CHUNK = 1 << 20
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _shard(name: str) -> str:
+    return hashlib.sha1(name.encode("utf-8")).hexdigest()[:2]
+
+
+def file_digest(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root: str = ARTIFACT_DIR):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.manifest_dir = self.root / "manifests"
+        self.staging_dir = self.root / "staging"
+        for directory in (self.blob_dir, self.manifest_dir, self.staging_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    # === Paths ===
+    def manifest_path(self, chapter_id) -> Path:
+        name = quote(str(chapter_id), safe="")
+        return self.manifest_dir / _shard(name) / f"{name}.json"
+
+    def blob_path(self, blob: str) -> Path:
+        return self.blob_dir / blob
+
+    def staging_path(self, name: str) -> Path:
+        """A fresh path for a stage to write its output to before put_file()."""
+        return self.staging_dir / f"{uuid.uuid4().hex[:12]}_{name}"
+
+    # === Writes ===
+    def put_file(self, chapter_id, stage: str, path, keep: bool = False) -> Path:
+        """
+        Stores the file at `path` as `stage` of the chapter and returns its
+        blob path. The file is moved in (copied with `keep`); when the same
+        content is already stored, the existing blob is reused.
+        """
+        path = Path(path)
+        digest = file_digest(path)
+        blob = f"{digest[:2]}/{digest}{path.suffix.lower()}"
+        target = self.blob_path(blob)
+        if target.exists():
+            if not keep:
+                path.unlink()
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(f"{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+            if keep:
+                shutil.copyfile(path, tmp_path)
+            else:
+                shutil.move(str(path), tmp_path)
+            os.replace(tmp_path, target)
+        os.utime(target)  # A fresh mtime keeps gc from collecting it before the manifest below is written
+        self._record(chapter_id, stage, blob, target.stat().st_size)
+        return target
+
+    def put_bytes(self, chapter_id, stage: str, data: bytes, suffix: str) -> Path:
+        path = self.staging_path(f"{stage}{suffix}")
+        path.write_bytes(data)
+        return self.put_file(chapter_id, stage, path)
+
+    def put_text(self, chapter_id, stage: str, text: str, suffix: str = ".txt") -> Path:
+        return self.put_bytes(chapter_id, stage, text.encode("utf-8"), suffix)
+
+    @contextmanager
+    def _locked(self, manifest_path: Path):
+        """
+        Serializes read-modify-writes of the manifests in one shard, across
+        threads and processes (the API and main_ai can record the same chapter).
+        """
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(manifest_path.parent / ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_manifest(self, path: Path, manifest: dict):
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _record(self, chapter_id, stage: str, blob: str, size: int):
+        path = self.manifest_path(chapter_id)
+        with self._locked(path):
+            manifest = self.manifest(chapter_id) or {"chapter_id": str(chapter_id), "created_at": _now(), "stages": {}}
+            previous = manifest["stages"].get(stage) or {}
+            now = _now()
+            manifest["stages"][stage] = {
+                "blob": blob,
+                "size": size,
+                "created_at": previous.get("created_at", now) if previous.get("blob") == blob else now,
+                "updated_at": now,
+            }
+            manifest["updated_at"] = now
+            self._write_manifest(path, manifest)
+
+    # === Reads ===
+    def manifest(self, chapter_id) -> dict:
+        """The chapter's manifest, or None if nothing was stored for it."""
+        try:
+            with open(self.manifest_path(chapter_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def path(self, chapter_id, stage: str) -> Path:
+        """Blob path of one stage's output, or None if it was never stored (or was collected)."""
+        entry = (self.manifest(chapter_id) or {}).get("stages", {}).get(stage)
+        if not entry:
+            return None
+        path = self.blob_path(entry["blob"])
+        return path if path.exists() else None
+
+    def read_text(self, chapter_id, stage: str) -> str:
+        path = self.path(chapter_id, stage)
+        if path is None:
+            raise FileNotFoundError(f"No {stage} stored for chapter {chapter_id}")
+        return path.read_text(encoding="utf-8")
+
+    def urls(self, chapter_id) -> dict:
+        """Stage -> URL of its output under the API's /artifacts mount (empty if nothing is stored)."""
+        stages = (self.manifest(chapter_id) or {}).get("stages", {})
+        return {stage: f"{ARTIFACT_URL_PREFIX}/{entry['blob']}" for stage, entry in stages.items()}
+
+    # === Garbage collection ===
+    def _scan(self, directory: Path, suffix: str):
+        for shard in os.scandir(directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.is_file() and entry.name.endswith(suffix):
+                        yield entry
+
+    def _drop_stages(self, path: str, stages: dict) -> set:
+        """Removes `stages` (stage -> blob) from the manifest at `path` unless a writer replaced them since; returns those removed."""
+        path = Path(path)
+        with self._locked(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                return set()
+            dropped = {stage for stage, blob in stages.items() if manifest["stages"].get(stage, {}).get("blob") == blob}
+            if dropped:
+                for stage in dropped:
+                    del manifest["stages"][stage]
+                self._write_manifest(path, manifest)
+        return dropped
+
+    def _evict(self, path: str, updated_at: str) -> bool:
+        """Deletes a chapter's manifest unless it was updated since gc read it."""
+        path = Path(path)
+        with self._locked(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    if json.load(f).get("updated_at", "") != updated_at:
+                        return False
+            except (OSError, ValueError):
+                return False
+            os.remove(path)
+        return True
+
+    def gc(self, quota_bytes: int = None, grace_seconds: float = ARTIFACT_GC_GRACE_SECONDS, dry_run: bool = False,
+           evict: bool = False) -> dict:
+        """
+        Deletes blobs no manifest references and stale staging files. Then,
+        while the referenced blobs exceed `quota_bytes`, drops the
+        REPRODUCIBLE_STAGES of the least recently updated chapters, and the
+        blobs only they used. Only with `evict` does it go on to delete whole
+        chapters, texts and approvals included, oldest first.
+        """
+        if quota_bytes is None and ARTIFACT_QUOTA_MB > 0:
+            quota_bytes = int(ARTIFACT_QUOTA_MB * 1024 * 1024)
+        cutoff = time.time() - grace_seconds
+        stats = {"manifests": 0, "blobs": 0, "removed_blobs": 0, "dropped_stages": 0, "evicted_chapters": 0,
+                 "freed_bytes": 0, "bytes": 0}
+
+        manifests, refs = [], {}
+        for entry in self._scan(self.manifest_dir, ".json"):
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            stages = {stage: record["blob"] for stage, record in manifest.get("stages", {}).items()}
+            manifests.append((manifest.get("updated_at", ""), entry.path, stages))
+            for blob in set(stages.values()):
+                refs[blob] = refs.get(blob, 0) + 1
+        stats["manifests"] = len(manifests)
+
+        sizes = {}
+        for entry in self._scan(self.blob_dir, ""):
+            blob = f"{os.path.basename(os.path.dirname(entry.path))}/{entry.name}"
+            stat = entry.stat()
+            if blob in refs:
+                sizes[blob] = stat.st_size
+            elif stat.st_mtime < cutoff:
+                stats["removed_blobs"] += 1
+                stats["freed_bytes"] += stat.st_size
+                if not dry_run:
+                    os.remove(entry.path)
+        for entry in os.scandir(self.staging_dir):
+            if entry.is_file() and entry.stat().st_mtime < cutoff and not dry_run:
+                os.remove(entry.path)
+
+        total = sum(sizes.values())
+
+        def release(blobs):
+            nonlocal total
+            for blob in blobs:
+                refs[blob] -= 1
+                if refs[blob] == 0 and blob in sizes:
+                    size = sizes.pop(blob)
+                    total -= size
+                    stats["removed_blobs"] += 1
+                    stats["freed_bytes"] += size
+                    if not dry_run:
+                        os.remove(self.blob_path(blob))
+
+        if quota_bytes is not None:
+            for _, path, stages in sorted(manifests):
+                if total <= quota_bytes:
+                    break
+                reproducible = {stage: blob for stage, blob in stages.items() if stage in REPRODUCIBLE_STAGES}
+                dropped = set(reproducible) if dry_run else self._drop_stages(path, reproducible)
+                stats["dropped_stages"] += len(dropped)
+                release({reproducible[stage] for stage in dropped} - {stages[s] for s in stages if s not in dropped})
+                for stage in dropped:
+                    del stages[stage]
+        if quota_bytes is not None and evict:
+            for updated_at, path, stages in sorted(manifests):
+                if total <= quota_bytes:
+                    break
+                if not stages or not (dry_run or self._evict(path, updated_at)):
+                    continue
+                stats["evicted_chapters"] += 1
+                release(set(stages.values()))
+        stats["blobs"] = len(sizes)
+        stats["bytes"] = total
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chapter artifact store maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc = sub.add_parser("gc", help="delete unreferenced blobs, then old PDFs, narration and screenshots over the quota")
+    gc.add_argument("--quota-mb", type=float, default=ARTIFACT_QUOTA_MB or None)
+    gc.add_argument("--grace-seconds", type=float, default=ARTIFACT_GC_GRACE_SECONDS)
+    gc.add_argument("--evict", action="store_true", help="still over the quota: delete whole chapters, approved texts included")
+    gc.add_argument("--dry-run", action="store_true")
+    show = sub.add_parser("show", help="print a chapter's manifest")
+    show.add_argument("chapter_id")
+    args = parser.parse_args()
+
+    store = get_artifact_store()
+    if args.command == "gc":
+        quota = int(args.quota_mb * 1024 * 1024) if args.quota_mb else None
+        stats = store.gc(quota_bytes=quota, grace_seconds=args.grace_seconds, dry_run=args.dry_run, evict=args.evict)
+        print(f"🧹 {'Would remove' if args.dry_run else 'Removed'} {stats['removed_blobs']} blob(s), "
+              f"{stats['freed_bytes'] / 1e6:.1f} MB, dropping {stats['dropped_stages']} regenerable output(s) and "
+              f"evicting {stats['evicted_chapters']} chapter(s); "
+              f"{stats['blobs']} blob(s) ({stats['bytes'] / 1e6:.1f} MB) kept for {stats['manifests'] - stats['evicted_chapters']} chapter(s).")
+        if quota and stats["bytes"] > quota and not args.evict:
+            print("⚠️ Still over the quota; only --evict deletes chapter texts.")
+    if args.command == "show":
+        manifest = store.manifest(args.chapter_id)
+        if manifest is None:
+            raise SystemExit(f"No artifacts stored for chapter {args.chapter_id}")
+        print(json.dumps(manifest, indent=2, ensure_ascii=False))
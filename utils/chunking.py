@@ -0,0 +1,226 @@
+import os
+import re
+import queue
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def token_spans(text: str, tokenizer=None):
+    """
+    Character (start, end) spans of the tokens in `text`.
+    Uses a Hugging Face fast tokenizer when given, otherwise whitespace words.
+    """
+    if tokenizer is not None:
+        encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return [(start, end) for start, end in encoded["offset_mapping"] if end > start]
+    return [m.span() for m in _WORD_RE.finditer(text)]
+
+
+def split_passages(text: str, max_tokens: int = 200, overlap: int = 40, tokenizer=None):
+    """
+    Splits text into overlapping passages of at most `max_tokens` tokens.
+
+    Returns dicts with the passage `text` and its `start`/`end` offsets in
+    the original string, so passages can be stitched back together exactly.
+    """
+    if overlap >= max_tokens:
+        raise ValueError("overlap must be smaller than max_tokens")
+
+    spans = token_spans(text, tokenizer)
+    if not spans:
+        return []
+
+    passages = []
+    step = max_tokens - overlap
+    for first in range(0, len(spans), step):
+        last = min(first + max_tokens, len(spans)) - 1
+        start, end = spans[first][0], spans[last][1]
+        passages.append({"text": text[start:end], "start": start, "end": end})
+        if last == len(spans) - 1:
+            break
+    return passages
+
+
+def join_passages(passages):
+    """Rebuilds the original text span from passages produced by split_passages()."""
+    text = ""
+    covered = None
+    for p in sorted(passages, key=lambda p: p["start"]):
+        if covered is None:
+            text = p["text"]
+        elif p["end"] > covered:
+            # Keep the separator between the previous passage and this one
+            gap = max(p["start"] - covered, 0)
+            text += " " * gap + p["text"][max(covered - p["start"], 0):]
+        covered = p["end"] if covered is None else max(covered, p["end"])
+    return text
+
+
+# === Paragraph-aligned segments for LLM stages ===
+CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "2500"))  # Leaves room for the 4096-token completion
+CHUNK_CONCURRENCY = int(os.getenv("LLM_CHUNK_CONCURRENCY", "4"))
+CHUNK_OVERLAP_CHARS = int(os.getenv("LLM_CHUNK_OVERLAP_CHARS", "400"))
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token for English prose)."""
+    return (len(text) + 3) // 4
+
+
+def split_paragraphs(text: str):
+    paragraphs = [p.strip() for p in _PARAGRAPH_RE.split(text)]
+    if len(paragraphs) == 1:
+        # Scraped pages sometimes separate paragraphs with single newlines
+        paragraphs = [p.strip() for p in text.split("\n")]
+    return [p for p in paragraphs if p]
+
+
+def _split_oversized(paragraph: str, max_tokens: int):
+    """Breaks one paragraph that exceeds the budget at sentence boundaries."""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_RE.split(paragraph):
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_segments(text: str, max_tokens: int = CHUNK_TOKENS):
+    """
+    Packs whole paragraphs into segments of at most `max_tokens` estimated
+    tokens. Only a paragraph that is larger than the budget on its own is
+    split, at sentence boundaries. Text that fits in one segment is returned
+    exactly as given, so its prompt (and cache key) is the same as before
+    segmenting existed.
+    """
+    segments, current, current_tokens = [], [], 0
+    for paragraph in split_paragraphs(text):
+        for piece in (_split_oversized(paragraph, max_tokens) if estimate_tokens(paragraph) > max_tokens else [paragraph]):
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                segments.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        segments.append("\n\n".join(current))
+    if len(segments) == 1:
+        return [text]
+    return segments
+
+
+def segment_contexts(segments, overlap_chars: int = CHUNK_OVERLAP_CHARS):
+    """The tail of each segment's predecessor, handed to the LLM as read-only context."""
+    contexts = [""]
+    for previous in segments[:-1]:
+        tail = previous[-overlap_chars:] if overlap_chars > 0 else ""
+        # Start the context at a word boundary
+        if len(previous) > overlap_chars and " " in tail:
+            tail = tail[tail.index(" ") + 1:]
+        contexts.append(tail)
+    return contexts
+
+
+def with_context(prompt: str, context: str) -> str:
+    """Prefixes a segment prompt with the end of the previous segment, for continuity."""
+    if not context:
+        return prompt
+    return (
+        "For continuity, the previous section ends like this (context only, do not include it in your answer):\n\n"
+        f"{context}\n\n---\n\n{prompt}"
+    )
+
+
+def map_segments(fn, text: str, max_tokens: int = CHUNK_TOKENS, concurrency: int = CHUNK_CONCURRENCY, overlap_chars: int = CHUNK_OVERLAP_CHARS, joiner: str = "\n\n"):
+    """
+    Runs `fn(segment, context)` over the paragraph-aligned segments of
+    `text` with at most `concurrency` calls in flight, and stitches the
+    results back together in order. Short texts are a single call.
+    """
+    segments = split_segments(text, max_tokens) or [text]
+    contexts = segment_contexts(segments, overlap_chars)
+    if len(segments) == 1:
+        return fn(segments[0], "")
+    # Each call runs in a copy of the caller's context, so metrics land on the caller's trace and stage
+    runs = [contextvars.copy_context().run for _ in segments]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda run, segment, context: run(fn, segment, context), runs, segments, contexts))
+    return joiner.join(r.strip() for r in results)
+
+
+def stream_segments(stream_fn, text: str, max_tokens: int = CHUNK_TOKENS, concurrency: int = CHUNK_CONCURRENCY, overlap_chars: int = CHUNK_OVERLAP_CHARS, joiner: str = "\n\n"):
+    """
+    Streaming counterpart of map_segments(): every segment is generated
+    concurrently, but deltas are yielded strictly in order, so the first
+    segment streams live while later ones buffer.
+    """
+    segments = split_segments(text, max_tokens) or [text]
+    contexts = segment_contexts(segments, overlap_chars)
+    if len(segments) == 1:
+        yield from stream_fn(segments[0], "")
+        return
+
+    done = object()
+    queues = [queue.Queue() for _ in segments]
+    stop = threading.Event()  # Set when the consumer goes away, e.g. an SSE client disconnects
+
+    def produce(i):
+        stream = None
+        try:
+            stream = stream_fn(segments[i], contexts[i])
+            for delta in stream:
+                if stop.is_set():
+                    return
+                queues[i].put(delta)
+            queues[i].put(done)
+        except Exception as e:
+            queues[i].put(e)
+        finally:
+            if stop.is_set() and hasattr(stream, "close"):
+                stream.close()  # Ends the underlying LLM stream instead of reading it to the end
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for i in range(len(segments)):
+            executor.submit(contextvars.copy_context().run, produce, i)
+        for i, q in enumerate(queues):
+            if i:
+                yield joiner
+            while True:
+                item = q.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        # On close or error, producers stop at their next delta and queued segments never start
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def amap_segments(afn, text: str, max_tokens: int = CHUNK_TOKENS, concurrency: int = CHUNK_CONCURRENCY, overlap_chars: int = CHUNK_OVERLAP_CHARS, joiner: str = "\n\n"):
+    """asyncio counterpart of map_segments() for coroutine stage functions."""
+    segments = split_segments(text, max_tokens) or [text]
+    contexts = segment_contexts(segments, overlap_chars)
+    if len(segments) == 1:
+        return await afn(segments[0], "")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(segment, context):
+        async with semaphore:
+            return await afn(segment, context)
+
+    results = await asyncio.gather(*(bounded(s, c) for s, c in zip(segments, contexts)))
+    return joiner.join(r.strip() for r in results)
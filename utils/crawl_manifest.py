@@ -0,0 +1,154 @@
+# utils/crawl_manifest.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+MANIFEST_DIR = os.getenv("CRAWL_MANIFEST_DIR", "manifests")
+
+# Stages a crawled chapter goes through, in order; a chapter is complete when all are done
+CRAWL_STAGES = ("scrape", "rewrite", "approve", "embed")
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def book_key(start_url: str) -> str:
+    """
+    Filesystem-safe name for the book a chapter URL belongs to: the wiki
+    path without its last segment (/wiki/Book/Part_1/Chapter_1 -> Book_Part_1).
+    """
+    parsed = urlparse(start_url)
+    parts = [p for p in unquote(parsed.path).split("/") if p and p != "wiki"]
+    name = "_".join(parts[:-1]) or (parts[0] if parts else parsed.netloc)
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") or "book"
+
+
+class CrawlManifest:
+    """
+    Per-book checkpoint of a main_ai.py crawl, saved as JSON after every
+    change (write to a temp file, then rename). Each chapter records its URL,
+    title, scraped-content hash, next link, and the stages it finished with
+    their artifact paths, so a rerun can resume and skip unchanged chapters.
+    """
+
+    def __init__(self, path, start_url: str = None):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"start_url": start_url, "created_at": _now(), "updated_at": _now(), "chapters": {}}
+        if start_url and not self.data.get("start_url"):
+            self.data["start_url"] = start_url
+
+    @classmethod
+    def for_book(cls, start_url: str, manifest_dir: str = None):
+        return cls(Path(manifest_dir or MANIFEST_DIR) / f"{book_key(start_url)}.json", start_url)
+
+    @property
+    def start_url(self):
+        return self.data.get("start_url")
+
+    def _save_locked(self):
+        self.data["updated_at"] = _now()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def chapter(self, chapter_num: int) -> dict:
+        """A copy of one chapter's record, or None if it was never scraped."""
+        with self._lock:
+            record = self.data["chapters"].get(str(chapter_num))
+            return json.loads(json.dumps(record)) if record else None
+
+    def chapter_nums(self):
+        with self._lock:
+            return sorted(int(n) for n in self.data["chapters"])
+
+    def record_scrape(self, chapter_num: int, url: str, title: str, text: str, next_url: str, raw_path: str) -> bool:
+        """
+        Records a scraped chapter and returns True if its content is new or
+        changed. A changed chapter loses its later stages so they run again.
+        """
+        digest = content_hash(text)
+        with self._lock:
+            record = self.data["chapters"].get(str(chapter_num))
+            changed = record is None or record.get("url") != url or record.get("content_hash") != digest
+            if changed:
+                record = {"url": url, "stages": {}}
+            record.update(title=title, content_hash=digest, next_url=next_url)
+            record["stages"]["scrape"] = {"finished_at": _now(), "artifacts": {"raw_text": str(raw_path)}}
+            self.data["chapters"][str(chapter_num)] = record
+            self._save_locked()
+        return changed
+
+    def complete(self, chapter_num: int, stage: str, artifacts: dict = None, **details):
+        with self._lock:
+            record = self.data["chapters"][str(chapter_num)]
+            record["stages"][stage] = {
+                "finished_at": _now(),
+                "artifacts": {k: str(v) for k, v in (artifacts or {}).items()},
+                **details,
+            }
+            self._save_locked()
+
+    def completed(self, chapter_num: int, stage: str) -> bool:
+        """True if the stage finished and every artifact it recorded still exists."""
+        with self._lock:
+            record = self.data["chapters"].get(str(chapter_num))
+            done = record and record["stages"].get(stage)
+            return bool(done) and all(Path(p).exists() for p in done["artifacts"].values())
+
+    def stage(self, chapter_num: int, stage: str) -> dict:
+        record = self.chapter(chapter_num)
+        return (record or {}).get("stages", {}).get(stage)
+
+    def is_complete(self, chapter_num: int) -> bool:
+        return all(self.completed(chapter_num, stage) for stage in CRAWL_STAGES)
+
+    def resume_point(self):
+        """
+        (chapter number, URL) of the first chapter that still has work to do;
+        chapters before it are complete. When every recorded chapter is
+        complete, the last one is returned so a rerun can pick up a new "→" link.
+        """
+        chapter_num = 1
+        while True:
+            record = self.chapter(chapter_num)
+            if record is None:
+                if chapter_num == 1:
+                    return 1, self.start_url
+                return chapter_num - 1, self.chapter(chapter_num - 1)["url"]
+            if not self.is_complete(chapter_num):
+                return chapter_num, record["url"]
+            chapter_num += 1
+
+    def approved_chapters(self):
+        """Chapter number, title and final text path of every approved chapter, in book order."""
+        chapters = []
+        for chapter_num in self.chapter_nums():
+            approved = self.stage(chapter_num, "approve")
+            if approved and Path(approved["artifacts"].get("final_text", "")).exists():
+                record = self.chapter(chapter_num)
+                chapters.append({
+                    "chapter_num": chapter_num,
+                    "title": approved.get("title") or record.get("title", ""),
+                    "path": approved["artifacts"]["final_text"],
+                })
+        return chapters
@@ -0,0 +1,227 @@
+# utils/job_queue.py
+
+import json
+import sqlite3
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# === Job states ===
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+DEFAULT_DB_PATH = "jobs/jobs.db"
+
+
+def _now():
+    return datetime.utcnow().isoformat() + "Z"
+
+
+class JobStore:
+    """
+    SQLite-backed persistence for pipeline jobs, so queued work and
+    per-stage progress survive an API restart.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = str(db_path)
+        if self.db_path != ":memory:":
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                stages TEXT NOT NULL DEFAULT '{}',
+                artifacts TEXT NOT NULL DEFAULT '{}',
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _row_to_job(self, row):
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "payload": json.loads(row["payload"]),
+            "stages": json.loads(row["stages"]),
+            "artifacts": json.loads(row["artifacts"]),
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def create(self, kind: str, payload: dict) -> dict:
+        job_id = uuid.uuid4().hex[:12]
+        now = _now()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(payload), now, now),
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def list_by_status(self, *statuses):
+        marks = ",".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({marks}) ORDER BY created_at", statuses
+            ).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def count_by_status(self, *statuses) -> dict:
+        marks = ",".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*) FROM jobs WHERE status IN ({marks}) GROUP BY status", statuses
+            ).fetchall()
+        return {**{s: 0 for s in statuses}, **{row[0]: row[1] for row in rows}}
+
+    def set_status(self, job_id: str, status: str, error: str = None, bump_attempts: bool = False):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, attempts = attempts + ?, updated_at = ? WHERE id = ?",
+                (status, error, 1 if bump_attempts else 0, _now(), job_id),
+            )
+            self._conn.commit()
+
+    def update_stage(self, job_id: str, stage: str, **fields):
+        """Merge `fields` into the record of one stage."""
+        with self._lock:
+            row = self._conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            stages = json.loads(row["stages"]) if row else {}
+            stages.setdefault(stage, {}).update(fields)
+            self._conn.execute(
+                "UPDATE jobs SET stages = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(stages), _now(), job_id),
+            )
+            self._conn.commit()
+
+    def add_artifact(self, job_id: str, name: str, path: str):
+        with self._lock:
+            row = self._conn.execute("SELECT artifacts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            artifacts = json.loads(row["artifacts"]) if row else {}
+            artifacts[name] = str(path)
+            self._conn.execute(
+                "UPDATE jobs SET artifacts = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(artifacts), _now(), job_id),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobProgress:
+    """
+    Handed to a job handler so it can report per-stage progress and
+    artifact paths while it runs.
+    """
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def completed(self, stage: str) -> bool:
+        """True if `stage` already finished in a previous attempt."""
+        job = self.store.get(self.job_id)
+        return job["stages"].get(stage, {}).get("status") == SUCCEEDED
+
+    def artifact(self, name: str, path=None):
+        """Record an artifact path, or look one up when `path` is omitted."""
+        if path is None:
+            return self.store.get(self.job_id)["artifacts"].get(name)
+        self.store.add_artifact(self.job_id, name, path)
+        return str(path)
+
+    @contextmanager
+    def stage(self, name: str):
+        self.store.update_stage(self.job_id, name, status=RUNNING, started_at=_now(), error=None)
+        try:
+            yield
+        except Exception as e:
+            self.store.update_stage(self.job_id, name, status=FAILED, finished_at=_now(), error=str(e))
+            raise
+        self.store.update_stage(self.job_id, name, status=SUCCEEDED, finished_at=_now())
+
+
+class JobQueue:
+    """
+    Bounded worker pool that runs persisted jobs in the background.
+
+    `handler(payload, progress)` does the actual work; whatever it raises
+    marks the job as failed, and the job can be retried later.
+    """
+
+    def __init__(self, store: JobStore, handler, max_workers: int = 2, kind: str = "job"):
+        self.store = store
+        self.handler = handler
+        self.kind = kind
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{kind}-worker")
+
+    def submit(self, payload: dict) -> dict:
+        job = self.store.create(self.kind, payload)
+        self._executor.submit(self._run, job["job_id"])
+        return job
+
+    def retry(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        if job["status"] in (QUEUED, RUNNING):
+            return job
+        self.store.set_status(job_id, QUEUED)
+        self._executor.submit(self._run, job_id)
+        return self.store.get(job_id)
+
+    def resume(self) -> int:
+        """Re-enqueue jobs left queued or running when the process last stopped."""
+        pending = self.store.list_by_status(QUEUED, RUNNING)
+        for job in pending:
+            self.store.set_status(job["job_id"], QUEUED)
+            self._executor.submit(self._run, job["job_id"])
+        return len(pending)
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        self.store.set_status(job_id, RUNNING, bump_attempts=True)
+        try:
+            self.handler(job["payload"], JobProgress(self.store, job_id))
+        except Exception as e:
+            traceback.print_exc()
+            self.store.set_status(job_id, FAILED, error=str(e))
+            return
+        self.store.set_status(job_id, SUCCEEDED)
+
+    def shutdown(self, wait: bool = True):
+        # Jobs that never started stay queued in the store and are picked up by resume()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,287 @@
+# utils/metrics.py
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "logs/traces.jsonl")
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (64, 256, 512, 1024, 2048, 4096, 8192)
+
+trace_logger = logging.getLogger("pipeline.trace")
+
+
+# === Minimal Prometheus text-format metrics ===
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: dict):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [(dict(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """Counts the block as in flight while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=STAGE_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            counts = tuple(n + (value <= bound) for n, bound in zip(counts, self.buckets))
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            return self._values.get(self._key(labels), (None, 0.0, 0))[2]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self._samples():
+            for bound, n in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {n}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Every registered metric in the Prometheus text exposition format."""
+        return "\n".join(line for m in self._metrics for line in m.render()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "Wall time of one pipeline stage.", ["stage"])
+STAGE_FAILURES = Counter("pipeline_stage_failures_total", "Pipeline stages that raised.", ["stage"])
+LLM_REQUESTS = Counter("llm_requests_total", "LLM completions requested, by whether the cache answered.", ["model", "stage", "cached"])
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM provider.", ["model", "stage", "kind"])
+LLM_RETRIES = Counter("llm_retries_total", "LLM requests retried, by model and HTTP status or error.", ["model", "reason"])
+LLM_COMPLETION_TOKENS = Histogram("llm_completion_tokens", "Completion tokens per LLM call.", ["stage"], buckets=TOKEN_BUCKETS)
+JOBS_IN_FLIGHT = Gauge("pipeline_jobs", "Background jobs by status.", ["status"])
+SEARCH_REQUESTS = Counter("search_requests_total", "Semantic searches, by whether the result cache answered.", ["cached"])
+REQUESTS_IN_FLIGHT = Gauge("pipeline_requests_in_flight", "Synchronous pipeline requests being served.", ["endpoint"])
+
+
+# === Per-request traces ===
+_current_trace = contextvars.ContextVar("pipeline_trace", default=None)
+_current_stage = contextvars.ContextVar("pipeline_stage", default="other")
+_trace_file_lock = threading.Lock()
+
+
+class Trace:
+    """Stage timings and token usage of one request or job, logged as a JSON line when it ends."""
+
+    def __init__(self, kind: str, **fields):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.fields = fields
+        self.started_at = datetime.utcnow().isoformat() + "Z"
+        self.stages = {}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float, error: str = None):
+        with self._lock:
+            self.stages[stage] = {"seconds": round(seconds, 4), **({"error": error} if error else {})}
+
+    def add_llm_call(self, prompt_tokens: int, completion_tokens: int, cached: bool):
+        with self._lock:
+            self.llm_calls += 1
+            self.cache_hits += int(cached)
+            self.tokens["prompt"] += prompt_tokens
+            self.tokens["completion"] += completion_tokens
+
+    def to_dict(self, seconds: float, status: str, error: str = None) -> dict:
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "kind": self.kind,
+                **self.fields,
+                "status": status,
+                "error": error,
+                "started_at": self.started_at,
+                "seconds": round(seconds, 4),
+                "stages": dict(self.stages),
+                "tokens": dict(self.tokens),
+                "llm_calls": self.llm_calls,
+                "cache_hits": self.cache_hits,
+            }
+
+
+def _write_trace(record: dict):
+    line = json.dumps(record, ensure_ascii=False)
+    trace_logger.info(line)
+    if not TRACE_LOG_PATH:
+        return
+    Path(TRACE_LOG_PATH).parent.mkdir(parents=True, exist_ok=True)
+    with _trace_file_lock, open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+@contextmanager
+def start_trace(kind: str, **fields):
+    """Collects every stage_timer() and LLM call inside the block into one JSON trace line."""
+    trace = Trace(kind, **fields)
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    except Exception as e:
+        _write_trace(trace.to_dict(time.perf_counter() - started, "failed", str(e)))
+        raise
+    else:
+        _write_trace(trace.to_dict(time.perf_counter() - started, "succeeded"))
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Times one stage into the histogram and the current trace, and labels the LLM calls made inside it."""
+    token = _current_stage.set(stage)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        STAGE_FAILURES.inc(stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(stage, seconds, str(e))
+        raise
+    else:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(stage, seconds)
+    finally:
+        _current_stage.reset(token)
+
+
+def record_llm_usage(model: str, usage=None, cached: bool = False):
+    """Counts one LLM call; `usage` is the provider's usage object or dict (None on cache hits)."""
+    if isinstance(usage, dict):
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    else:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+    stage = _current_stage.get()
+    LLM_REQUESTS.inc(model=model, stage=stage, cached=str(cached).lower())
+    if not cached:
+        LLM_TOKENS.inc(prompt_tokens, model=model, stage=stage, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, stage=stage, kind="completion")
+        LLM_COMPLETION_TOKENS.observe(completion_tokens, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_llm_call(prompt_tokens, completion_tokens, cached)
+
+
+def run_in_context(iterator):
+    """
+    Drives an iterator inside one persistent context. Streaming responses
+    advance generators from a different thread on every step, which would
+    otherwise lose a trace opened inside the generator.
+    """
+    context = contextvars.copy_context()
+    try:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        if hasattr(iterator, "close"):
+            context.run(iterator.close)
@@ -1,24 +1,559 @@
-from fpdf import FPDF
+# utils/pdf_utils.py
+
+import hashlib
+import io
+import json
+import multiprocessing
 import os
+import re
+import tempfile
+import threading
+import time
+import types
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, FloatObject, IndirectObject, NameObject, NumberObject, PdfObject, StreamObject, TextStringObject
+)
+
+# Path to DejaVuSans.ttf inside the utils/fonts directory
+FONT_DIR = os.path.join(os.path.dirname(__file__), "fonts")
+FONT_PATH = os.path.join(FONT_DIR, "DejaVuSans.ttf")
+FONT_FAMILY = "DejaVu"
+FONT_SUBSET_CACHE_SIZE = int(os.getenv("PDF_FONT_SUBSET_CACHE_SIZE", "32"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+
+# Part of every cached chapter's key; bump it when render_book_chapter's layout changes
+LAYOUT_VERSION = "1"
+
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+
+
+# === Process-level font cache ===
+_font_lock = threading.Lock()
+_font_metrics = {}  # (family, path) -> (fonts entry, font_files entry) from the first add_font()
+_subsets = OrderedDict()  # (ttf path, code points) -> (font stream, codeToGlyph, maxUni)
+
+
+class GlyphSubset(list):
+    """
+    fpdf's list of the code points a font has drawn, kept free of duplicates.
+    fpdf 1.7.2 appends every character it writes, and its font-width table
+    tests `cid not in subset` for each code point up to the highest one used,
+    so one curly quote in a long chapter used to cost seconds.
+    """
+
+    def __init__(self, code_points=()):
+        super().__init__()
+        self._seen = set()
+        for code_point in code_points:
+            self.append(code_point)
+
+    def append(self, code_point):
+        if code_point not in self._seen:
+            self._seen.add(code_point)
+            super().append(code_point)
+
+    def __contains__(self, code_point):
+        return code_point in self._seen
+
+    def __delitem__(self, index):
+        removed = self[index] if isinstance(index, slice) else [self[index]]
+        super().__delitem__(index)
+        self._seen.difference_update(removed)
+
+
+class SubsetCachingTTFontFile(TTFontFile):
+    """
+    TTFontFile whose makeSubset() is memoised per process. Every FPDF
+    output re-reads and subsets the whole TTF; chapters of ordinary prose
+    mostly use the same characters, so the subset is usually already built.
+    """
+
+    def makeSubset(self, file, subset):
+        key = (file, frozenset(subset))
+        with _font_lock:
+            cached = _subsets.get(key)
+            if cached is not None:
+                _subsets.move_to_end(key)
+        if cached is None:
+            stream = super().makeSubset(file, subset)
+            cached = (stream, dict(self.codeToGlyph), self.maxUni)
+            with _font_lock:
+                _subsets[key] = cached
+                while len(_subsets) > FONT_SUBSET_CACHE_SIZE:
+                    _subsets.popitem(last=False)
+        stream, code_to_glyph, self.maxUni = cached
+        self.codeToGlyph = dict(code_to_glyph)
+        return stream
 
-def generate_pdf(content: str, title: str, output_path: str):
-    pdf = FPDF()
-    pdf.add_page()
 
-    # Path to DejaVuSans.ttf inside the utils/fonts directory
-    font_dir = os.path.join(os.path.dirname(__file__), "fonts")
-    font_path = os.path.join(font_dir, "DejaVuSans.ttf")
+def _with_globals(function, **overrides):
+    """A copy of `function` that sees `overrides` in place of its module's globals."""
+    return types.FunctionType(function.__code__, {**function.__globals__, **overrides}, function.__name__,
+                              function.__defaults__, function.__closure__)
 
-    # Add and set Unicode-compatible font
-    pdf.add_font("DejaVu", "", font_path, uni=True)
-    pdf.set_font("DejaVu", "", 14)
+
+def add_cached_font(pdf: FPDF, family: str = FONT_FAMILY, font_path: str = FONT_PATH):
+    """
+    Registers a Unicode TTF on `pdf`. The metrics are loaded once per process
+    and shared; each document only gets its own glyph subset list.
+    """
+    fontkey = family.lower()
+    if fontkey in pdf.fonts:
+        return
+    with _font_lock:
+        cached = _font_metrics.get((fontkey, font_path))
+    if cached is None:
+        loader = FPDF()
+        loader.add_font(family, "", font_path, uni=True)
+        # The cached metrics (.pkl) store the absolute font path of the machine that built them
+        loader.fonts[fontkey]["ttffile"] = font_path
+        cached = (loader.fonts[fontkey], loader.font_files[fontkey])
+        with _font_lock:
+            _font_metrics[(fontkey, font_path)] = cached
+    font, font_file = cached
+    pdf.fonts[fontkey] = {
+        **font,
+        "i": len(pdf.fonts) + 1,
+        "subset": GlyphSubset(range(0, 57 if hasattr(pdf, "str_alias_nb_pages") else 32)),
+    }
+    pdf.font_files[fontkey] = dict(font_file)
+    pdf.font_files[font_path] = {"type": "TTF"}
+
+
+class ChapterPDF(FPDF):
+    """FPDF with the cached DejaVu font and a fast path for multi_cell's per-character width lookups."""
+
+    # fpdf 1.7.2 looks TTFontFile up as a module global when it embeds fonts; only this class's copy gets the cached one
+    _putfonts = _with_globals(FPDF._putfonts, TTFontFile=SubsetCachingTTFontFile)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        add_cached_font(self)
+
+    def get_string_width(self, s):
+        if self.unifontsubset and len(s) == 1:
+            cw = self.current_font["cw"]
+            char = ord(s)
+            width = cw[char] if len(cw) > char else (self.current_font["desc"]["MissingWidth"] or 500)
+            return width * self.font_size / 1000.0
+        return super().get_string_width(s)
+
+
+def pdf_text_string(text: str) -> str:
+    """
+    `text` as fpdf 1.7.2 can store it in the document info: the buffer is
+    written as latin-1, so anything else goes in as UTF-16BE with a BOM.
+    """
+    try:
+        text.encode("latin-1")
+        return text
+    except UnicodeEncodeError:
+        return "\ufeff".encode("utf-16-be").decode("latin-1") + text.encode("utf-16-be").decode("latin-1")
+
+
+# === Layout ===
+def paragraphs(content: str):
+    """Blank-line separated paragraphs, with their lines stripped (single line breaks are kept)."""
+    for block in _PARAGRAPH_RE.split(content.replace("\r", "")):
+        lines = [line.strip() for line in block.split("\n")]
+        text = "\n".join(line for line in lines if line)
+        if text:
+            yield text
+
+
+def write_paragraphs(pdf: FPDF, content: str, line_height: float):
+    """One multi_cell per paragraph, with a blank line between paragraphs."""
+    for i, paragraph in enumerate(paragraphs(content)):
+        if i:
+            pdf.ln(line_height)
+        pdf.multi_cell(0, line_height, paragraph)
+
+
+def generate_pdf(content: str, title: str, output_path: str):
+    pdf = ChapterPDF()
+    pdf.add_page()
+    pdf.set_font(FONT_FAMILY, "", 14)
 
     # Set PDF title
-    pdf.set_title(title)
+    pdf.set_title(pdf_text_string(title))
 
-    # Write content line by line
-    for line in content.split("\n"):
-        pdf.multi_cell(0, 10, line.strip())
+    write_paragraphs(pdf, content, 10)
 
     # Output PDF
     pdf.output(output_path)
+    return output_path
+
+
+# === Whole-book builder ===
+def render_book_chapter(title: str, content: str, output_path: str, heading_size: int = 14, body_size: int = 11):
+    """One book chapter as its own PDF: a heading, then the text, starting on a fresh page."""
+    pdf = ChapterPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font(FONT_FAMILY, size=heading_size)
+    pdf.multi_cell(0, 10, title)
+    pdf.ln(10)
+    pdf.set_font(FONT_FAMILY, size=body_size)
+    write_paragraphs(pdf, content, 8)
+    pdf.output(output_path)
+    return output_path
+
+
+class _Ref(PdfObject):
+    """An indirect reference renumbered for the output file."""
+
+    def __init__(self, num: int):
+        self.num = num
+
+    def write_to_stream(self, stream, encryption_key=None):
+        stream.write(f"{self.num} 0 R".encode("ascii"))
+
+
+class StreamingPdfWriter:
+    """
+    Concatenates PDFs into one file without holding the result in memory.
+    Each appended document's objects are renumbered and written out right
+    away; only byte offsets, page numbers and a hash per shared object are
+    kept. Identical objects (the DejaVu subset every chapter embeds) are
+    written once and referenced from every chapter.
+    """
+
+    _INHERITED = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+    _PAGES, _CATALOG = 1, 2  # Reserved object numbers, written by close()
+
+    def __init__(self, output_path: str, title: str = ""):
+        self.output_path = output_path
+        self.title = title
+        self.file = open(output_path, "wb")
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = {}
+        self.page_nums = []
+        self.outline = []  # (title, page index) bookmarks, written by close()
+        self._next_num = 3
+        self._shared = {}  # Hash of a serialised object -> its object number
+        self._reserved = {}  # Page index -> object number handed out before the page was written
+
+    def _allocate(self) -> int:
+        num, self._next_num = self._next_num, self._next_num + 1
+        return num
+
+    def _write(self, body: bytes, num: int = None) -> int:
+        if num is None:
+            num = self._allocate()
+        self.offsets[num] = self.file.tell()
+        self.file.write(f"{num} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+        return num
+
+    @staticmethod
+    def _serialize(obj) -> bytes:
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer)
+        return buffer.getvalue()
+
+    def _copy(self, obj, imported: dict):
+        """`obj` with every indirect reference imported and renumbered."""
+        if isinstance(obj, IndirectObject):
+            return _Ref(self._import(obj, imported))
+        if isinstance(obj, DictionaryObject):
+            copy = DictionaryObject()
+            for key, value in obj.items():
+                copy[NameObject(key)] = self._copy(value, imported)
+            return copy
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copy(value, imported) for value in obj)
+        return obj
+
+    def _import(self, ref: IndirectObject, imported: dict) -> int:
+        if ref.idnum in imported:
+            return imported[ref.idnum]
+        obj = ref.get_object()
+        if isinstance(obj, StreamObject):
+            header = self._copy(DictionaryObject({k: v for k, v in obj.items() if k not in ("/Length", "/Filter", "/DecodeParms")}), imported)
+            data = obj.get_data()
+            key = hashlib.sha1(self._serialize(header) + data).digest()
+            if key not in self._shared:
+                data = zlib.compress(data)
+                header[NameObject("/Filter")] = NameObject("/FlateDecode")
+                header[NameObject("/Length")] = NumberObject(len(data))
+                self._shared[key] = self._write(self._serialize(header) + b"\nstream\n" + data + b"\nendstream")
+        else:
+            body = self._serialize(self._copy(obj, imported))
+            key = hashlib.sha1(body).digest()
+            if key not in self._shared:
+                self._shared[key] = self._write(body)
+        imported[ref.idnum] = self._shared[key]
+        return imported[ref.idnum]
+
+    def page_ref(self, index: int) -> _Ref:
+        """Reference to the output page at `index`, which may not have been written yet."""
+        if index < len(self.page_nums):
+            return _Ref(self.page_nums[index])
+        if index not in self._reserved:
+            self._reserved[index] = self._allocate()
+        return _Ref(self._reserved[index])
+
+    def _link(self, rect, target: int) -> _Ref:
+        annotation = DictionaryObject({
+            NameObject("/Type"): NameObject("/Annot"),
+            NameObject("/Subtype"): NameObject("/Link"),
+            NameObject("/Rect"): ArrayObject(FloatObject(round(v, 2)) for v in rect),
+            NameObject("/Border"): ArrayObject([NumberObject(0)] * 3),
+            NameObject("/Dest"): ArrayObject([self.page_ref(target), NameObject("/Fit")]),
+        })
+        return _Ref(self._write(self._serialize(annotation)))
+
+    def add_bookmark(self, title: str, page_index: int):
+        self.outline.append((title, page_index))
+
+    def append(self, pdf_path: str, links: dict = None) -> int:
+        """
+        Appends every page of a PDF file; returns the index of its first page
+        in the output. `links` maps a page of this file to (rect, target
+        page index) pairs, added as link annotations; the targets may be
+        pages that are appended later.
+        """
+        first_page = len(self.page_nums)
+        imported = {}  # Object number in this file -> number in the output
+        for page_num, page in enumerate(PdfReader(pdf_path).pages):
+            copy = DictionaryObject()
+            for key, value in page.items():
+                if key != "/Parent":
+                    copy[NameObject(key)] = self._copy(value, imported)
+            for key in self._INHERITED:
+                node = page
+                while key not in node and "/Parent" in node:
+                    node = node["/Parent"].get_object()
+                if key not in copy and key in node:
+                    copy[NameObject(key)] = self._copy(node.raw_get(key), imported)
+            if links and links.get(page_num):
+                annotations = copy.get("/Annots", ArrayObject())
+                annotations.extend(self._link(rect, target) for rect, target in links[page_num])
+                copy[NameObject("/Annots")] = ArrayObject(annotations)
+            copy[NameObject("/Parent")] = _Ref(self._PAGES)
+            num = self._reserved.pop(len(self.page_nums), None)
+            self.page_nums.append(self._write(self._serialize(copy), num))
+        return first_page
+
+    def _write_outline(self):
+        """The bookmarks as a flat outline; returns the outline root's object number."""
+        root = self._allocate()
+        items = [self._allocate() for _ in self.outline]
+        for i, (title, page_index) in enumerate(self.outline):
+            item = DictionaryObject({
+                NameObject("/Title"): TextStringObject(title),
+                NameObject("/Parent"): _Ref(root),
+                NameObject("/Dest"): ArrayObject([self.page_ref(page_index), NameObject("/Fit")]),
+            })
+            if i:
+                item[NameObject("/Prev")] = _Ref(items[i - 1])
+            if i + 1 < len(items):
+                item[NameObject("/Next")] = _Ref(items[i + 1])
+            self._write(self._serialize(item), items[i])
+        outlines = DictionaryObject({
+            NameObject("/Type"): NameObject("/Outlines"),
+            NameObject("/First"): _Ref(items[0]),
+            NameObject("/Last"): _Ref(items[-1]),
+            NameObject("/Count"): NumberObject(len(items)),
+        })
+        return self._write(self._serialize(outlines), root)
+
+    def close(self):
+        """Writes the page tree, outline, catalog, info dictionary and cross-reference table."""
+        if self._reserved:
+            self.file.close()
+            raise ValueError(f"Links point past the last page ({len(self.page_nums)} pages written)")
+        pages = DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(_Ref(num) for num in self.page_nums),
+            NameObject("/Count"): NumberObject(len(self.page_nums)),
+        })
+        self._write(self._serialize(pages), self._PAGES)
+        catalog = DictionaryObject({NameObject("/Type"): NameObject("/Catalog"), NameObject("/Pages"): _Ref(self._PAGES)})
+        if self.outline:
+            catalog[NameObject("/Outlines")] = _Ref(self._write_outline())
+            catalog[NameObject("/PageMode")] = NameObject("/UseOutlines")
+        self._write(self._serialize(catalog), self._CATALOG)
+        info = DictionaryObject({NameObject("/Producer"): TextStringObject("automated-book-workflow")})
+        if self.title:
+            info[NameObject("/Title")] = TextStringObject(self.title)
+        info_num = self._write(self._serialize(info))
+
+        xref_offset = self.file.tell()
+        size = self._next_num
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for num in range(1, size):
+            lines.append(f"{self.offsets[num]:010d} 00000 n \n" if num in self.offsets else "0000000000 65535 f \n")
+        lines.append(f"trailer\n<< /Size {size} /Root {self._CATALOG} 0 R /Info {info_num} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self.file.write("".join(lines).encode("ascii"))
+        self.file.close()
+
+
+class BookBuilder:
+    """
+    Streams a book to disk: add_chapter() lays out one chapter as its own
+    PDF and appends its pages to the book file at once, so only that
+    chapter's text and layout are ever in memory. Every chapter gets a
+    bookmark. finish() writes the page tree, outline and cross-reference
+    table and moves the book into place.
+    """
+
+    def __init__(self, output_path: str, title: str = ""):
+        self.output_path = output_path
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        self._tmp_path = output_path + ".tmp"
+        self.writer = StreamingPdfWriter(self._tmp_path, title)
+        self.parts = []  # (title, index of the chapter's first page)
+
+    def add_pdf(self, title: str, pdf_path: str, links: dict = None, bookmark: bool = True) -> int:
+        """Appends an already rendered chapter PDF; returns its first page index."""
+        first_page = self.writer.append(pdf_path, links)
+        if bookmark:
+            self.writer.add_bookmark(title, first_page)
+            self.parts.append((title, first_page))
+        return first_page
+
+    def add_chapter(self, title: str, content: str) -> int:
+        fd, part_path = tempfile.mkstemp(suffix=".pdf", prefix="chapter_")
+        os.close(fd)
+        try:
+            render_book_chapter(title, content, part_path)
+            return self.add_pdf(title, part_path)
+        finally:
+            os.remove(part_path)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.writer.page_nums)
+
+    def finish(self) -> str:
+        self.writer.close()
+        os.replace(self._tmp_path, self.output_path)
+        return self.output_path
+
+
+# === Parallel book build ===
+def chapter_pdf_key(title: str, content: str) -> str:
+    return hashlib.sha256(json.dumps([LAYOUT_VERSION, title, content]).encode("utf-8")).hexdigest()
+
+
+def render_cached_chapter(title: str, content: str, path: str) -> str:
+    """render_book_chapter() into `path` unless it is already there; runs in the worker processes."""
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        render_book_chapter(title, content, tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+
+def render_toc(entries, output_path: str, book_title: str = "", first_page: int = 1):
+    """
+    Table of contents: one line per (title, page index) entry, showing the
+    printed page number (index + `first_page`). Returns the page count and,
+    per TOC page, the (rect in PDF points, page index) of each line to link.
+    """
+    pdf = ChapterPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    if book_title:
+        pdf.set_font(FONT_FAMILY, size=18)
+        pdf.multi_cell(0, 12, book_title)
+        pdf.ln(4)
+    pdf.set_font(FONT_FAMILY, size=14)
+    pdf.cell(0, 10, "Contents", ln=1)
+    pdf.ln(4)
+    pdf.set_font(FONT_FAMILY, size=11)
+
+    line_height, number_width = 8, 16
+    title_width = pdf.w - pdf.l_margin - pdf.r_margin - number_width
+    links = {}
+    for title, page_index in entries:
+        if pdf.get_y() + line_height > pdf.page_break_trigger:
+            pdf.add_page()
+        while len(title) > 1 and pdf.get_string_width(title) > title_width - 2:
+            title = title[:-2] + "…"
+        y = pdf.get_y()
+        pdf.cell(title_width, line_height, title)
+        pdf.cell(number_width, line_height, str(page_index + first_page), align="R", ln=1)
+        rect = (pdf.l_margin * pdf.k, (pdf.h - y - line_height) * pdf.k, (pdf.w - pdf.r_margin) * pdf.k, (pdf.h - y) * pdf.k)
+        links.setdefault(pdf.page - 1, []).append((rect, page_index))
+    pdf.output(output_path)
+    return pdf.page, links
+
+
+def build_book(chapters, output_path: str, title: str = "", workers: int = PDF_WORKERS,
+               cache_dir: str = PDF_CACHE_DIR, toc: bool = True) -> dict:
+    """
+    Renders each (title, content) chapter to its own PDF in a pool of
+    `workers` processes, then streams them into one book behind a linked
+    table of contents, with a bookmark per chapter. Chapter PDFs are kept in
+    `cache_dir` under a hash of their title, text and layout version, so an
+    unchanged chapter is never laid out twice. Returns counts and timings.
+    """
+    start = time.perf_counter()
+    os.makedirs(cache_dir, exist_ok=True)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) if workers > 1 else None
+    parts, pending, reused = [], deque(), 0
+    try:
+        for chapter_title, content in chapters:
+            path = os.path.join(cache_dir, f"{chapter_pdf_key(chapter_title, content)}.pdf")
+            if os.path.exists(path):
+                reused += 1
+            elif pool is None:
+                render_cached_chapter(chapter_title, content, path)
+            else:
+                # Bounded, so a long book's text is never all queued in memory at once
+                pending.append(pool.submit(render_cached_chapter, chapter_title, content, path))
+                while len(pending) > 2 * workers:
+                    pending.popleft().result()
+            parts.append((chapter_title, path))
+        while pending:
+            pending.popleft().result()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    rendered_at = time.perf_counter()
+    if not parts:
+        return {"path": None, "chapters": 0, "pages": 0, "rendered": 0, "reused": 0}
+
+    page_counts = [len(PdfReader(path).pages) for _, path in parts]
+    builder = BookBuilder(output_path, title=title)
+    toc_pages, toc_path, links = 0, None, None
+    try:
+        if toc:
+            # The TOC's own length shifts every page number, so lay it out until that settles
+            fd, toc_path = tempfile.mkstemp(suffix=".pdf", prefix="toc_")
+            os.close(fd)
+            guess = 1
+            while True:
+                entries, page_index = [], guess
+                for (chapter_title, _), count in zip(parts, page_counts):
+                    entries.append((chapter_title, page_index))
+                    page_index += count
+                toc_pages, links = render_toc(entries, toc_path, book_title=title)
+                if toc_pages == guess:
+                    break
+                guess = toc_pages
+            builder.add_pdf("Contents", toc_path, links, bookmark=False)
+        for chapter_title, path in parts:
+            builder.add_pdf(chapter_title, path)
+        builder.finish()
+    finally:
+        if toc_path:
+            os.remove(toc_path)
+    return {
+        "path": output_path,
+        "chapters": len(parts),
+        "pages": builder.page_count,
+        "rendered": len(parts) - reused,
+        "reused": reused,
+        "render_seconds": rendered_at - start,
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,172 @@
+# utils/stage_graph.py
+
+import contextvars
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+
+STAGE_THREADS = int(os.getenv("STAGE_THREADS", "8"))
+STAGE_PROCESSES = int(os.getenv("STAGE_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+
+class StageSkipped(RuntimeError):
+    """Raised for a stage whose upstream stage failed."""
+
+
+_thread_pool = None
+_process_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_stage_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=STAGE_THREADS, thread_name_prefix="stage")
+        return _thread_pool
+
+
+def get_stage_process_pool() -> ProcessPoolExecutor:
+    """Worker processes for CPU-heavy stages; spawned, since the API process is threaded."""
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=STAGE_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+
+def shutdown_stage_pools(wait: bool = True):
+    global _thread_pool, _process_pool
+    with _pool_lock:
+        for pool in (_thread_pool, _process_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait, cancel_futures=True)
+        _thread_pool = _process_pool = None
+
+
+class StageRun:
+    """
+    Handle on a running StageGraph. Every stage has a future; a failed
+    stage only fails itself and the stages that depend on it.
+    """
+
+    def __init__(self, names):
+        self.futures = {name: Future() for name in names}
+        self.timings = {}
+        self.started = time.perf_counter()
+
+    def done(self) -> bool:
+        return all(f.done() for f in self.futures.values())
+
+    def wait(self, timeout: float = None) -> "StageRun":
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for future in self.futures.values():
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                future.exception(timeout=remaining)
+            except TimeoutError:
+                break
+        return self
+
+    def result(self, name: str, timeout: float = None):
+        """Blocks until `name` finishes; raises its error if it failed."""
+        return self.futures[name].result(timeout=timeout)
+
+    @property
+    def results(self) -> dict:
+        return {n: f.result() for n, f in self.futures.items() if f.done() and f.exception() is None}
+
+    @property
+    def errors(self) -> dict:
+        return {n: str(f.exception()) for n, f in self.futures.items() if f.done() and f.exception() is not None}
+
+    @property
+    def pending(self) -> list:
+        return [n for n, f in self.futures.items() if not f.done()]
+
+
+class StageGraph:
+    """
+    Small dependency graph of pipeline stages. Stages whose dependencies
+    are met run concurrently: I/O-bound ones on a shared thread pool,
+    CPU-heavy ones (`process=True`) on a shared process pool.
+
+        graph = StageGraph(stage_context=progress.stage)
+        graph.add("pdf", generate_pdf, content=text, title=t, output_path=p, process=True)
+        graph.add("tts", text_to_speech, text, path, process=True)
+        run = graph.run()          # blocks until every stage is done
+        run.results, run.errors
+
+    `stage_context(name)` is an optional context manager entered around
+    every stage (e.g. JobProgress.stage). The callables of process stages
+    and their arguments must be picklable.
+    """
+
+    def __init__(self, stage_context=None, thread_pool: ThreadPoolExecutor = None, process_pool: ProcessPoolExecutor = None):
+        self.stage_context = stage_context
+        self.thread_pool = thread_pool
+        self.process_pool = process_pool
+        self.stages = {}
+
+    def add(self, name: str, fn, *args, after=(), process: bool = False, **kwargs):
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        missing = [d for d in after if d not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stage(s): {', '.join(missing)}")
+        self.stages[name] = {"fn": fn, "args": args, "kwargs": kwargs, "after": tuple(after), "process": process}
+        return self
+
+    def run(self, wait: bool = True, timeout: float = None) -> StageRun:
+        """Starts every stage; with wait=False, returns at once so late artifacts can be collected later."""
+        run = StageRun(self.stages)
+        threads = self.thread_pool or get_stage_thread_pool()
+        # Stages see the caller's context variables (e.g. the metrics trace)
+        contexts = {name: contextvars.copy_context() for name in self.stages}
+
+        def execute(name):
+            stage = self.stages[name]
+            started = time.perf_counter()
+            try:
+                failed = [d for d in stage["after"] if run.futures[d].exception() is not None]
+                if failed:
+                    raise StageSkipped(f"skipped, upstream stage failed: {', '.join(failed)}")
+                with (self.stage_context(name) if self.stage_context else nullcontext()):
+                    if stage["process"]:
+                        processes = self.process_pool or get_stage_process_pool()
+                        result = processes.submit(stage["fn"], *stage["args"], **stage["kwargs"]).result()
+                    else:
+                        result = stage["fn"](*stage["args"], **stage["kwargs"])
+            except Exception as e:
+                run.timings[name] = time.perf_counter() - started
+                run.futures[name].set_exception(e)
+                return
+            run.timings[name] = time.perf_counter() - started
+            run.futures[name].set_result(result)
+
+        def schedule(name):
+            after = self.stages[name]["after"]
+            if not after:
+                threads.submit(contexts[name].run, execute, name)
+                return
+            remaining = [len(after)]
+            lock = threading.Lock()
+
+            def on_dependency_done(_):
+                with lock:
+                    remaining[0] -= 1
+                    ready = remaining[0] == 0
+                if ready:
+                    threads.submit(contexts[name].run, execute, name)
+
+            for dependency in after:
+                run.futures[dependency].add_done_callback(on_dependency_done)
+
+        for name in self.stages:
+            schedule(name)
+        if wait:
+            run.wait(timeout)
+        return run
@@ -1,25 +1,13 @@
-import os
-import json
 import matplotlib.pyplot as plt
 from datetime import datetime
 
-FEEDBACK_LOG_PATH = "feedback/feedback_log.json"
+from ai.human_feedback import load_feedback as load_feedback_log
 
 def load_feedback():
-    if not os.path.exists(FEEDBACK_LOG_PATH):
-        print("❌ Feedback log not found.")
-        return []
-
-    with open(FEEDBACK_LOG_PATH, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-            if not isinstance(data, list):
-                print("⚠️ Feedback log format is incorrect. Expected a list.")
-                return []
-            return data
-        except json.JSONDecodeError:
-            print("❌ Error: Invalid JSON in feedback log.")
-            return []
+    feedback = load_feedback_log()
+    if not feedback:
+        print("❌ Feedback log not found or empty.")
+    return feedback
 
 def parse_feedback_data(feedback):
     chapters = []